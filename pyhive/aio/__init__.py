@@ -0,0 +1,5 @@
+"""asyncio versions of the PyHive connections and cursors.
+
+These run queries without blocking the event loop, so that many operations can share one thread.
+They need Python 3.5 or newer.
+"""
@@ -0,0 +1,484 @@
+"""asyncio interface to HiveServer2 (Thrift API)
+
+The API follows :py:mod:`pyhive.hive`, with coroutines in place of the methods that talk to the
+server::
+
+    connection = await pyhive.aio.hive.connect('localhost')
+    cursor = connection.cursor()
+    await cursor.execute('SELECT * FROM my_awesome_data LIMIT 10', async_=True)
+    async for row in cursor:
+        ...
+
+Requests are sent over asyncio streams using the binary Thrift transport. SASL authentication
+(``NONE``, ``LDAP``, ``CUSTOM`` and ``KERBEROS``) and framed ``NOSASL`` are supported. HTTP mode and
+custom Thrift transports are not.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import asyncio
+import getpass
+import logging
+import struct
+
+from TCLIService import ttypes
+from pyhive import common
+from pyhive import hive
+from pyhive import thrift_decoder
+# Make all exceptions visible in this module per DB-API
+from pyhive.exc import *  # noqa
+from pyhive.hive import _FAILED_STATES
+from pyhive.hive import _check_status
+import thrift.transport.TTransport
+
+# PEP 249 module globals
+apilevel = '2.0'
+threadsafety = 1  # Threads may share the module, but not connections.
+paramstyle = 'pyformat'  # Python extended format codes, e.g. ...WHERE name=%(name)s
+
+_logger = logging.getLogger(__name__)
+
+# SASL negotiation status codes, see thrift_sasl.TSaslClientTransport
+_SASL_START = 1
+_SASL_OK = 2
+_SASL_COMPLETE = 5
+
+_SASL_HEADER = struct.Struct(str('>BI'))
+_FRAME_HEADER = struct.Struct(str('>I'))
+
+
+async def connect(*args, **kwargs):
+    """Constructor for creating a connection to the database. See class :py:class:`Connection` for
+    arguments.
+
+    :returns: an open :py:class:`Connection` object.
+    """
+    connection = Connection(*args, **kwargs)
+    await connection.open()
+    return connection
+
+
+class Connection(object):
+    """Wraps a Thrift session over an asyncio stream.
+
+    Requests from the cursors of a connection are sent one at a time. Use several connections to
+    run more queries at once than a single session allows.
+    """
+
+    def __init__(
+        self,
+        host=None,
+        port=None,
+        username=None,
+        database='default',
+        auth=None,
+        configuration=None,
+        kerberos_service_name=None,
+        password=None,
+        result_decompressor=None,
+        thrift_framed=False,
+        use_database_statement=False,
+    ):
+        """Prepare a connection to HiveServer2. Call :py:meth:`open`, or use :py:func:`connect`.
+
+        See :py:class:`pyhive.hive.Connection` for the arguments. ``thrift_framed`` is required
+        with ``NOSASL`` authentication.
+        """
+        if auth is None:
+            auth = 'NONE'
+        if (password is not None) != (auth in ('LDAP', 'CUSTOM')):
+            raise ValueError("Password should be set if and only if in LDAP or CUSTOM mode; "
+                             "Remove password or use one of those modes")
+        if (kerberos_service_name is not None) != (auth == 'KERBEROS'):
+            raise ValueError("kerberos_service_name should be set if and only if in KERBEROS mode")
+        if auth == 'NOSASL':
+            if not thrift_framed:
+                raise NotImplementedError(
+                    "NOSASL is only supported with a framed transport (thrift_framed=True)")
+        elif thrift_framed:
+            raise ValueError("thrift_framed can only be used in NOSASL mode")
+        elif auth not in ('LDAP', 'KERBEROS', 'NONE', 'CUSTOM'):
+            raise NotImplementedError(
+                "Only NONE, NOSASL, LDAP, KERBEROS, CUSTOM "
+                "authentication are supported, got {}".format(auth))
+
+        self._host = host
+        self._port = port or 10000
+        self._username = username or getpass.getuser()
+        self._database = database
+        self._auth = auth
+        self._configuration = dict(configuration or {})
+        if not use_database_statement:
+            self._configuration.setdefault('use:database', database)
+        self._use_database_statement = use_database_statement
+        self._kerberos_service_name = kerberos_service_name
+        self._password = password
+        self._result_decompressor = result_decompressor
+
+        self._reader = None
+        self._writer = None
+        self._sasl = None
+        # Whether frames are wrapped by the SASL security layer; None until the first write
+        self._sasl_encode = None
+        self._lock = asyncio.Lock()
+        # Set when a request is interrupted, which leaves the stream in an unknown state
+        self._broken = False
+        self._sessionHandle = None
+
+    async def open(self):
+        """Open the stream and the Thrift session"""
+        # oldest version that still contains features we care about
+        # "V6 uses binary type for binary payload (was string) and uses columnar result set"
+        protocol_version = ttypes.TProtocolVersion.HIVE_CLI_SERVICE_PROTOCOL_V6
+
+        self._reader, self._writer = await asyncio.open_connection(self._host, self._port)
+        try:
+            if self._auth != 'NOSASL':
+                await self._sasl_negotiate()
+            response = await self.call('OpenSession', ttypes.TOpenSessionReq(
+                client_protocol=protocol_version,
+                configuration=self._configuration,
+                username=self._username,
+            ))
+            _check_status(response)
+            assert response.sessionHandle is not None, "Expected a session from OpenSession"
+            self._sessionHandle = response.sessionHandle
+            assert response.serverProtocolVersion == protocol_version, \
+                "Unable to handle protocol version {}".format(response.serverProtocolVersion)
+            if self._use_database_statement:
+                async with self.cursor() as cursor:
+                    await cursor.execute('USE `{}`'.format(self._database))
+        except BaseException:
+            self._writer.close()
+            raise
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Call close"""
+        await self.close()
+
+    async def close(self):
+        """Close the underlying session and stream"""
+        if self._broken:
+            self._writer.close()
+            return
+        try:
+            response = await self.call(
+                'CloseSession', ttypes.TCloseSessionReq(sessionHandle=self._sessionHandle))
+        finally:
+            self._writer.close()
+        _check_status(response)
+
+    def commit(self):
+        """Hive does not support transactions, so this does nothing."""
+        pass
+
+    def cursor(self, *args, **kwargs):
+        """Return a new :py:class:`Cursor` object using the connection."""
+        return Cursor(self, *args, **kwargs)
+
+    @property
+    def sessionHandle(self):
+        return self._sessionHandle
+
+    @property
+    def result_decompressor(self):
+        return self._result_decompressor
+
+    def rollback(self):
+        raise NotSupportedError("Hive does not have transactions")  # pragma: no cover
+
+    async def call(self, name, request):
+        """Send a TCLIService request, e.g. ``call('GetInfo', TGetInfoReq(...))``, and return the
+        response.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        out = thrift.transport.TTransport.TMemoryBuffer()
+        getattr(thrift_decoder.Client(hive._make_protocol('binary', out)), 'send_' + name)(request)
+        async with self._lock:
+            if self._broken:
+                raise OperationalError("Connection is unusable after an interrupted request")
+            try:
+                self._write_frame(out.getvalue())
+                await self._writer.drain()
+                frame = await self._read_frame()
+            except BaseException:
+                # e.g. cancelled, so the reply would be read as that of the next request
+                self._broken = True
+                self._writer.close()
+                raise
+        in_ = thrift.transport.TTransport.TMemoryBuffer(frame)
+        return getattr(thrift_decoder.Client(hive._make_protocol('binary', in_)), 'recv_' + name)()
+
+    async def _sasl_negotiate(self):
+        if self._auth == 'KERBEROS':
+            # KERBEROS mode in hive.server2.authentication is GSSAPI in sasl library
+            sasl_auth = 'GSSAPI'
+            password = None
+        else:
+            sasl_auth = 'PLAIN'
+            # Password doesn't matter in NONE mode, just needs to be nonempty.
+            password = 'x' if self._password is None else self._password
+        sasl = hive.get_installed_sasl(
+            host=self._host, sasl_auth=sasl_auth, service=self._kerberos_service_name,
+            username=self._username, password=password)
+        ok, mechanism, initial_response = sasl.start(sasl_auth)
+        if not ok:
+            raise OperationalError("Could not start SASL: {}".format(sasl.getError()))
+        self._writer.write(_sasl_message(_SASL_START, mechanism)
+                           + _sasl_message(_SASL_OK, initial_response))
+        while True:
+            await self._writer.drain()
+            status, length = _SASL_HEADER.unpack(await self._reader.readexactly(5))
+            payload = await self._reader.readexactly(length)
+            if status == _SASL_COMPLETE:
+                break
+            if status != _SASL_OK:
+                raise OperationalError("Bad SASL status: {} ({!r})".format(status, payload))
+            ok, response = sasl.step(payload)
+            if not ok:
+                raise OperationalError("Bad SASL result: {}".format(sasl.getError()))
+            self._writer.write(_sasl_message(_SASL_OK, response))
+        self._sasl = sasl
+
+    def _write_frame(self, data):
+        if self._sasl is not None and self._sasl_encode is not False:
+            ok, encoded = self._sasl.encode(data)
+            if not ok:
+                raise OperationalError(self._sasl.getError())
+            if self._sasl_encode is None:
+                # The security layer passes data through unchanged when the QOP is auth
+                self._sasl_encode = len(encoded) != len(data)
+            if self._sasl_encode:
+                # encode() adds the length header
+                self._writer.write(encoded)
+                return
+        self._writer.write(_FRAME_HEADER.pack(len(data)) + data)
+
+    async def _read_frame(self):
+        header = await self._reader.readexactly(_FRAME_HEADER.size)
+        payload = await self._reader.readexactly(_FRAME_HEADER.unpack(header)[0])
+        if self._sasl_encode:
+            ok, payload = self._sasl.decode(header + payload)
+            if not ok:
+                raise OperationalError(self._sasl.getError())
+        return payload
+
+
+class Cursor(object):
+    """asyncio counterpart of :py:class:`pyhive.hive.Cursor`.
+
+    :py:attr:`description` is available after a synchronous :py:meth:`execute`, and after an
+    asynchronous one once :py:meth:`poll` reports that the operation finished or rows are fetched.
+    """
+
+    def __init__(self, connection, arraysize=1000, poll_interval=1, poll_strategy=None):
+        """
+        :param connection: the :py:class:`Connection` to run queries on
+        :param arraysize: number of rows to request from HiveServer2 per page
+        :param poll_interval: longest wait between status checks while waiting for an operation
+            started with ``async_=True`` to finish before fetching
+        :param poll_strategy: a :py:class:`~pyhive.common.PollStrategy` for the waits between
+            status checks, defaults to exponential backoff capped at ``poll_interval``
+        """
+        self._connection = connection
+        self._arraysize = arraysize
+        self._poll_interval = poll_interval
+        self._poll_strategy = poll_strategy or common.DEFAULT_POLL_STRATEGY
+        self._operationHandle = None
+        self._description = None
+        self._finished = False
+        self._operation_ready = False
+        self._data = common._RowBuffer()
+        self._rownumber = 0
+        self.lastrowid = None
+
+    async def _reset_state(self):
+        """Reset state about the previous query in preparation for running another query"""
+        self._description = None
+        self._finished = False
+        self._operation_ready = False
+        self._data = common._RowBuffer()
+        self._rownumber = 0
+        if self._operationHandle is not None:
+            try:
+                response = await self._connection.call(
+                    'CloseOperation', ttypes.TCloseOperationReq(self._operationHandle))
+                _check_status(response)
+            finally:
+                self._operationHandle = None
+
+    @property
+    def arraysize(self):
+        return self._arraysize
+
+    @arraysize.setter
+    def arraysize(self, value):
+        self._arraysize = value
+
+    @property
+    def description(self):
+        """See :py:attr:`pyhive.hive.Cursor.description`"""
+        return self._description
+
+    @property
+    def rowcount(self):
+        """Return -1 to indicate that this is not supported."""
+        return -1
+
+    @property
+    def rownumber(self):
+        return self._rownumber
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """Close the operation handle"""
+        await self._reset_state()
+
+    async def execute(self, operation, parameters=None, async_=False):
+        """Prepare and execute a database operation (query or command).
+
+        With ``async_=True``, return once HiveServer2 has accepted the operation. Fetching waits for
+        it to finish.
+        """
+        # Prepare statement
+        if parameters is None:
+            sql = operation
+        else:
+            sql = hive._escaper.format(operation, parameters)
+
+        await self._reset_state()
+        _logger.info('%s', sql)
+
+        req = ttypes.TExecuteStatementReq(self._connection.sessionHandle, sql, runAsync=async_)
+        _logger.debug(req)
+        response = await self._connection.call('ExecuteStatement', req)
+        _check_status(response)
+        self._operationHandle = response.operationHandle
+        if not async_:
+            await self._operation_finished()
+
+    async def executemany(self, operation, seq_of_parameters):
+        """Execute the operation once per parameters. Only the final result set is retained."""
+        for parameters in seq_of_parameters:
+            await self.execute(operation, parameters)
+
+    async def cancel(self):
+        response = await self._connection.call('CancelOperation', ttypes.TCancelOperationReq(
+            operationHandle=self._operationHandle,
+        ))
+        _check_status(response)
+
+    async def poll(self, get_progress_update=True):
+        """Poll for and return the raw status data provided by the Hive Thrift REST API.
+
+        :returns: ``ttypes.TGetOperationStatusResp``
+        :raises: ``ProgrammingError`` when no query has been started
+        """
+        if self._operationHandle is None:
+            raise ProgrammingError("No query yet")
+        response = await self._connection.call('GetOperationStatus', ttypes.TGetOperationStatusReq(
+            operationHandle=self._operationHandle,
+            getProgressUpdate=get_progress_update,
+        ))
+        _check_status(response)
+        if response.operationState == ttypes.TOperationState.FINISHED_STATE:
+            await self._operation_finished()
+        return response
+
+    async def fetchone(self):
+        """Fetch the next row, or ``None`` when no more data is available."""
+        rows = await self.fetchmany(1)
+        return rows[0] if rows else None
+
+    async def fetchmany(self, size=None):
+        """Fetch up to ``size`` rows, defaulting to :py:attr:`arraysize`. An empty list is returned
+        when no more rows are available.
+        """
+        if size is None:
+            size = self._arraysize
+        while len(self._data) < size and not self._finished:
+            await self._fetch_more()
+        rows = self._data.take(size)
+        self._rownumber += len(rows)
+        return rows
+
+    async def fetchall(self):
+        """Fetch all (remaining) rows as a list."""
+        while not self._finished:
+            await self._fetch_more()
+        rows = self._data.take()
+        self._rownumber += len(rows)
+        return rows
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        row = await self.fetchone()
+        if row is None:
+            raise StopAsyncIteration
+        return row
+
+    async def _operation_finished(self):
+        """Note that results can be fetched, and load the description"""
+        self._operation_ready = True
+        if self._description is None and self._operationHandle.hasResultSet:
+            response = await self._connection.call(
+                'GetResultSetMetadata', ttypes.TGetResultSetMetadataReq(self._operationHandle))
+            _check_status(response)
+            self._description = hive._description(response.schema.columns)
+
+    async def _wait_for_operation(self):
+        delays = self._poll_strategy.delays(self._poll_interval)
+        while not self._operation_ready:
+            response = await self.poll(get_progress_update=False)
+            if response.operationState in _FAILED_STATES:
+                raise OperationalError(response)
+            if not self._operation_ready:
+                await asyncio.sleep(next(delays))
+
+    async def _fetch_more(self):
+        """Send another TFetchResultsReq and append the rows to the buffer"""
+        if self._operationHandle is None:
+            raise ProgrammingError("No query yet")
+        if not self._operationHandle.hasResultSet:
+            raise ProgrammingError("No result set")
+        await self._wait_for_operation()
+        response = await self._connection.call('FetchResults', ttypes.TFetchResultsReq(
+            operationHandle=self._operationHandle,
+            orientation=ttypes.TFetchOrientation.FETCH_NEXT,
+            maxRows=self._arraysize,
+        ))
+        _check_status(response)
+        assert not response.results.rows, 'expected data in columnar format'
+        columns = response.results.columns
+        if response.results.binaryColumns is not None:
+            columns = hive._decode_binary_columns(
+                response.results.binaryColumns, response.results.columnCount,
+                self._connection.result_decompressor)
+        if hive._is_last_page(columns):
+            self._finished = True
+            return
+        self._data += zip(*[
+            hive._unwrap_column(col, col_schema[1])
+            for col, col_schema in zip(columns, self._description)
+        ])
+
+
+def _sasl_message(status, body):
+    if body is None:
+        body = b''
+    elif not isinstance(body, bytes):
+        body = body.encode('utf-8')
+    return _SASL_HEADER.pack(status, len(body)) + body
@@ -0,0 +1,323 @@
+"""asyncio interface to Presto, backed by aiohttp
+
+The API follows :py:mod:`pyhive.presto`, with coroutines in place of the methods that talk to the
+coordinator. Waiting between ``nextUri`` requests doesn't block the event loop::
+
+    connection = pyhive.aio.presto.connect('localhost')
+    cursor = connection.cursor()
+    await cursor.execute('SELECT * FROM my_awesome_data LIMIT 10')
+    async for row in cursor:
+        ...
+    await connection.close()
+
+Requests are sent with ``aiohttp``, so ``requests_session`` and ``requests_kwargs`` don't apply
+(see ``aiohttp_session`` and ``aiohttp_kwargs``). Basic authentication is supported with
+``password``. Kerberos authentication is not supported.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import asyncio
+import logging
+
+import aiohttp
+import requests
+from requests.auth import HTTPBasicAuth
+
+from pyhive import presto
+# Make all exceptions visible in this module per DB-API
+from pyhive.exc import *  # noqa
+
+# PEP 249 module globals
+apilevel = '2.0'
+threadsafety = 1  # Threads may share the module, but not connections.
+paramstyle = 'pyformat'  # Python extended format codes, e.g. ...WHERE name=%(name)s
+
+_logger = logging.getLogger(__name__)
+
+
+def connect(*args, **kwargs):
+    """Constructor for creating a connection to the database. See class :py:class:`Connection` for
+    arguments.
+
+    :returns: a :py:class:`Connection` object.
+    """
+    return Connection(*args, **kwargs)
+
+
+class Connection(object):
+    """A factory for cursors that share one ``aiohttp.ClientSession``, which is opened with the
+    first cursor and closed by :py:meth:`close` unless it was passed in as ``aiohttp_session``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._args = args
+        self._kwargs = kwargs
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Call close"""
+        await self.close()
+
+    async def close(self):
+        """Close the HTTP session"""
+        # TODO cancel outstanding queries?
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def commit(self):
+        """Presto does not support transactions"""
+        pass
+
+    def cursor(self):
+        """Return a new :py:class:`Cursor` object using the connection."""
+        return Cursor(*self._args, **self._cursor_kwargs())
+
+    def _cursor_kwargs(self):
+        if 'aiohttp_session' in self._kwargs:
+            return self._kwargs
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        return dict(self._kwargs, aiohttp_session=self._session)
+
+    def rollback(self):
+        raise NotSupportedError("Presto does not have transactions")  # pragma: no cover
+
+
+class Cursor(presto.Cursor):
+    """asyncio counterpart of :py:class:`pyhive.presto.Cursor`.
+
+    :py:attr:`description` is ``None`` until the coordinator has reported the columns of the result,
+    which :py:meth:`fetchone` and friends wait for.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Takes the arguments of :py:class:`pyhive.presto.Cursor`, except for the Kerberos ones,
+        ``requests_session``, ``requests_kwargs`` and ``stream_results``, and additionally:
+
+        :param aiohttp_session: the ``aiohttp.ClientSession`` to send requests with. If absent, the
+            cursor opens a session, which :py:meth:`close` closes.
+        :param aiohttp_kwargs: Additional ``**kwargs`` to pass to ``aiohttp`` requests
+        """
+        session = kwargs.pop('aiohttp_session', None)
+        aiohttp_kwargs = dict(kwargs.pop('aiohttp_kwargs', None) or {})
+        for k in ('requests_session', 'requests_kwargs', 'KerberosRemoteServiceName'):
+            if kwargs.get(k) is not None:
+                raise NotSupportedError("{} is not supported by asyncio cursors".format(k))
+        if kwargs.get('stream_results'):
+            raise NotSupportedError("stream_results is not supported by asyncio cursors")
+        for k in ('method', 'url', 'data', 'headers', 'auth'):
+            if k in aiohttp_kwargs:
+                raise ValueError("Cannot override aiohttp argument {}".format(k))
+        super(Cursor, self).__init__(*args, **kwargs)
+
+        auth = self._requests_kwargs.pop('auth', None)
+        if isinstance(auth, HTTPBasicAuth):
+            aiohttp_kwargs['auth'] = aiohttp.BasicAuth(auth.username, auth.password)
+        self._owns_session = session is None
+        self._session = session
+        self._aiohttp_kwargs = aiohttp_kwargs
+
+    @property
+    def description(self):
+        """See :py:attr:`pyhive.presto.Cursor.description`. This doesn't wait for the columns."""
+        if self._columns is None:
+            return None
+        return [
+            # name, type_code, display_size, internal_size, precision, scale, null_ok
+            (col['name'], col['type'], None, None, None, None, True)
+            for col in self._columns
+        ]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """Close the HTTP session if the cursor opened it"""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def execute(self, operation, parameters=None):
+        """Prepare and execute a database operation (query or command).
+
+        Return values are not defined.
+        """
+        key = self._cache_key(operation, parameters)
+        if key is not None and self._serve_cached(key):
+            return
+        for prepare in self._prepare_queries(operation, parameters):
+            await self.execute(prepare)
+            await self._fetch_while(lambda: self._state != self._STATE_FINISHED)
+        url, data, headers = self._start_query(operation, parameters)
+        self._process_response(await self._request('post', url, data=data, headers=headers))
+        self._record(key)
+
+    async def executemany(self, operation, seq_of_parameters):
+        """Execute the operation once per parameters. Only the final result set is retained."""
+        for parameters in seq_of_parameters[:-1]:
+            await self.execute(operation, parameters)
+            while self._state != self._STATE_FINISHED:
+                await self._fetch_more()
+        if seq_of_parameters:
+            await self.execute(operation, seq_of_parameters[-1])
+
+    async def cancel(self):
+        if self._state == self._STATE_NONE:
+            raise ProgrammingError("No query yet")
+        if self._nextUri is None:
+            assert self._state == self._STATE_FINISHED, "Should be finished if nextUri is None"
+            return
+
+        response = await self._request('delete', self._nextUri)
+        if response.status_code != requests.codes.no_content:
+            fmt = "Unexpected status code after cancel {}\n{}"
+            raise OperationalError(fmt.format(response.status_code, response.content))
+
+        self._state = self._STATE_FINISHED
+        self._nextUri = None
+        self._data.recording = None
+
+    async def poll(self):
+        """Poll for and return the raw status data provided by the Presto REST API.
+
+        :returns: dict -- JSON status information or ``None`` if the query is done
+        :raises: ``ProgrammingError`` when no query has been started
+        """
+        if self._state == self._STATE_NONE:
+            raise ProgrammingError("No query yet")
+        if self._nextUri is None:
+            assert self._state == self._STATE_FINISHED, "Should be finished if nextUri is None"
+            return None
+        if self._buffer_full():
+            return self._status
+        return self._process_response(await self._request('get', self._nextUri), raw_data=True)
+
+    async def fetchone(self):
+        """Fetch the next row, or ``None`` when no more data is available."""
+        if self._state == self._STATE_NONE:
+            raise ProgrammingError("No query yet")
+
+        # Sleep until we're done or we have some data to return
+        await self._fetch_while(lambda: not self._data and self._state != self._STATE_FINISHED)
+
+        if not self._data:
+            return None
+        else:
+            self._rownumber += 1
+            return self._data.popleft()
+
+    async def fetchmany(self, size=None):
+        """Fetch up to ``size`` rows, defaulting to :py:attr:`arraysize`. An empty list is returned
+        when no more rows are available.
+        """
+        if size is None:
+            size = self.arraysize
+        return await self._fetch_rows(size)
+
+    async def fetchall(self):
+        """Fetch all (remaining) rows as a list."""
+        return await self._fetch_rows(None)
+
+    async def _fetch_rows(self, size):
+        if self._state == self._STATE_NONE:
+            raise ProgrammingError("No query yet")
+        rows = []
+        while size is None or len(rows) < size:
+            await self._fetch_while(
+                lambda: not self._data and self._state != self._STATE_FINISHED)
+            if not self._data:
+                break
+            rows += self._data.take(None if size is None else size - len(rows))
+        self._rownumber += len(rows)
+        return rows
+
+    def fetch_record_batches(self):
+        """Fetch the remaining rows of a query result as Apache Arrow record batches.
+
+        See :py:meth:`pyhive.presto.Cursor.fetch_record_batches`.
+
+        :returns: an asynchronous iterator of ``pyarrow.RecordBatch``
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        # Defer import so package dependency is optional
+        import pyarrow
+
+        if self._state == self._STATE_NONE:
+            raise ProgrammingError("No query yet")
+        return self._iter_record_batches(pyarrow)
+
+    async def fetch_arrow(self):
+        """Fetch all (remaining) rows of a query result as a ``pyarrow.Table``.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        import pyarrow
+
+        return self._arrow_table(pyarrow, [batch async for batch in self.fetch_record_batches()])
+
+    async def _iter_record_batches(self, pa):
+        while True:
+            await self._fetch_while(
+                lambda: not self._data and self._state != self._STATE_FINISHED)
+            batch = self._take_record_batch(pa)
+            if batch is None:
+                return
+            yield batch
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        row = await self.fetchone()
+        if row is None:
+            raise StopAsyncIteration
+        return row
+
+    def __next__(self):
+        raise TypeError("Use async for to iterate over an asyncio cursor")
+
+    next = __next__
+
+    async def _fetch_while(self, fn):
+        delays = self._poll_strategy.delays(self._poll_interval)
+        while fn():
+            rows = len(self._data)
+            await self._fetch_more()
+            if fn():
+                if len(self._data) != rows:
+                    # Start over from short delays after making progress
+                    delays = self._poll_strategy.delays(self._poll_interval)
+                await asyncio.sleep(next(delays))
+        self._finish_recording()
+
+    async def _fetch_more(self):
+        """Fetch the next URI and update state"""
+        self._process_response(await self._request('get', self._nextUri))
+
+    async def _request(self, method, url, **kwargs):
+        kwargs.update(self._aiohttp_kwargs)
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        async with self._session.request(method, url, **kwargs) as response:
+            return _Response(response.status, response.headers, await response.read())
+
+
+class _Response(object):
+    """The parts of a ``requests.Response`` that ``Cursor._process_response`` uses"""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
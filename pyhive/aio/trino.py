@@ -0,0 +1,36 @@
+"""asyncio interface to Trino, backed by aiohttp
+
+See :py:mod:`pyhive.aio.presto`.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from pyhive import trino
+from pyhive.aio import presto
+# Make all exceptions visible in this module per DB-API
+from pyhive.exc import *  # noqa
+
+# PEP 249 module globals
+apilevel = '2.0'
+threadsafety = 1  # Threads may share the module, but not connections.
+paramstyle = 'pyformat'  # Python extended format codes, e.g. ...WHERE name=%(name)s
+
+
+def connect(*args, **kwargs):
+    """Constructor for creating a connection to the database. See class :py:class:`Connection` for
+    arguments.
+
+    :returns: a :py:class:`Connection` object.
+    """
+    return Connection(*args, **kwargs)
+
+
+class Connection(presto.Connection):
+    def cursor(self):
+        """Return a new :py:class:`Cursor` object using the connection."""
+        return Cursor(*self._args, **self._cursor_kwargs())
+
+
+class Cursor(presto.Cursor, trino.Cursor):
+    """asyncio counterpart of :py:class:`pyhive.trino.Cursor`"""
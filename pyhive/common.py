@@ -13,10 +13,14 @@ from past.builtins import basestring
 from pyhive import exc
 import abc
 import collections
+import queue
+import re
+import threading
 import time
 import datetime
 from future.utils import with_metaclass
 from itertools import islice
+from itertools import repeat
 
 try:
     from collections.abc import Iterable
@@ -31,8 +35,15 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
     _STATE_RUNNING = 1
     _STATE_FINISHED = 2
 
-    def __init__(self, poll_interval=1):
+    # ParamEscaper for batching INSERT statements in executemany
+    _escaper = None
+
+    def __init__(self, poll_interval=1, poll_strategy=None, max_buffered_rows=None,
+                 result_cache=None):
         self._poll_interval = poll_interval
+        self._poll_strategy = poll_strategy or DEFAULT_POLL_STRATEGY
+        self._max_buffered_rows = max_buffered_rows
+        self._result_cache = result_cache
         self._reset_state()
         self.lastrowid = None
 
@@ -43,14 +54,20 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
 
         # Internal helper state
         self._state = self._STATE_NONE
-        self._data = collections.deque()
+        self._data = _RowBuffer()
         self._columns = None
 
     def _fetch_while(self, fn):
+        delays = self._poll_strategy.delays(self._poll_interval)
         while fn():
+            rows = len(self._data)
             self._fetch_more()
             if fn():
-                time.sleep(self._poll_interval)
+                if len(self._data) != rows:
+                    # Start over from short delays after making progress
+                    delays = self._poll_strategy.delays(self._poll_interval)
+                time.sleep(next(delays))
+        self._finish_recording()
 
     @abc.abstractproperty
     def description(self):
@@ -70,6 +87,86 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
         """By default, return -1 to indicate that this is not supported."""
         return -1
 
+    @property
+    def buffered_rows(self):
+        """Number of rows fetched from the server that have not been returned to the caller yet.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        return len(self._data)
+
+    @property
+    def max_buffered_rows(self):
+        """Limit on :py:attr:`buffered_rows`, or ``None`` if it is unbounded. The cursor doesn't ask
+        the server for more rows while the limit is reached.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        return self._max_buffered_rows
+
+    def _buffer_full(self):
+        return self._max_buffered_rows is not None and len(self._data) >= self._max_buffered_rows
+
+    @property
+    def result_cache(self):
+        """The :py:class:`~pyhive.result_cache.ResultCache` that query results are served from, or
+        ``None``
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        return self._result_cache
+
+    def _cache_key(self, operation, parameters):
+        """Return the key of the result of ``operation`` in :py:attr:`result_cache`, or ``None`` if
+        it isn't cached
+        """
+        if self._result_cache is None or not self._result_cache.is_cacheable(operation):
+            return None
+        context = self._cache_context()
+        if context is None:
+            return None
+        return self._result_cache.key(operation, parameters, context)
+
+    def _cache_context(self):
+        """Return a tuple of what the results of a query depend on besides the query, e.g. the
+        server, user and session, or ``None`` if that isn't known and results aren't cached
+        """
+        return ()
+
+    def _serve_cached(self, key):
+        """Set up the result cached under ``key`` as a finished query, returning whether there was
+        one
+        """
+        cached = self._result_cache.get(key)
+        if cached is None:
+            return False
+        description, rows = cached
+        self._reset_state()
+        self._load_description(description)
+        self._data += rows
+        self._state = self._STATE_FINISHED
+        return True
+
+    def _load_description(self, description):
+        """Make :py:attr:`description` return a cached ``description``"""
+        raise NotImplementedError  # pragma: no cover
+
+    def _record(self, key):
+        """Record the rows of the query just started as they are fetched, to cache the result under
+        ``key`` once all of them have been
+        """
+        if key is not None:
+            self._data.recording = self._result_cache.record(key)
+
+    def _finish_recording(self):
+        recording = self._data.recording
+        if recording is not None and not self._data and self._state == self._STATE_FINISHED:
+            self._data.recording = None
+            recording.finish(self.description)
+
     @abc.abstractmethod
     def execute(self, operation, parameters=None):
         """Prepare and execute a database operation (query or command).
@@ -82,20 +179,111 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
         """
         raise NotImplementedError  # pragma: no cover
 
-    def executemany(self, operation, seq_of_parameters):
+    def executemany(self, operation, seq_of_parameters, max_workers=None, max_sql_length=1000000):
         """Prepare a database operation (query or command) and then execute it against all parameter
         sequences or mappings found in the sequence ``seq_of_parameters``.
 
         Only the final result set is retained.
 
         Return values are not defined.
+
+        A simple ``INSERT ... VALUES (...)`` is rewritten into statements inserting many rows each,
+        e.g. ``INSERT INTO t VALUES (1, 'a'), (2, 'b')``.
+
+        :param max_workers: if greater than 1, run up to this many statements at a time. All but the
+            last statement are run to completion before the last one is executed on this cursor.
+            Rather than stopping at the first failure, every statement is run, and an
+            :py:class:`~pyhive.exc.ExecuteManyError` listing the failures is raised at the end.
+            For a failed batch of rows, the index of its first row and the list of its parameters
+            are reported. This is not a part of DB-API.
+        :param max_sql_length: the length up to which batched ``INSERT`` statements are filled with
+            rows, defaulting to Presto's default ``query.max-length``. A false value turns off
+            batching. This is not a part of DB-API.
         """
-        for parameters in seq_of_parameters[:-1]:
-            self.execute(operation, parameters)
+        statements = self._executemany_statements(operation, seq_of_parameters, max_sql_length)
+        if max_workers is not None and max_workers > 1 and len(statements) > 1:
+            errors = self._executemany_concurrently(statements[:-1], max_workers)
+            last = statements[-1]
+            try:
+                self.execute(last.operation, last.parameters)
+            except exc.Error as e:
+                errors.append(last.error(e))
+            if errors:
+                raise exc.ExecuteManyError(errors)
+            return
+        for statement in statements[:-1]:
+            self.execute(statement.operation, statement.parameters)
             while self._state != self._STATE_FINISHED:
                 self._fetch_more()
-        if seq_of_parameters:
-            self.execute(operation, seq_of_parameters[-1])
+        if statements:
+            self.execute(statements[-1].operation, statements[-1].parameters)
+
+    def _executemany_statements(self, operation, seq_of_parameters, max_sql_length):
+        """Return the :py:class:`_Statement` list to run for :py:meth:`executemany`, batching the
+        rows of a simple ``INSERT ... VALUES`` into as few statements as ``max_sql_length`` allows
+        """
+        match = None
+        if max_sql_length and self._escaper is not None and len(seq_of_parameters) > 1:
+            match = _INSERT_VALUES_PATTERN.match(operation)
+        if match is None or '%' in match.group(1) or not _is_one_group(match.group(2)):
+            return [_Statement(i, operation, parameters, None)
+                    for i, parameters in enumerate(seq_of_parameters)]
+
+        prefix, row = match.group(1) + ' ', match.group(2)
+        statements = []
+        values = []
+        first = 0
+        length = len(prefix)
+        for i, parameters in enumerate(seq_of_parameters):
+            value = self._escaper.format(row, parameters)
+            if values and length + len(value) > max_sql_length:
+                statements.append(_Statement(
+                    first, prefix + ', '.join(values), None, list(seq_of_parameters[first:i])))
+                values = []
+                first = i
+                length = len(prefix)
+            values.append(value)
+            length += len(value) + len(', ')
+        statements.append(_Statement(
+            first, prefix + ', '.join(values), None, list(seq_of_parameters[first:])))
+        return statements
+
+    def _executemany_concurrently(self, statements, max_workers):
+        """Run the statements to completion on up to ``max_workers`` threads, each with its own
+        cursor from :py:meth:`_worker_cursor`, and return the errors as ``ExecuteManyError.errors``
+        """
+        cursors = [self._worker_cursor() for _ in range(min(max_workers, len(statements)))]
+        work = queue.Queue()
+        for statement in statements:
+            work.put(statement)
+        errors = []
+
+        def run(cursor):
+            try:
+                while True:
+                    try:
+                        statement = work.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        cursor.execute(statement.operation, statement.parameters)
+                        cursor._fetch_while(lambda: cursor._state != cursor._STATE_FINISHED)
+                    except Exception as e:
+                        errors.append(statement.error(e))
+            finally:
+                cursor.close()
+
+        threads = [threading.Thread(target=run, args=(cursor,), name='pyhive-executemany')
+                   for cursor in cursors]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(errors, key=lambda error: error[0])
+
+    def _worker_cursor(self):
+        """Return a new cursor with the same settings for :py:meth:`_executemany_concurrently`"""
+        raise exc.NotSupportedError("Concurrent executemany is not supported")
 
     def fetchone(self):
         """Fetch the next row of a query result set, returning a single sequence, or ``None`` when
@@ -130,7 +318,7 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
         """
         if size is None:
             size = self.arraysize
-        return list(islice(iter(self.fetchone, None), size))
+        return self._fetch_rows(size)
 
     def fetchall(self):
         """Fetch all (remaining) rows of a query result, returning them as a sequence of sequences
@@ -139,7 +327,95 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
         An :py:class:`~pyhive.exc.Error` (or subclass) exception is raised if the previous call to
         :py:meth:`execute` did not produce any result set or no call was issued yet.
         """
-        return list(iter(self.fetchone, None))
+        return self._fetch_rows(None)
+
+    def _fetch_rows(self, size):
+        """Return up to ``size`` rows, or all of them, taking runs of rows out of buffered pages"""
+        if self._state == self._STATE_NONE:
+            raise exc.ProgrammingError("No query yet")
+        rows = []
+        while size is None or len(rows) < size:
+            self._fetch_while(lambda: not self._data and self._state != self._STATE_FINISHED)
+            if not self._data:
+                break
+            rows += self._data.take(None if size is None else size - len(rows))
+        self._rownumber += len(rows)
+        return rows
+
+    def fetch_record_batches(self):
+        """Fetch the remaining rows of a query result as Apache Arrow record batches.
+
+        Requires the optional ``pyarrow`` package. Column types are derived from
+        :py:attr:`description`.
+
+        :returns: an iterator of ``pyarrow.RecordBatch``, usually one per page fetched from the
+            server
+        :raises: ``ProgrammingError`` when no query has been started
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        # Defer import so package dependency is optional
+        import pyarrow
+
+        if self._state == self._STATE_NONE:
+            raise exc.ProgrammingError("No query yet")
+        return self._iter_record_batches(pyarrow)
+
+    def fetch_arrow(self):
+        """Fetch all (remaining) rows of a query result as a ``pyarrow.Table``.
+
+        See :py:meth:`fetch_record_batches`.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        import pyarrow
+
+        return self._arrow_table(pyarrow, list(self.fetch_record_batches()))
+
+    def _arrow_table(self, pa, batches):
+        if batches:
+            return pa.Table.from_batches(batches)
+        return pa.Table.from_batches([], schema=pa.schema([
+            (col[0], self._arrow_type(pa, col[1]) or pa.null())
+            for col in self.description or ()
+        ]))
+
+    def _iter_record_batches(self, pa):
+        while True:
+            batch = self._fetch_record_batch(pa)
+            if batch is None:
+                return
+            yield batch
+
+    def _fetch_record_batch(self, pa):
+        """Return the buffered rows, or else the next page, as a ``pyarrow.RecordBatch``, or
+        ``None`` when no more rows are available.
+
+        By default this transposes rows; subclasses may build arrays directly from the wire format.
+        """
+        self._fetch_while(lambda: not self._data and self._state != self._STATE_FINISHED)
+        return self._take_record_batch(pa)
+
+    def _take_record_batch(self, pa):
+        """Return the buffered rows as a ``pyarrow.RecordBatch``, or ``None`` if there are none"""
+        if not self._data:
+            return None
+        rows = self._data.take()
+        self._rownumber += len(rows)
+        description = self.description
+        arrays = [
+            pa.array(list(values), type=self._arrow_type(pa, col[1]))
+            for values, col in zip(zip(*rows), description)
+        ]
+        return pa.RecordBatch.from_arrays(arrays, names=[col[0] for col in description])
+
+    def _arrow_type(self, pa, type_code):
+        """Return the ``pyarrow.DataType`` for a ``type_code`` from :py:attr:`description`, or
+        ``None`` to let pyarrow infer it from the values.
+        """
+        return None
 
     @property
     def arraysize(self):
@@ -192,6 +468,168 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
         return self
 
 
+# A single-row INSERT, split into the statement up to VALUES and the row
+_INSERT_VALUES_PATTERN = re.compile(
+    r'^\s*(INSERT\s.*?\sVALUES)\s*(\(.*\))\s*;?\s*$', re.IGNORECASE | re.DOTALL)
+
+
+def _is_one_group(sql):
+    """Return whether ``sql`` is a single parenthesized group, ignoring quoted parentheses"""
+    depth = 0
+    quote = None
+    for i, char in enumerate(sql):
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in '\'"`':
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0 and i != len(sql) - 1:
+                return False
+    return depth == 0 and quote is None
+
+
+class _Statement(collections.namedtuple('_Statement', ['index', 'operation', 'parameters',
+                                                       'batch'])):
+    """A statement run by ``executemany``. An ``INSERT`` of a batch of rows has no parameters, and
+    the list of parameters of its rows in ``batch``.
+    """
+
+    def error(self, e):
+        """Return the ``ExecuteManyError.errors`` item for the statement failing with ``e``"""
+        return self.index, self.parameters if self.batch is None else self.batch, e
+
+
+class _RowBuffer(object):
+    """Queue of rows, kept as the pages that were added to it.
+
+    Besides taking rows one at a time with :py:meth:`popleft`, :py:meth:`take` slices runs of rows
+    out of whole pages, so draining the buffer doesn't cost a method call per row.
+    """
+
+    def __init__(self):
+        self._pages = collections.deque()
+        # Rows of the first page that have been taken already
+        self._offset = 0
+        self._len = 0
+        # result_cache.Recording of the rows taken, if any
+        self.recording = None
+
+    def __len__(self):
+        return self._len
+
+    def __bool__(self):
+        return self._len > 0
+
+    def __iter__(self):
+        """Iterate over the rows without taking them"""
+        for i, page in enumerate(self._pages):
+            for row in (islice(page, self._offset, None) if i == 0 else page):
+                yield row
+
+    def __iadd__(self, rows):
+        """Add the rows as a page"""
+        page = list(rows)
+        if page:
+            self._pages.append(page)
+            self._len += len(page)
+        return self
+
+    def popleft(self):
+        if not self._len:
+            raise IndexError("pop from an empty row buffer")
+        page = self._pages[0]
+        row = page[self._offset]
+        self._len -= 1
+        self._offset += 1
+        if self._offset == len(page):
+            self._pages.popleft()
+            self._offset = 0
+        if self.recording is not None:
+            self.recording.add((row,))
+        return row
+
+    def take(self, size=None):
+        """Remove and return the first ``size`` rows, or all of them, as a list"""
+        if size is None or size > self._len:
+            size = self._len
+        rows = []
+        while size:
+            page = self._pages[0]
+            start = self._offset
+            end = min(start + size, len(page))
+            if start == 0 and end == len(page) and not rows:
+                # The page isn't shared, so hand it over instead of copying it
+                rows = page
+            else:
+                rows += page[start:end]
+            size -= end - start
+            self._len -= end - start
+            if end == len(page):
+                self._pages.popleft()
+                self._offset = 0
+            else:
+                self._offset = end
+        if self.recording is not None:
+            self.recording.add(rows)
+        return rows
+
+    def clear(self):
+        self._pages.clear()
+        self._offset = 0
+        self._len = 0
+
+
+class PollStrategy(with_metaclass(abc.ABCMeta, object)):
+    """Decides how long a cursor sleeps between requests for results that aren't ready yet.
+
+    Strategies don't hold state about a particular wait, so one can be shared between cursors.
+    """
+
+    @abc.abstractmethod
+    def delays(self, poll_interval):
+        """Return an iterator of the seconds to sleep before each successive request of one wait.
+
+        :param poll_interval: the cursor's ``poll_interval``
+        """
+        raise NotImplementedError  # pragma: no cover
+
+
+class FixedPollStrategy(PollStrategy):
+    """Always sleep ``poll_interval`` seconds"""
+
+    def delays(self, poll_interval):
+        return repeat(poll_interval)
+
+
+class ExponentialBackoffPollStrategy(PollStrategy):
+    """Sleep ``initial`` seconds at first, then ``multiplier`` times longer after each request, up
+    to ``poll_interval``. Short queries are thus noticed quickly without long queries being polled
+    more often than every ``poll_interval``.
+    """
+
+    def __init__(self, initial=0.05, multiplier=2):
+        if initial <= 0 or multiplier < 1:
+            raise ValueError("Expected initial > 0 and multiplier >= 1, got {} and {}".format(
+                initial, multiplier))
+        self.initial = initial
+        self.multiplier = multiplier
+
+    def delays(self, poll_interval):
+        delay = self.initial
+        while delay < poll_interval:
+            yield delay
+            delay *= self.multiplier
+        while True:
+            yield poll_interval
+
+
+DEFAULT_POLL_STRATEGY = ExponentialBackoffPollStrategy()
+
+
 class DBAPITypeObject(object):
     # Taken from http://www.python.org/dev/peps/pep-0249/#implementation-hints
     def __init__(self, *values):
@@ -211,6 +649,29 @@ class ParamEscaper(object):
     _TIME_FORMAT = "%H:%M:%S.%f"
     _DATETIME_FORMAT = "{} {}".format(_DATE_FORMAT, _TIME_FORMAT)
 
+    def __init__(self):
+        # type -> function escaping items of that type, filled in by escape_item
+        self._escape_functions = {}
+
+    def format(self, operation, parameters):
+        """Return ``operation % self.escape_args(parameters)``.
+
+        The operation is parsed once into literal parts and placeholders, so formatting it again
+        only escapes the parameters and joins the parts. Operations using anything other than
+        ``%s``, ``%(name)s`` and ``%%`` are formatted with ``%``.
+        """
+        escaped = self.escape_args(parameters)
+        template = _compile(operation)
+        if template is None:
+            return operation % escaped
+        if not template.binds(escaped):
+            # Let % raise its usual error
+            return operation % escaped
+        parts = list(template.parts)
+        for i, key in template.slots:
+            parts[i] = str(escaped[key])
+        return ''.join(parts)
+
     def escape_args(self, parameters):
         if isinstance(parameters, dict):
             return {k: self.escape_item(v) for k, v in parameters.items()}
@@ -244,22 +705,90 @@ class ParamEscaper(object):
         return "'{}'".format(formatted)
 
     def escape_item(self, item):
+        try:
+            escape = self._escape_functions[type(item)]
+        except KeyError:
+            escape = self._escape_functions[type(item)] = self._escape_function(item)
+        return escape(item)
+
+    def _escape_function(self, item):
+        """Return the function escaping ``item``, which also escapes every other item of its type"""
         if item is None:
-            return 'NULL'
+            return lambda item: 'NULL'
         elif isinstance(item, (int, float)):
-            return self.escape_number(item)
+            return self.escape_number
         elif isinstance(item, basestring):
-            return self.escape_string(item)
-        elif isinstance(item, Iterable):
-            return self.escape_sequence(item)
+            return self.escape_string
         elif isinstance(item, datetime.datetime):
-            return self.escape_datetime(item, self._DATETIME_FORMAT)
+            return lambda item: self.escape_datetime(item, self._DATETIME_FORMAT)
         elif isinstance(item, datetime.date):
-            return self.escape_datetime(item, self._DATE_FORMAT)
+            return lambda item: self.escape_datetime(item, self._DATE_FORMAT)
+        elif isinstance(item, Iterable):
+            return self.escape_sequence
         else:
             raise exc.ProgrammingError("Unsupported object {}".format(item))
 
 
+# %, optionally followed by a mapping key, and the conversion
+_PLACEHOLDER_PATTERN = re.compile(r'%(?:\(([^()]*)\))?(.?)', re.DOTALL)
+_MAX_TEMPLATES = 1000
+_templates = {}
+
+
+class _Template(collections.namedtuple('_Template', ['parts', 'slots', 'named'])):
+    """An operation split into ``parts``, where each ``(index, key)`` in ``slots`` is a part to
+    replace with a parameter. ``key`` is the mapping key if ``named``, else the position.
+    """
+
+    def binds(self, parameters):
+        """Return whether ``parameters`` has exactly what the placeholders refer to, going by its
+        type and length
+        """
+        if isinstance(parameters, dict):
+            return self.named or not self.slots
+        return not self.named and len(parameters) == len(self.slots)
+
+
+def _compile(operation):
+    """Return the cached :py:class:`_Template` of ``operation``, or ``None`` if it uses anything
+    other than ``%s``, ``%(name)s`` and ``%%``
+    """
+    try:
+        return _templates[operation]
+    except KeyError:
+        pass
+    parts = []
+    slots = []
+    literal = []
+    pos = 0
+    template = None
+    for match in _PLACEHOLDER_PATTERN.finditer(operation):
+        key, conversion = match.groups()
+        literal.append(operation[pos:match.start()])
+        pos = match.end()
+        if key is None and conversion == '%':
+            literal.append('%')
+        elif conversion == 's':
+            parts.append(''.join(literal))
+            literal = []
+            slots.append((len(parts), len(slots) if key is None else key))
+            parts.append(None)
+        else:
+            break
+    else:
+        literal.append(operation[pos:])
+        parts.append(''.join(literal))
+        keys = [key for _, key in slots]
+        named = all(isinstance(key, basestring) for key in keys)
+        positional = all(isinstance(key, int) for key in keys)
+        if named or positional:
+            template = _Template(tuple(parts), tuple(slots), bool(slots) and named)
+    if len(_templates) >= _MAX_TEMPLATES:
+        _templates.clear()
+    _templates[operation] = template
+    return template
+
+
 class UniversalSet(object):
     """set containing everything"""
     def __contains__(self, item):
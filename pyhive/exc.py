@@ -6,7 +6,7 @@ from __future__ import unicode_literals
 
 __all__ = [
     'Error', 'Warning', 'InterfaceError', 'DatabaseError', 'InternalError', 'OperationalError',
-    'ProgrammingError', 'DataError', 'NotSupportedError',
+    'ProgrammingError', 'DataError', 'NotSupportedError', 'ExecuteManyError',
 ]
 
 
@@ -70,3 +70,18 @@ class NotSupportedError(DatabaseError):
     has transactions turned off.
     """
     pass
+
+
+class ExecuteManyError(DatabaseError):
+    """Exception raised by a concurrent ``executemany`` when some of the statements failed. The
+    other statements have run.
+
+    :ivar errors: list of ``(index, parameters, exception)`` for the failed statements, ordered by
+        their index in ``seq_of_parameters``
+    """
+
+    def __init__(self, errors):
+        super(ExecuteManyError, self).__init__(
+            "{} statement(s) failed, the first at index {}: {!r}".format(
+                len(errors), errors[0][0], errors[0][2]))
+        self.errors = errors
@@ -8,6 +8,7 @@ Many docstrings in this file are based on the PEP, which is in the public domain
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import array
 import base64
 import datetime
 import re
@@ -15,21 +16,27 @@ from decimal import Decimal
 from ssl import CERT_NONE, CERT_OPTIONAL, CERT_REQUIRED, create_default_context
 
 
-from TCLIService import TCLIService
 from TCLIService import constants
 from TCLIService import ttypes
 from pyhive import common
+from pyhive import thrift_decoder
 from pyhive.common import DBAPITypeObject
 # Make all exceptions visible in this module per DB-API
 from pyhive.exc import *  # noqa
 from builtins import range
+import collections
 import contextlib
+import copy
 from future.utils import iteritems
 import getpass
 import logging
+import queue
 import sys
+import threading
+import time
 import thrift.transport.THttpClient
 import thrift.protocol.TBinaryProtocol
+import thrift.protocol.TCompactProtocol
 import thrift.transport.TSocket
 import thrift.transport.TTransport
 
@@ -41,6 +48,10 @@ paramstyle = 'pyformat'  # Python extended format codes, e.g. ...WHERE name=%(na
 _logger = logging.getLogger(__name__)
 
 _TIMESTAMP_PATTERN = re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+(\.\d{,6})?)')
+# Statements that change what later query results depend on, see Connection._track_session
+_USE_PATTERN = re.compile(r'\s*USE\s+`?([^`;\s]+)`?\s*;?\s*$', re.IGNORECASE)
+_SET_PATTERN = re.compile(r'\s*SET\s+([^=;\s]+)\s*=\s*(.*?)\s*;?\s*$',
+                          re.IGNORECASE | re.DOTALL)
 
 ssl_cert_parameter_map = {
     "none": CERT_NONE,
@@ -159,7 +170,13 @@ class Connection(object):
         password=None,
         check_hostname=None,
         ssl_cert=None,
-        thrift_transport=None
+        thrift_transport=None,
+        result_decompressor=None,
+        thrift_protocol='binary',
+        thrift_framed=False,
+        thrift_buffer_size=None,
+        require_fastbinary=False,
+        use_database_statement=None,
     ):
         """Connect to HiveServer2
 
@@ -172,6 +189,25 @@ class Connection(object):
         :param password: Use with auth='LDAP' or auth='CUSTOM' only
         :param thrift_transport: A ``TTransportBase`` for custom advanced usage.
             Incompatible with host, port, auth, kerberos_service_name, and password.
+        :param result_decompressor: A function to decompress result sets that HiveServer2
+            serializes in tasks (``hive.server2.thrift.resultset.serialize.in.tasks``) with a
+            compressor configured, e.g. ``zlib.decompress``. Serialized result sets are decoded
+            whether or not they are compressed.
+        :param thrift_protocol: ``binary`` (default) or ``compact``, which must match
+            ``hive.server2.thrift`` protocol configuration of the server. The C-accelerated version
+            of the protocol is used when the ``thrift`` package's ``fastbinary`` extension is
+            available and works with the generated TCLIService code.
+        :param thrift_framed: Use a framed transport instead of a buffered one. NOSASL only.
+        :param thrift_buffer_size: Read buffer size of the buffered transport. NOSASL only.
+        :param require_fastbinary: Raise ``NotSupportedError`` instead of logging a warning when
+            responses would be decoded by the pure-Python Thrift implementation.
+        :param use_database_statement: Whether to switch to ``database`` by running a ``USE``
+            statement after opening the session, instead of through the ``use:database`` session
+            configuration. ``None`` (default) sends the configuration, and for a database other
+            than ``default``, the first connection to a server checks with
+            ``SELECT current_database()`` that the server honored it. Servers that ignore it get a
+            ``USE`` statement from then on, as do custom ``thrift_transport`` servers other than
+            a ``THttpClient``, which can't be told apart.
 
         The way to support LDAP and GSSAPI is originated from cloudera/Impyla:
         https://github.com/cloudera/impyla/blob/255b07ed973d47a3395214ed92d35ec0615ebf62
@@ -206,8 +242,35 @@ class Connection(object):
                 None, None, None, None, None
             )
 
+        # Which server this is, or None for a custom transport that can't be told apart from others
+        if isinstance(thrift_transport, thrift.transport.THttpClient.THttpClient):
+            server = (thrift_transport.scheme, thrift_transport.host, thrift_transport.port,
+                      thrift_transport.path)
+        elif thrift_transport is None:
+            server = (scheme, host, 10000 if port is None else port)
+        else:
+            server = None
         username = username or getpass.getuser()
-        configuration = configuration or {}
+        # What query results depend on besides the query, for Cursor._cache_context. Results from
+        # an unknown server aren't cached.
+        self._session_context = None if server is None else (
+            server, username, database, tuple(sorted((configuration or {}).items())))
+        configuration = dict(configuration or {})
+        if use_database_statement is None and server is None and database.lower() != 'default':
+            # Checking every connection to an unknown server would cost more than USE does
+            use_database_statement = True
+        elif use_database_statement is None:
+            use_database_statement = _ignores_use_database.get(server)
+        if not use_database_statement:
+            # Saves a round trip over running USE after OpenSession
+            configuration.setdefault('use:database', database)
+        self._result_decompressor = result_decompressor
+
+        if thrift_protocol not in _THRIFT_PROTOCOLS:
+            raise ValueError("thrift_protocol must be one of {}, was {!r}".format(
+                ', '.join(sorted(_THRIFT_PROTOCOLS)), thrift_protocol))
+        if (thrift_framed or thrift_buffer_size is not None) and auth != 'NOSASL':
+            raise ValueError("thrift_framed and thrift_buffer_size can only be used in NOSASL mode")
 
         if (password is not None) != (auth in ('LDAP', 'CUSTOM')):
             raise ValueError("Password should be set if and only if in LDAP or CUSTOM mode; "
@@ -236,7 +299,13 @@ class Connection(object):
             socket = thrift.transport.TSocket.TSocket(host, port)
             if auth == 'NOSASL':
                 # NOSASL corresponds to hive.server2.authentication=NOSASL in hive-site.xml
-                self._transport = thrift.transport.TTransport.TBufferedTransport(socket)
+                if thrift_framed:
+                    self._transport = thrift.transport.TTransport.TFramedTransport(socket)
+                else:
+                    self._transport = thrift.transport.TTransport.TBufferedTransport(
+                        socket,
+                        thrift_buffer_size or thrift.transport.TTransport.DEFAULT_BUFFER,
+                    )
             elif auth in ('LDAP', 'KERBEROS', 'NONE', 'CUSTOM'):
                 # Defer import so package dependency is optional
                 import thrift_sasl
@@ -259,8 +328,18 @@ class Connection(object):
                     "Only NONE, NOSASL, LDAP, KERBEROS, CUSTOM "
                     "authentication are supported, got {}".format(auth))
 
-        protocol = thrift.protocol.TBinaryProtocol.TBinaryProtocol(self._transport)
-        self._client = TCLIService.Client(protocol)
+        protocol = _make_protocol(thrift_protocol, self._transport)
+        self._fastbinary = protocol._fast_decode is not None
+        if not self._fastbinary:
+            message = ("Thrift responses will be decoded by the pure-Python {} protocol, which is "
+                       "much slower than the fastbinary extension".format(thrift_protocol))
+            if require_fastbinary:
+                raise NotSupportedError(message)
+            if thrift_protocol not in _pure_python_protocols_logged:
+                _pure_python_protocols_logged.add(thrift_protocol)
+                _logger.warning(message)
+        # Cursors may call the client from a prefetch thread, so serialize access to the transport
+        self._client = _SynchronizedClient(thrift_decoder.Client(protocol))
         # oldest version that still contains features we care about
         # "V6 uses binary type for binary payload (was string) and uses columnar result set"
         protocol_version = ttypes.TProtocolVersion.HIVE_CLI_SERVICE_PROTOCOL_V6
@@ -278,12 +357,44 @@ class Connection(object):
             self._sessionHandle = response.sessionHandle
             assert response.serverProtocolVersion == protocol_version, \
                 "Unable to handle protocol version {}".format(response.serverProtocolVersion)
-            with contextlib.closing(self.cursor()) as cursor:
-                cursor.execute('USE `{}`'.format(database))
+            if use_database_statement is None and database.lower() != 'default':
+                use_database_statement = self._current_database() != database.lower()
+                _ignores_use_database[server] = use_database_statement
+            if use_database_statement:
+                with contextlib.closing(self.cursor()) as cursor:
+                    cursor.execute('USE `{}`'.format(database))
         except:
             self._transport.close()
             raise
 
+    def _track_session(self, sql):
+        """Update the session context for a ``USE`` or ``SET`` statement that ran"""
+        if self._session_context is None:
+            return
+        server, username, database, configuration = self._session_context
+        match = _USE_PATTERN.match(sql)
+        if match:
+            database = match.group(1)
+        else:
+            match = _SET_PATTERN.match(sql)
+            if match is None:
+                return
+            configuration = dict(configuration)
+            configuration[match.group(1)] = match.group(2)
+            configuration = tuple(sorted(configuration.items()))
+        self._session_context = (server, username, database, configuration)
+
+    def _current_database(self):
+        """Return the session's current database, or ``None`` if the server can't tell"""
+        try:
+            with contextlib.closing(self.cursor()) as cursor:
+                cursor.execute('SELECT current_database()')
+                row = cursor.fetchone()
+        except DatabaseError:
+            _logger.warning("Could not get the current database", exc_info=True)
+            return None
+        return row[0].lower() if row else None
+
     @staticmethod
     def _set_authorization_header(transport, username=None, password=None):
         username = username or "user"
@@ -354,10 +465,302 @@ class Connection(object):
     def sessionHandle(self):
         return self._sessionHandle
 
+    @property
+    def result_decompressor(self):
+        return self._result_decompressor
+
+    @property
+    def fastbinary(self):
+        """Whether Thrift responses are decoded by the C-accelerated ``fastbinary`` extension"""
+        return self._fastbinary
+
     def rollback(self):
         raise NotSupportedError("Hive does not have transactions")  # pragma: no cover
 
 
+class ConnectionPool(object):
+    """A thread-safe pool of :py:class:`Connection` objects, which reuses HiveServer2 sessions
+    instead of opening a transport and a session per query. ::
+
+        pool = hive.ConnectionPool(host='localhost', max_size=4)
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            ...
+
+    Keyword arguments other than the ones below are passed to :py:class:`Connection`.
+
+    :param min_size: Number of connections opened up front and kept open despite ``idle_timeout``.
+        This only applies at construction: connections that are discarded later, e.g. after a
+        failed health check or reset, are not replaced until a checkout needs one.
+    :param max_size: Maximum number of open connections, including checked out ones
+    :param idle_timeout: Seconds after which idle connections beyond ``min_size`` are closed, or
+        ``None`` to keep them open
+    :param timeout: Default number of seconds :py:meth:`checkout` waits for a connection when
+        ``max_size`` connections are checked out, or ``None`` to wait forever
+    :param health_check_interval: Connections that have been idle for at least this many seconds
+        are checked with a ``GetInfo`` call before they are handed out, and replaced if the call
+        fails. ``0`` checks every checkout and ``None`` disables the check.
+    :param reset_statements: Statements run when a connection is checked in, to undo session state
+        left behind by the previous user. Defaults to switching back to the initial database.
+        Connections that fail to reset are closed.
+
+    .. note::
+        This is not a part of DB-API.
+    """
+
+    def __init__(self, min_size=0, max_size=10, idle_timeout=600, timeout=None,
+                 health_check_interval=30, reset_statements=None, **kwargs):
+        if max_size < 1 or not 0 <= min_size <= max_size:
+            raise ValueError("Expected 0 <= min_size <= max_size and 1 <= max_size, "
+                             "got min_size={} and max_size={}".format(min_size, max_size))
+        if reset_statements is None:
+            reset_statements = ['USE `{}`'.format(kwargs.get('database', 'default'))]
+        self._min_size = min_size
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._health_check_interval = health_check_interval
+        self._reset_statements = list(reset_statements)
+        self._kwargs = kwargs
+
+        self._condition = threading.Condition()
+        # (connection, time it was checked in), most recently checked in last
+        self._idle = collections.deque()
+        self._checked_out = set()
+        # Open connections, including checked out ones and ones being opened
+        self._size = 0
+        self._closed = False
+        self._stats = PoolStats()
+
+        try:
+            for _ in range(min_size):
+                with self._condition:
+                    self._size += 1
+                self._idle.append((self._open(), time.time()))
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Call close"""
+        self.close()
+
+    def checkout(self, timeout=None):
+        """Return a connection from the pool, opening one if none is idle and the pool is not full.
+
+        :param timeout: Seconds to wait for a connection to be checked in when the pool is full.
+            Defaults to the pool's ``timeout``.
+        :raises: ``OperationalError`` when no connection became available in time
+        """
+        if timeout is None:
+            timeout = self._timeout
+        start = time.time()
+        deadline = None if timeout is None else start + timeout
+        while True:
+            connection, checked_in = self._reserve(deadline)
+            if connection is None:
+                connection = self._open()
+            elif (self._health_check_interval is not None
+                  and time.time() - checked_in >= self._health_check_interval
+                  and not _is_alive(connection)):
+                with self._condition:
+                    self._stats.health_check_failures += 1
+                self._discard(connection)
+                continue
+            break
+        with self._condition:
+            self._checked_out.add(connection)
+            self._stats.add_checkout(time.time() - start)
+        return connection
+
+    def checkin(self, connection):
+        """Reset a connection returned by :py:meth:`checkout` and make it available again.
+
+        Do not use the connection or its cursors afterwards.
+        """
+        with self._condition:
+            if connection not in self._checked_out:
+                raise ProgrammingError("Connection was not checked out from this pool")
+            self._checked_out.remove(connection)
+            closed = self._closed
+        if closed or not self._reset(connection):
+            self._discard(connection)
+            return
+        expired = []
+        with self._condition:
+            if self._closed:
+                self._size -= 1
+                self._stats.closed += 1
+                expired.append(connection)
+            else:
+                self._idle.append((connection, time.time()))
+                expired += self._pop_expired()
+            self._condition.notify()
+        for connection in expired:
+            _close_quietly(connection)
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks out a connection and checks it back in on exit.
+
+        See :py:meth:`checkout`.
+        """
+        connection = self.checkout(timeout)
+        try:
+            yield connection
+        finally:
+            self.checkin(connection)
+
+    def close(self):
+        """Close the idle connections, and close checked out connections when they are checked in.
+
+        Waiting and later calls to :py:meth:`checkout` raise ``InterfaceError``.
+        """
+        with self._condition:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._stats.closed += len(idle)
+            self._condition.notify_all()
+        for connection in idle:
+            _close_quietly(connection)
+
+    @property
+    def stats(self):
+        """A snapshot of the pool's :py:class:`PoolStats`"""
+        with self._condition:
+            stats = copy.copy(self._stats)
+            stats.size = self._size
+            stats.idle = len(self._idle)
+            stats.checked_out = len(self._checked_out)
+        return stats
+
+    def _reserve(self, deadline):
+        """Return an idle ``(connection, time it was checked in)``, or ``(None, None)`` after
+        reserving room for a new connection, waiting until ``deadline`` for either
+        """
+        expired = []
+        try:
+            with self._condition:
+                waited = False
+                while True:
+                    if self._closed:
+                        raise InterfaceError("Connection pool is closed")
+                    expired += self._pop_expired()
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self._max_size:
+                        self._size += 1
+                        return None, None
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        self._stats.timeouts += 1
+                        raise OperationalError(
+                            "Timed out waiting for one of {} connections".format(self._max_size))
+                    if not waited:
+                        waited = True
+                        self._stats.waits += 1
+                    self._condition.wait(remaining)
+        finally:
+            for connection in expired:
+                _close_quietly(connection)
+
+    def _pop_expired(self):
+        """Remove the connections that have been idle for longer than ``idle_timeout``. Must be
+        called while holding the lock.
+        """
+        expired = []
+        if self._idle_timeout is None:
+            return expired
+        now = time.time()
+        while (self._idle and self._size > self._min_size
+               and now - self._idle[0][1] > self._idle_timeout):
+            expired.append(self._idle.popleft()[0])
+            self._size -= 1
+            self._stats.closed += 1
+        return expired
+
+    def _open(self):
+        """Open a connection for room reserved in ``_size``"""
+        try:
+            connection = Connection(**self._kwargs)
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._stats.created += 1
+        return connection
+
+    def _discard(self, connection):
+        _close_quietly(connection)
+        with self._condition:
+            self._size -= 1
+            self._stats.closed += 1
+            self._condition.notify()
+
+    def _reset(self, connection):
+        try:
+            with contextlib.closing(connection.cursor()) as cursor:
+                for statement in self._reset_statements:
+                    cursor.execute(statement)
+        except Exception:
+            _logger.warning("Closing pooled connection that failed to reset", exc_info=True)
+            return False
+        return True
+
+
+class PoolStats(object):
+    """Statistics about a :py:class:`ConnectionPool`.
+
+    :ivar size: number of open connections, including checked out ones
+    :ivar idle: number of connections waiting in the pool
+    :ivar checked_out: number of connections checked out
+    :ivar created: number of connections opened
+    :ivar closed: number of connections closed, because they expired, failed a health check or a
+        reset, or the pool was closed
+    :ivar checkouts: number of successful checkouts
+    :ivar waits: number of checkouts that waited for a connection to be checked in
+    :ivar timeouts: number of checkouts that timed out
+    :ivar health_check_failures: number of idle connections that failed the ``GetInfo`` check
+    :ivar checkout_seconds: total time spent in successful checkouts, including opening connections
+    :ivar max_checkout_seconds: longest successful checkout
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.idle = 0
+        self.checked_out = 0
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.health_check_failures = 0
+        self.checkout_seconds = 0.0
+        self.max_checkout_seconds = 0.0
+
+    def add_checkout(self, seconds):
+        self.checkouts += 1
+        self.checkout_seconds += seconds
+        self.max_checkout_seconds = max(self.max_checkout_seconds, seconds)
+
+    @property
+    def mean_checkout_seconds(self):
+        return self.checkout_seconds / self.checkouts if self.checkouts else 0.0
+
+    def __repr__(self):
+        return ('PoolStats(size={}, idle={}, checked_out={}, created={}, closed={}, checkouts={}, '
+                'waits={}, timeouts={}, mean_checkout_seconds={:.3f})'.format(
+                    self.size, self.idle, self.checked_out, self.created, self.closed,
+                    self.checkouts, self.waits, self.timeouts, self.mean_checkout_seconds))
+
+
 class Cursor(common.DBAPICursor):
     """These objects represent a database cursor, which is used to manage the context of a fetch
     operation.
@@ -366,16 +769,52 @@ class Cursor(common.DBAPICursor):
     visible by other cursors or connections.
     """
 
-    def __init__(self, connection, arraysize=1000):
+    _escaper = _escaper
+
+    def __init__(self, connection, arraysize=1000, prefetch_pages=0, target_page_bytes=None,
+                 max_buffered_rows=None, result_cache=None, poll_interval=1, poll_strategy=None):
+        """
+        :param connection: the :py:class:`Connection` to run queries on
+        :param arraysize: number of rows to request from HiveServer2 per page
+        :param prefetch_pages: if positive, fetch up to this many pages of results on a background
+            thread while the current page is being consumed. Calls on the connection are
+            serialized, so the cursor's other operations wait for an outstanding page.
+        :param target_page_bytes: if set, adapt the number of rows requested per page so that
+            pages are about this many bytes, as estimated from the columns, where a string counts
+            one byte per character. Each query starts with ``arraysize`` rows per page. Round-trip
+            time only holds back growth: pages that take longer than ``SLOW_PAGE_SECONDS`` are
+            not made larger. See :py:attr:`fetch_stats` for the chosen sizes.
+        :param max_buffered_rows: if set, request at most this many rows per page, so that no more
+            rows than this are buffered by the cursor. Pages held by the prefetcher come on top.
+        :param result_cache: a :py:class:`~pyhive.result_cache.ResultCache` to serve queries that
+            have been run before from, keyed by the query, its parameters, and the server, user,
+            database and configuration of the connection, as changed by the ``USE`` and ``SET``
+            statements its cursors run. Results are not cached for a custom ``thrift_transport``
+            other than a ``THttpClient``, since its server is unknown. A cached result has no
+            operation on the server to poll, cancel or get logs of.
+        :param poll_interval: longest wait between status checks, e.g. of the operations
+            :py:meth:`executemany` runs concurrently
+        :param poll_strategy: a :py:class:`~pyhive.common.PollStrategy` for the waits between
+            status checks, defaults to exponential backoff capped at ``poll_interval``
+        """
         self._operationHandle = None
-        super(Cursor, self).__init__()
+        self._prefetcher = None
         self._arraysize = arraysize
+        super(Cursor, self).__init__(poll_interval, poll_strategy, max_buffered_rows,
+                                     result_cache)
+        self._prefetch_pages = prefetch_pages
+        self._target_page_bytes = target_page_bytes
         self._connection = connection
 
     def _reset_state(self):
         """Reset state about the previous query in preparation for running another query"""
         super(Cursor, self)._reset_state()
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
         self._description = None
+        self._fetch_size = self._arraysize
+        self._fetch_stats = FetchStats()
         if self._operationHandle is not None:
             request = ttypes.TCloseOperationReq(self._operationHandle)
             try:
@@ -397,6 +836,15 @@ class Cursor(common.DBAPICursor):
         except TypeError:
             self._arraysize = default_arraysize
 
+    @property
+    def fetch_stats(self):
+        """:py:class:`FetchStats` about the pages fetched for the current query.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        return self._fetch_stats
+
     @property
     def description(self):
         """This read-only attribute is a sequence of 7-item sequences.
@@ -417,27 +865,13 @@ class Cursor(common.DBAPICursor):
         The ``type_code`` can be interpreted by comparing it to the Type Objects specified in the
         section below.
         """
-        if self._operationHandle is None or not self._operationHandle.hasResultSet:
-            return None
         if self._description is None:
+            if self._operationHandle is None or not self._operationHandle.hasResultSet:
+                return None
             req = ttypes.TGetResultSetMetadataReq(self._operationHandle)
             response = self._connection.client.GetResultSetMetadata(req)
             _check_status(response)
-            columns = response.schema.columns
-            self._description = []
-            for col in columns:
-                primary_type_entry = col.typeDesc.types[0]
-                if primary_type_entry.primitiveEntry is None:
-                    # All fancy stuff maps to string
-                    type_code = ttypes.TTypeId._VALUES_TO_NAMES[ttypes.TTypeId.STRING_TYPE]
-                else:
-                    type_id = primary_type_entry.primitiveEntry.type
-                    type_code = ttypes.TTypeId._VALUES_TO_NAMES[type_id]
-                self._description.append((
-                    col.columnName.decode('utf-8') if sys.version_info[0] == 2 else col.columnName,
-                    type_code.decode('utf-8') if sys.version_info[0] == 2 else type_code,
-                    None, None, None, None, True
-                ))
+            self._description = _description(response.schema.columns)
         return self._description
 
     def __enter__(self):
@@ -463,11 +897,15 @@ class Cursor(common.DBAPICursor):
         else:
             async_ = False
 
+        key = self._cache_key(operation, parameters)
+        if key is not None and self._serve_cached(key):
+            return
+
         # Prepare statement
         if parameters is None:
             sql = operation
         else:
-            sql = operation % _escaper.escape_args(parameters)
+            sql = self._escaper.format(operation, parameters)
 
         self._reset_state()
 
@@ -480,6 +918,14 @@ class Cursor(common.DBAPICursor):
         response = self._connection.client.ExecuteStatement(req)
         _check_status(response)
         self._operationHandle = response.operationHandle
+        self._connection._track_session(sql)
+        self._record(key)
+
+    def _cache_context(self):
+        return self._connection._session_context
+
+    def _load_description(self, description):
+        self._description = description
 
     def cancel(self):
         req = ttypes.TCancelOperationReq(
@@ -488,30 +934,159 @@ class Cursor(common.DBAPICursor):
         response = self._connection.client.CancelOperation(req)
         _check_status(response)
 
-    def _fetch_more(self):
-        """Send another TFetchResultsReq and update state"""
+    def _fetch_row_set(self):
+        """Get the next page as a list of TColumns and update state"""
         assert(self._state == self._STATE_RUNNING), "Should be running when in _fetch_more"
         assert(self._operationHandle is not None), "Should have an op handle in _fetch_more"
         if not self._operationHandle.hasResultSet:
             raise ProgrammingError("No result set")
+        if self._prefetch_pages > 0:
+            if self._prefetcher is None:
+                # Get the schema before the prefetch thread takes turns on the connection
+                self.description
+                self._prefetcher = _PagePrefetcher(self._request_row_set, self._prefetch_pages)
+            columns = self._prefetcher.get()
+        else:
+            columns = self._request_row_set()
+        # response.hasMoreRows seems to always be False, so we instead check the number of rows
+        # https://github.com/apache/hive/blob/release-1.2.1/service/src/java/org/apache/hive/service/cli/thrift/ThriftCLIService.java#L678
+        # if not response.hasMoreRows:
+        if _is_last_page(columns):
+            self._state = self._STATE_FINISHED
+        return columns
+
+    def _request_row_set(self):
+        """Send another TFetchResultsReq and return the page as a list of TColumns"""
+        fetch_size = self._fetch_size if self._target_page_bytes else self.arraysize
+        if self._max_buffered_rows is not None:
+            fetch_size = min(fetch_size, self._max_buffered_rows)
         req = ttypes.TFetchResultsReq(
             operationHandle=self._operationHandle,
             orientation=ttypes.TFetchOrientation.FETCH_NEXT,
-            maxRows=self.arraysize,
+            maxRows=fetch_size,
         )
+        start = time.time()
         response = self._connection.client.FetchResults(req)
+        seconds = time.time() - start
         _check_status(response)
-        schema = self.description
         assert not response.results.rows, 'expected data in columnar format'
-        columns = [_unwrap_column(col, col_schema[1]) for col, col_schema in
-                   zip(response.results.columns, schema)]
-        new_data = list(zip(*columns))
-        self._data += new_data
-        # response.hasMoreRows seems to always be False, so we instead check the number of rows
-        # https://github.com/apache/hive/blob/release-1.2.1/service/src/java/org/apache/hive/service/cli/thrift/ThriftCLIService.java#L678
-        # if not response.hasMoreRows:
-        if not new_data:
-            self._state = self._STATE_FINISHED
+        columns = response.results.columns
+        if response.results.binaryColumns is not None:
+            columns = _decode_binary_columns(
+                response.results.binaryColumns, response.results.columnCount,
+                self._connection.result_decompressor)
+        rows = 0 if _is_last_page(columns) else len(_column_wrapper(columns[0]).values)
+        page_bytes = None
+        if self._target_page_bytes:
+            page_bytes = sum(_column_bytes(col) for col in columns)
+            if rows:
+                self._fetch_size = _adapt_fetch_size(
+                    fetch_size, rows, page_bytes, seconds, self._target_page_bytes)
+        self._fetch_stats.add_page(fetch_size, rows, page_bytes, seconds)
+        return columns
+
+    def _fetch_columns(self):
+        """Send another TFetchResultsReq and return the page as a list of value lists per column"""
+        columns = self._fetch_row_set()
+        schema = self.description
+        return [_unwrap_column(col, col_schema[1]) for col, col_schema in zip(columns, schema)]
+
+    def _fetch_more(self):
+        """Send another TFetchResultsReq and update state"""
+        self._data += zip(*self._fetch_columns())
+
+    def fetch_columns(self):
+        """Fetch the next page of a query result in columnar form, skipping the conversion of each
+        page into row tuples.
+
+        Rows already buffered by :py:meth:`fetchone` or :py:meth:`fetchmany` are returned first.
+        Otherwise, a page holds up to :py:attr:`arraysize` rows.
+
+        :returns: ``OrderedDict`` mapping each column name to a list of values, or ``None`` when no
+            more rows are available
+        :raises: ``ProgrammingError`` when no query has been started
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        if self._state == self._STATE_NONE:
+            raise ProgrammingError("No query yet")
+        # Columns bypass the buffer, so the rows can't be cached
+        self._data.recording = None
+        if self._data:
+            columns = [list(values) for values in zip(*self._data)]
+            self._data.clear()
+        elif self._state != self._STATE_FINISHED:
+            columns = self._fetch_columns()
+        else:
+            columns = None
+        if not columns or not columns[0]:
+            return None
+        self._rownumber += len(columns[0])
+        return collections.OrderedDict(
+            (col_schema[0], values) for col_schema, values in zip(self.description, columns)
+        )
+
+    def _fetch_record_batch(self, pa):
+        """Build Arrow arrays straight from the TColumns of the next page"""
+        if self._data or self._state == self._STATE_FINISHED:
+            return super(Cursor, self)._fetch_record_batch(pa)
+        self._data.recording = None
+        columns = self._fetch_row_set()
+        if self._state == self._STATE_FINISHED:
+            return None
+        description = self.description
+        arrays = [
+            _arrow_array(pa, col, col_schema[1], self._arrow_type(pa, col_schema[1]))
+            for col, col_schema in zip(columns, description)
+        ]
+        self._rownumber += len(arrays[0])
+        return pa.RecordBatch.from_arrays(arrays, names=[col[0] for col in description])
+
+    def _arrow_type(self, pa, type_code):
+        name = _ARROW_TYPES.get(type_code)
+        return getattr(pa, name)() if name else None
+
+    def _executemany_concurrently(self, statements, max_workers):
+        """Submit the statements asynchronously on this cursor's connection, with up to
+        ``max_workers`` of them running at a time, and wait for them to finish
+        """
+        pending = collections.deque(statements)
+        running = []
+        errors = []
+        delays = self._poll_strategy.delays(self._poll_interval)
+        while pending or running:
+            while pending and len(running) < max_workers:
+                statement = pending.popleft()
+                cursor = Cursor(self._connection, arraysize=self._arraysize)
+                try:
+                    cursor.execute(statement.operation, statement.parameters, async_=True)
+                except Error as e:
+                    errors.append(statement.error(e))
+                    cursor.close()
+                else:
+                    running.append((statement, cursor))
+            still_running = []
+            for statement, cursor in running:
+                try:
+                    response = cursor.poll(get_progress_update=False)
+                    state = response.operationState
+                    if state in _FAILED_STATES:
+                        raise OperationalError(response)
+                except Error as e:
+                    errors.append(statement.error(e))
+                    state = None
+                if state == ttypes.TOperationState.FINISHED_STATE or state is None:
+                    cursor.close()
+                else:
+                    still_running.append((statement, cursor))
+            if still_running and len(still_running) == len(running):
+                time.sleep(next(delays))
+            else:
+                # Start over from short delays after making progress
+                delays = self._poll_strategy.delays(self._poll_interval)
+            running = still_running
+        return sorted(errors, key=lambda error: error[0])
 
     def poll(self, get_progress_update=True):
         """Poll for and return the raw status data provided by the Hive Thrift REST API.
@@ -570,6 +1145,43 @@ class Cursor(common.DBAPICursor):
         return logs
 
 
+class FetchStats(object):
+    """Statistics about the FetchResults requests made for a query.
+
+    :ivar pages: number of FetchResults requests
+    :ivar rows: number of rows received
+    :ivar bytes: estimated size of the values received, only measured with ``target_page_bytes``
+    :ivar seconds: time spent waiting for FetchResults responses
+    :ivar fetch_sizes: the ``maxRows`` sent in each request
+    """
+
+    def __init__(self):
+        self.pages = 0
+        self.rows = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.fetch_sizes = []
+
+    def add_page(self, fetch_size, rows, page_bytes, seconds):
+        self.pages += 1
+        self.rows += rows
+        self.bytes += page_bytes or 0
+        self.seconds += seconds
+        self.fetch_sizes.append(fetch_size)
+
+    def __repr__(self):
+        return 'FetchStats(pages={}, rows={}, bytes={}, seconds={:.3f}, fetch_size={})'.format(
+            self.pages, self.rows, self.bytes, self.seconds,
+            self.fetch_sizes[-1] if self.fetch_sizes else None)
+
+
+# Bounds on the number of rows per page chosen with Cursor(target_page_bytes=...)
+MIN_FETCH_SIZE = 100
+MAX_FETCH_SIZE = 1000000
+# Pages that take longer than this are not made larger
+SLOW_PAGE_SECONDS = 10
+
+
 #
 # Type Objects and Constructors
 #
@@ -585,25 +1197,331 @@ for type_id in constants.PRIMITIVE_TYPES:
 #
 
 
-def _unwrap_column(col, type_=None):
-    """Return a list of raw values from a TColumn instance."""
+# For every possible byte of a null bit set, the offsets of the bits that are set
+_NULL_BIT_OFFSETS = tuple(
+    tuple(b for b in range(8) if byte & (1 << b)) for byte in range(256)
+)
+
+
+def _null_positions(nulls):
+    """Return the indexes marked as null in a TColumn's ``nulls`` bit set.
+
+    Bits are numbered from the least significant bit of the first byte. Zero bytes are skipped, and
+    a bit set without any nulls is detected without looking at individual bytes.
+    """
+    if not nulls.strip(b'\x00'):
+        return ()
+    positions = []
+    for i, byte in enumerate(bytearray(nulls)):
+        if byte:
+            base = i * 8
+            positions.extend([base + b for b in _NULL_BIT_OFFSETS[byte]])
+    return positions
+
+
+# Bytes per value of the fixed width columns
+_FIXED_WIDTHS = {
+    'boolVal': 1,
+    'byteVal': 1,
+    'i16Val': 2,
+    'i32Val': 4,
+    'i64Val': 8,
+    'doubleVal': 8,
+}
+
+
+def _column_bytes(col):
+    """Estimate the number of bytes a TColumn takes on the wire, counting a string's characters
+    rather than encoding it
+    """
+    wrapper = _column_wrapper(col)
+    for attr, width in iteritems(_FIXED_WIDTHS):
+        if getattr(col, attr) is not None:
+            return width * len(wrapper.values) + len(wrapper.nulls)
+    # Strings and binaries are preceded by their length
+    return sum(map(len, wrapper.values)) + 4 * len(wrapper.values) + len(wrapper.nulls)
+
+
+def _adapt_fetch_size(fetch_size, rows, page_bytes, seconds, target_page_bytes):
+    """Return the number of rows to request after a page of ``rows`` rows and ``page_bytes`` bytes
+    took ``seconds`` to fetch with ``maxRows=fetch_size``.
+
+    The size aims at ``target_page_bytes``, and time is only a brake: after a page slower than
+    ``SLOW_PAGE_SECONDS``, the size may shrink but not grow. Growth is limited to doubling per page
+    so one page of unusually narrow rows does not cause a memory spike on the next page.
+    """
+    wanted = int(target_page_bytes * rows / max(page_bytes, 1))
+    if seconds > SLOW_PAGE_SECONDS:
+        wanted = min(wanted, fetch_size)
+    return max(MIN_FETCH_SIZE, min(wanted, fetch_size * 2, MAX_FETCH_SIZE))
+
+
+# Pure-Python and C-accelerated Thrift protocols for each Connection(thrift_protocol=...)
+_THRIFT_PROTOCOLS = {
+    'binary': (thrift.protocol.TBinaryProtocol.TBinaryProtocol,
+               thrift.protocol.TBinaryProtocol.TBinaryProtocolAccelerated),
+    'compact': (thrift.protocol.TCompactProtocol.TCompactProtocol,
+                thrift.protocol.TCompactProtocol.TCompactProtocolAccelerated),
+}
+
+# Whether each accelerated protocol class can decode the generated TCLIService code
+_accelerated_protocol_works = {}
+# Protocols that connections have already warned about not being accelerated
+_pure_python_protocols_logged = set()
+# (scheme, host, port) -> whether the server ignores the use:database session configuration
+_ignores_use_database = {}
+
+
+def _make_protocol(name, transport):
+    """Return the accelerated protocol ``name`` over ``transport``, unless responses could not be
+    decoded by the ``fastbinary`` extension, in which case the pure-Python protocol is returned.
+    """
+    protocol_class, accelerated_class = _THRIFT_PROTOCOLS[name]
+    # fastbinary only decodes from transports that expose their read buffer
+    if isinstance(transport, thrift.transport.TTransport.CReadableTransport):
+        if accelerated_class not in _accelerated_protocol_works:
+            _accelerated_protocol_works[accelerated_class] = _check_accelerated(accelerated_class)
+        if _accelerated_protocol_works[accelerated_class]:
+            return accelerated_class(transport)
+    return protocol_class(transport)
+
+
+def _check_accelerated(accelerated_class):
+    """Return whether ``accelerated_class`` round-trips a TColumn with the fastbinary extension.
+
+    Depending on the ``thrift`` version, the extension may be missing, or may reject the type
+    specifications of TCLIService code generated by another version.
+    """
+    column = ttypes.TColumn(i64Val=ttypes.TI64Column(values=[1, 2], nulls=b'\x02'))
+    try:
+        out = thrift.transport.TTransport.TMemoryBuffer()
+        protocol = accelerated_class(out)
+        if protocol._fast_decode is None:
+            return False
+        column.write(protocol)
+        result = ttypes.TColumn()
+        result.read(accelerated_class(thrift.transport.TTransport.TMemoryBuffer(out.getvalue())))
+    except Exception:
+        _logger.debug("fastbinary cannot decode TCLIService types", exc_info=True)
+        return False
+    return result == column
+
+
+class _SynchronizedClient(object):
+    """Wraps a ``TCLIService.Client`` so that threads take turns using its transport"""
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+
+    @property
+    def __class__(self):
+        """The wrapped client's class, so that ``isinstance`` checks on it still pass"""
+        return self._client.__class__
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+        # e.g. the _iprot and _oprot protocols
+        if not callable(method):
+            return method
+
+        def synchronized(*args, **kwargs):
+            with self._lock:
+                return method(*args, **kwargs)
+        return synchronized
+
+
+class _PagePrefetcher(object):
+    """Calls ``fetch_page`` on a background thread until it returns the last page, holding at most
+    ``max_pages`` pages that have not been consumed by :py:meth:`get` yet.
+    """
+
+    def __init__(self, fetch_page, max_pages):
+        self._fetch_page = fetch_page
+        self._pages = queue.Queue(max_pages)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='pyhive-prefetch')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._closed.is_set():
+                page = self._fetch_page()
+                self._put((page, None))
+                if _is_last_page(page):
+                    break
+        except Exception as e:
+            self._put((None, e))
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def get(self):
+        """Return the next page, or raise the error that the background thread ran into"""
+        page, error = self._pages.get()
+        if error is not None:
+            # Keep failing on later calls, the background thread has stopped
+            self._pages.put_nowait((page, error))
+            raise error
+        return page
+
+    def close(self):
+        """Stop fetching, waiting for any outstanding request"""
+        self._closed.set()
+        self._thread.join()
+
+
+def _description(columns):
+    """Build a DB-API description from the ``TColumnDesc`` list of a result set schema"""
+    description = []
+    for col in columns:
+        primary_type_entry = col.typeDesc.types[0]
+        if primary_type_entry.primitiveEntry is None:
+            # All fancy stuff maps to string
+            type_code = ttypes.TTypeId._VALUES_TO_NAMES[ttypes.TTypeId.STRING_TYPE]
+        else:
+            type_id = primary_type_entry.primitiveEntry.type
+            type_code = ttypes.TTypeId._VALUES_TO_NAMES[type_id]
+        description.append((
+            col.columnName.decode('utf-8') if sys.version_info[0] == 2 else col.columnName,
+            type_code.decode('utf-8') if sys.version_info[0] == 2 else type_code,
+            None, None, None, None, True
+        ))
+    return description
+
+
+def _decode_binary_columns(data, column_count, decompressor=None):
+    """Return the TColumns of a result set serialized into ``TRowSet.binaryColumns``.
+
+    HiveServer2 writes each column one after the other with the compact protocol.
+    """
+    if decompressor is not None:
+        data = decompressor(data)
+    transport = thrift.transport.TTransport.TMemoryBuffer(data)
+    protocol = thrift.protocol.TCompactProtocol.TCompactProtocol(transport)
+    columns = []
+    for _ in range(column_count or 0):
+        col = ttypes.TColumn()
+        col.read(protocol)
+        columns.append(col)
+    return columns
+
+
+def _is_last_page(columns):
+    return not columns or not _column_wrapper(columns[0]).values
+
+
+def _column_wrapper(col):
+    """Return the typed column (e.g. ``TI64Column``) set in a TColumn instance."""
     for attr, wrapper in iteritems(col.__dict__):
         if wrapper is not None:
-            result = wrapper.values
-            nulls = wrapper.nulls  # bit set describing what's null
-            assert isinstance(nulls, bytes)
-            for i, char in enumerate(nulls):
-                byte = ord(char) if sys.version_info[0] == 2 else char
-                for b in range(8):
-                    if byte & (1 << b):
-                        result[i * 8 + b] = None
-            converter = TYPES_CONVERTER.get(type_, None)
-            if converter and type_:
-                result = [converter(row) if row else row for row in result]
-            return result
+            return wrapper
     raise DataError("Got empty column value {}".format(col))  # pragma: no cover
 
 
+def _unwrap_column(col, type_=None):
+    """Return a list of raw values from a TColumn instance."""
+    wrapper = _column_wrapper(col)
+    result = wrapper.values
+    nulls = wrapper.nulls  # bit set describing what's null
+    assert isinstance(nulls, bytes)
+    for i in _null_positions(nulls):
+        result[i] = None
+    converter = TYPES_CONVERTER.get(type_, None)
+    if converter and type_:
+        result = [converter(row) if row else row for row in result]
+    return result
+
+
+# pyarrow type factories for the type codes in Cursor.description. Missing types are inferred.
+_ARROW_TYPES = {
+    'BOOLEAN_TYPE': 'bool_',
+    'TINYINT_TYPE': 'int8',
+    'SMALLINT_TYPE': 'int16',
+    'INT_TYPE': 'int32',
+    'BIGINT_TYPE': 'int64',
+    'FLOAT_TYPE': 'float32',
+    'DOUBLE_TYPE': 'float64',
+    'STRING_TYPE': 'string',
+    'VARCHAR_TYPE': 'string',
+    'CHAR_TYPE': 'string',
+    'BINARY_TYPE': 'binary',
+}
+
+# array.array type codes and pyarrow types of the fixed width columns that can be copied into
+# Arrow buffers as is
+_ARRAY_TYPES = {
+    'byteVal': ('b', 'int8'),
+    'i16Val': ('h', 'int16'),
+    'i32Val': ('i', 'int32'),
+    'i64Val': ('q', 'int64'),
+    'doubleVal': ('d', 'float64'),
+}
+
+
+def _arrow_array(pa, col, type_, arrow_type):
+    """Return a ``pyarrow.Array`` with the values of a TColumn instance.
+
+    Fixed width columns reuse the TColumn null bit set as the Arrow validity bitmap, which has the
+    same bit order with the meaning of the bits inverted.
+    """
+    for attr, (typecode, wire_type) in iteritems(_ARRAY_TYPES):
+        wrapper = getattr(col, attr)
+        if wrapper is not None:
+            break
+    else:
+        return pa.array(_unwrap_column(col, type_), type=arrow_type)
+    values = array.array(str(typecode), wrapper.values)
+    size = len(values)
+    validity = None
+    if wrapper.nulls.strip(b'\x00'):
+        # The server drops trailing zero bytes of the bit set
+        nbytes = (size + 7) // 8
+        nulls = bytearray(wrapper.nulls[:nbytes].ljust(nbytes, b'\x00'))
+        validity = pa.py_buffer(bytes(bytearray(~byte & 0xFF for byte in nulls)))
+    result = pa.Array.from_buffers(
+        getattr(pa, wire_type)(), size, [validity, pa.py_buffer(values)])
+    if arrow_type is not None and result.type != arrow_type:
+        result = result.cast(arrow_type)
+    return result
+
+
+def _is_alive(connection):
+    """Check a connection with a cheap ``GetInfo`` call"""
+    try:
+        _check_status(connection.client.GetInfo(ttypes.TGetInfoReq(
+            sessionHandle=connection.sessionHandle,
+            infoType=ttypes.TGetInfoType.CLI_SERVER_NAME,
+        )))
+    except Exception:
+        _logger.info("Pooled connection failed health check", exc_info=True)
+        return False
+    return True
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        _logger.info("Failed to close pooled connection", exc_info=True)
+
+
+# Operation states that mean results can't be fetched
+_FAILED_STATES = {
+    ttypes.TOperationState.CANCELED_STATE,
+    ttypes.TOperationState.CLOSED_STATE,
+    ttypes.TOperationState.ERROR_STATE,
+    ttypes.TOperationState.UKNOWN_STATE,
+    ttypes.TOperationState.TIMEDOUT_STATE,
+}
+
+
 def _check_status(response):
     """Raise an OperationalError if the status is not success"""
     _logger.debug(response)
@@ -0,0 +1,158 @@
+"""Package private incremental JSON decoder. Do not use directly.
+
+Decoding a Presto response with ``json.loads`` needs the whole body in memory, as bytes and again
+as the decoded object. :py:func:`iter_members` instead decodes a JSON object from an iterable of
+byte chunks, one member at a time, and the elements of selected arrays one at a time. Only the
+undecoded remainder of the current chunk and the value being decoded are held in memory.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# What the scan for the end of a value looks for, outside and inside strings
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_STRING_END = re.compile(r'["\\]')
+# Numbers and literals end at whitespace or a delimiter
+_SCALAR_END = re.compile(r'[ \t\n\r,\]}]')
+_decoder = json.JSONDecoder()
+
+
+def iter_members(chunks, streamed=()):
+    """Decode the JSON object in ``chunks`` of bytes, yielding ``(key, value)`` per member.
+
+    Members whose key is in ``streamed`` and whose value is an array yield ``(key, element)`` per
+    element of the array instead.
+
+    :raises: ``ValueError`` if the JSON is malformed or isn't an object
+    """
+    reader = _Reader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key in streamed and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.expect(']')
+            else:
+                while True:
+                    yield key, reader.value()
+                    if not reader.more(']'):
+                        break
+        else:
+            yield key, reader.value()
+        if not reader.more('}'):
+            return
+
+
+class _Reader(object):
+    """Buffer of text decoded from chunks of UTF-8, which drops what has been consumed"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decode = codecs.getincrementaldecoder('utf-8')().decode
+        self._buffer = ''
+        self._pos = 0
+        # How far the scan of the current value got, relative to its start, its nesting depth and
+        # whether it stopped within a string
+        self._scan_state = (0, 0, False)
+
+    def _fill(self):
+        """Read the next chunk, returning whether there was one"""
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer = self._buffer[self._pos:] + self._decode(chunk)
+                self._pos = 0
+                return True
+        return False
+
+    def peek(self):
+        """Skip whitespace and return the next character"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Expected {!r} at {!r}".format(char, self._buffer[self._pos:][:20]))
+        self._pos += 1
+
+    def more(self, closing):
+        """Consume the separator after an element, returning ``False`` at the ``closing``
+        character
+        """
+        if self.peek() == closing:
+            self._pos += 1
+            return False
+        self.expect(',')
+        return True
+
+    def value(self):
+        """Decode the next value, once chunks up to its end have been read"""
+        self.peek()
+        self._scan_state = (0, 0, False)
+        # Decoding a partial value would start over with every chunk
+        while not self._scan() and self._fill():
+            pass
+        value, self._pos = _decoder.raw_decode(self._buffer, self._pos)
+        return value
+
+    def _scan(self):
+        """Return whether the buffer holds the whole value at the current position, scanning on
+        from where the previous call stopped. Malformed values are left for the decoder to reject.
+        """
+        buffer = self._buffer
+        start = self._pos
+        i, depth, in_string = self._scan_state
+        i += start
+        if buffer[start] not in '"[{':
+            # A number is only complete once the delimiter after it is in the buffer. Otherwise, a
+            # number split between chunks would be cut short.
+            if _SCALAR_END.search(buffer, i) is None:
+                self._scan_state = (len(buffer) - start, 0, False)
+                return False
+            return True
+        while True:
+            if in_string:
+                match = _STRING_END.search(buffer, i)
+                if match is None:
+                    i = len(buffer)
+                    break
+                if match.group() == '\\':
+                    if match.end() == len(buffer):
+                        # Resume at the backslash once the escaped character is in
+                        i = match.start()
+                        break
+                    i = match.end() + 1
+                    continue
+                in_string = False
+                i = match.end()
+                if depth == 0:
+                    return True
+            else:
+                match = _STRUCTURE.search(buffer, i)
+                if match is None:
+                    i = len(buffer)
+                    break
+                i = match.end()
+                char = match.group()
+                if char == '"':
+                    in_string = True
+                elif char in '[{':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth <= 0:
+                        return True
+        self._scan_state = (i - start, depth, in_string)
+        return False
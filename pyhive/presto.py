@@ -8,25 +8,39 @@ Many docstrings in this file are based on the PEP, which is in the public domain
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+from builtins import bytes
 from builtins import object
 from decimal import Decimal
+from past.builtins import basestring
 
 from pyhive import common
+from pyhive import json_stream
+from pyhive import presto_types
 from pyhive.common import DBAPITypeObject
 # Make all exceptions visible in this module per DB-API
 from pyhive.exc import *  # noqa
 import base64
+import collections
+import copy
 import getpass
+import hashlib
 import datetime
+import importlib
+import json
 import logging
 import requests
+import requests.adapters
 from requests.auth import HTTPBasicAuth
 import os
 
 try:  # Python 3
+    from collections.abc import Iterable
     import urllib.parse as urlparse
+    from urllib.parse import quote_plus, unquote_plus
 except ImportError:  # Python 2
+    from collections import Iterable
     import urlparse
+    from urllib import quote_plus, unquote_plus
 
 
 # PEP 249 module globals
@@ -42,6 +56,21 @@ TYPES_CONVERTER = {
     "varbinary": base64.b64decode
 }
 
+# pyarrow type factories for the type codes in Cursor.description. Missing types are inferred.
+_ARROW_TYPES = {
+    'boolean': 'bool_',
+    'tinyint': 'int8',
+    'smallint': 'int16',
+    'integer': 'int32',
+    'bigint': 'int64',
+    'real': 'float32',
+    'double': 'float64',
+    'varchar': 'string',
+    'char': 'string',
+    'varbinary': 'binary',
+}
+
+
 class PrestoParamEscaper(common.ParamEscaper):
     def escape_datetime(self, item, format):
         _type = "timestamp" if isinstance(item, datetime.datetime) else "date"
@@ -52,6 +81,22 @@ class PrestoParamEscaper(common.ParamEscaper):
 _escaper = PrestoParamEscaper()
 
 
+def _fast_json_loads():
+    """Return the ``loads`` of the fastest installed JSON library that decodes bytes, falling back
+    to the standard library
+    """
+    # Defer import so package dependency is optional
+    for name in ('orjson', 'simdjson', 'ujson'):
+        try:
+            return importlib.import_module(name).loads
+        except ImportError:
+            pass
+    return json.loads
+
+
+JSON_LOADS = _fast_json_loads()
+
+
 def connect(*args, **kwargs):
     """Constructor for creating a connection to the database. See class :py:class:`Connection` for
     arguments.
@@ -64,17 +109,37 @@ def connect(*args, **kwargs):
 class Connection(object):
     """Presto does not have a notion of a persistent connection.
 
-    Thus, these objects are small stateless factories for cursors, which do all the real work.
+    Thus, these objects are small factories for cursors, which do all the real work. Unless a
+    ``requests_session`` is given, the cursors share a ``requests.Session`` owned by the connection,
+    which keeps HTTP connections to the coordinator open between requests and queries.
     """
 
     def __init__(self, *args, **kwargs):
+        """Takes the arguments of :py:class:`Cursor`, and:
+
+        :param pool_maxsize: int -- maximum number of HTTP connections per host that the shared
+            session keeps open, defaults to 10. Use at least the number of threads running queries
+            on the connection at once.
+        :param keep_alive: bool -- reuse HTTP connections between requests, defaults to ``True``
+        """
+        pool_maxsize = kwargs.pop('pool_maxsize', requests.adapters.DEFAULT_POOLSIZE)
+        keep_alive = kwargs.pop('keep_alive', True)
         self._args = args
         self._kwargs = kwargs
+        self._session = None
+        if kwargs.get('requests_session') is None:
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+            if not keep_alive:
+                self._session.headers['Connection'] = 'close'
 
     def close(self):
-        """Presto does not have anything to close"""
+        """Close the HTTP connections of the shared session"""
         # TODO cancel outstanding queries?
-        pass
+        if self._session is not None:
+            self._session.close()
 
     def commit(self):
         """Presto does not support transactions"""
@@ -82,7 +147,36 @@ class Connection(object):
 
     def cursor(self):
         """Return a new :py:class:`Cursor` object using the connection."""
-        return Cursor(*self._args, **self._kwargs)
+        return Cursor(*self._args, **self._cursor_kwargs())
+
+    def _cursor_kwargs(self):
+        if self._session is None:
+            return self._kwargs
+        return dict(self._kwargs, requests_session=self._session)
+
+    @property
+    def http_pool_stats(self):
+        """Counts of the HTTP ``requests`` sent with the shared session since it was last closed,
+        and of the ``connections`` opened for them. The other ``reused`` requests were sent over
+        kept-alive connections.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        num_requests = num_connections = 0
+        if self._session is not None:
+            for adapter in set(self._session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        num_requests += pool.num_requests
+                        num_connections += pool.num_connections
+        return {
+            'requests': num_requests,
+            'connections': num_connections,
+            'reused': num_requests - num_connections,
+        }
 
     def rollback(self):
         raise NotSupportedError("Presto does not have transactions")  # pragma: no cover
@@ -96,12 +190,25 @@ class Cursor(common.DBAPICursor):
     visible by other cursors or connections.
     """
 
+    # Prefix of the protocol headers, e.g. X-Presto-User
+    _HEADER_PREFIX = 'X-Presto-'
+    _escaper = _escaper
+    # Bytes read at a time, and rows converted at a time, with stream_results
+    _STREAM_CHUNK_SIZE = 65536
+    _STREAM_BATCH_ROWS = 1000
+    # Prepared statements kept by a cursor before it deallocates the least recently used ones,
+    # since all of them are sent in a header with every request
+    _MAX_PREPARED_STATEMENTS = 16
+
     def __init__(self, host, port='8080', username=None, principal_username=None, catalog='hive',
                  schema='default', poll_interval=1, source='pyhive', session_props=None,
                  protocol='http', password=None, requests_session=None, requests_kwargs=None,
                  KerberosRemoteServiceName=None, KerberosPrincipal=None,
                  KerberosConfigPath=None, KerberosKeytabPath=None,
-                 KerberosCredentialCachePath=None, KerberosUseCanonicalHostname=None):
+                 KerberosCredentialCachePath=None, KerberosUseCanonicalHostname=None,
+                 poll_strategy=None, convert_types=False, json_loads=None,
+                 stream_results=False, max_buffered_rows=None, prepared_statements=False,
+                 result_cache=None):
         """
         :param host: hostname to connect to, e.g. ``presto.example.com``
         :param port: int -- port, defaults to 8080
@@ -111,7 +218,8 @@ class Cursor(common.DBAPICursor):
         :param catalog: string -- defaults to ``hive``
         :param schema: string -- defaults to ``default``
         :param poll_interval: float -- how often to ask the Presto REST interface for a progress
-            update, defaults to a second
+            update, defaults to a second. This is the longest wait between requests with the
+            default ``poll_strategy``.
         :param source: string -- arbitrary identifier (shows up in the Presto monitoring page)
         :param protocol: string -- network protocol, valid options are ``http`` and ``https``.
             defaults to ``http``
@@ -120,7 +228,8 @@ class Cursor(common.DBAPICursor):
             Prefer ``requests_kwargs={'auth': HTTPBasicAuth(username, password)}``.
             May not be specified with ``requests_kwargs['auth']``.
         :param requests_session: a ``requests.Session`` object for advanced usage. If absent, this
-            class will use the default requests behavior of making a new session per HTTP request.
+            class will use the default requests behavior of making a new session per HTTP request,
+            unless the cursor comes from a :py:class:`Connection`, which shares its own session.
             Caller is responsible for closing session.
         :param requests_kwargs: Additional ``**kwargs`` to pass to requests
         :param KerberosRemoteServiceName: string -- Presto coordinator Kerberos service name.
@@ -135,8 +244,39 @@ class Cursor(common.DBAPICursor):
             Presto coordinator for the Kerberos service principal by first resolving the
             hostname to an IP address and then doing a reverse DNS lookup for that IP address.
             This is enabled by default.
+        :param poll_strategy: a :py:class:`~pyhive.common.PollStrategy` for the waits between
+            requests while results aren't ready. Defaults to an
+            :py:class:`~pyhive.common.ExponentialBackoffPollStrategy` capped at ``poll_interval``;
+            use :py:class:`~pyhive.common.FixedPollStrategy` to always wait ``poll_interval``.
+        :param convert_types: bool -- convert values of all the types handled by
+            :py:mod:`pyhive.presto_types`, e.g. timestamps, arrays and maps, instead of only those
+            in ``TYPES_CONVERTER``. Defaults to ``False``.
+        :param json_loads: function decoding the bytes of a JSON response. Defaults to
+            ``JSON_LOADS``, which is ``orjson.loads``, ``simdjson.loads`` or ``ujson.loads`` if one
+            of those is installed, in that order, and the standard library's otherwise.
+        :param stream_results: bool -- read responses with ``stream=True`` and decode them
+            incrementally, adding rows to the cursor as they are decoded. This bounds the memory
+            used for a large page to about that of its rows, rather than several times the size of
+            the response, at the cost of slower decoding. ``json_loads`` is not used, and
+            :py:meth:`poll` leaves out the ``data``. Defaults to ``False``.
+        :param max_buffered_rows: int -- once this many rows are waiting to be fetched,
+            :py:meth:`poll` stops requesting the next page until some are consumed. Defaults to
+            ``None``, i.e. unbounded.
+        :param prepared_statements: bool -- run operations with parameters as server-side prepared
+            statements. Each distinct operation is sent once as ``PREPARE``, with its placeholders
+            replaced by ``?``, and then run with ``EXECUTE ... USING`` the escaped parameters, which
+            spares the coordinator from parsing a new statement per set of parameters. The text of
+            every prepared statement is sent in a header with each request, so a cursor keeps up to
+            16 of them and deallocates the least recently used ones beyond that. Operations
+            using other placeholders than ``%s`` and ``%(name)s``, or with a sequence among the
+            parameters, e.g. for ``IN %s``, are formatted client-side.
+            Defaults to ``False``.
+        :param result_cache: a :py:class:`~pyhive.result_cache.ResultCache` to serve queries that
+            have been run before from, keyed by the query, its parameters, and the host, user,
+            catalog, schema and session properties of the cursor.
         """
-        super(Cursor, self).__init__(poll_interval)
+        super(Cursor, self).__init__(poll_interval, poll_strategy, max_buffered_rows,
+                                     result_cache)
         # Config
         self._host = host
         self._port = port
@@ -162,6 +302,13 @@ class Cursor(common.DBAPICursor):
         self._poll_interval = poll_interval
         self._source = source
         self._session_props = session_props if session_props is not None else {}
+        self._convert_types = convert_types
+        self._json_loads = json_loads or JSON_LOADS
+        self._stream_results = stream_results
+        self._prepare = prepared_statements
+        # name -> statement of the prepared statements, as tracked by the coordinator's headers,
+        # from least to most recently used
+        self._prepared_statements = collections.OrderedDict()
         self.last_query_id = None
 
         if protocol not in ('http', 'https'):
@@ -201,6 +348,8 @@ class Cursor(common.DBAPICursor):
                 requests_kwargs['auth'] = HTTPBasicAuth(username, password)
                 if protocol != 'https':
                     raise ValueError("Protocol must be https when passing a password")
+        if stream_results:
+            requests_kwargs['stream'] = True
         self._requests_kwargs = requests_kwargs
 
         self._reset_state()
@@ -210,6 +359,10 @@ class Cursor(common.DBAPICursor):
         super(Cursor, self)._reset_state()
         self._nextUri = None
         self._columns = None
+        # (index, converter) for the columns whose values need converting, once columns are known
+        self._converters = None
+        # The last response, without its data
+        self._status = None
 
     @property
     def description(self):
@@ -241,29 +394,88 @@ class Cursor(common.DBAPICursor):
             for col in self._columns
         ]
 
-    def execute(self, operation, parameters=None):
-        """Prepare and execute a database operation (query or command).
+    def _worker_cursor(self):
+        cursor = copy.copy(self)
+        cursor._session_props = dict(self._session_props)
+        cursor._prepared_statements = collections.OrderedDict(self._prepared_statements)
+        cursor._reset_state()
+        return cursor
 
-        Return values are not defined.
-        """
+    def _get_headers(self):
+        """Return the protocol headers to send with a new query"""
+        prefix = self._HEADER_PREFIX
         headers = {
-            'X-Presto-Catalog': self._catalog,
-            'X-Presto-Schema': self._schema,
-            'X-Presto-Source': self._source,
-            'X-Presto-User': self._username,
+            prefix + 'Catalog': self._catalog,
+            prefix + 'Schema': self._schema,
+            prefix + 'Source': self._source,
+            prefix + 'User': self._username,
         }
 
         if self._session_props:
-            headers['X-Presto-Session'] = ','.join(
+            headers[prefix + 'Session'] = ','.join(
                 '{}={}'.format(propname, propval)
                 for propname, propval in self._session_props.items()
             )
+        if self._prepared_statements:
+            headers[prefix + 'Prepared-Statement'] = ','.join(
+                '{}={}'.format(name, quote_plus(statement.encode('utf-8')))
+                for name, statement in self._prepared_statements.items()
+            )
+        return headers
+
+    def _prepared(self, operation, parameters):
+        """Return the ``(name, statement, keys)`` to run ``operation`` with as a prepared
+        statement, where ``keys`` are those of the parameters for its placeholders in order, or
+        ``None`` to format it client-side
+        """
+        if not self._prepare or parameters is None:
+            return None
+        template = common._compile(operation)
+        if template is None or not template.binds(parameters):
+            return None
+        keys = [key for _, key in template.slots]
+        # A sequence expands to a parenthesized list, which a single ? can't stand for
+        if any(isinstance(parameters[key], Iterable)
+               and not isinstance(parameters[key], (basestring, bytes)) for key in keys):
+            return None
+        statement = ''.join('?' if part is None else part for part in template.parts)
+        name = 'pyhive_' + hashlib.sha1(statement.encode('utf-8')).hexdigest()
+        return name, statement, keys
+
+    def _prepare_queries(self, operation, parameters):
+        """Return the statements to run before ``operation``, i.e. nothing if it isn't run as a
+        prepared statement or the statement is already prepared, else its ``PREPARE`` preceded by
+        the ``DEALLOCATE PREPARE`` of the least recently used statements it would crowd out
+        """
+        prepared = self._prepared(operation, parameters)
+        if prepared is None:
+            return []
+        name, statement, _ = prepared
+        if name in self._prepared_statements:
+            self._prepared_statements.move_to_end(name)
+            return []
+        # Statements prepared by the user are left alone
+        names = [n for n in self._prepared_statements if n.startswith('pyhive_')]
+        evicted = names[:max(0, len(names) + 1 - self._MAX_PREPARED_STATEMENTS)]
+        return (['DEALLOCATE PREPARE ' + n for n in evicted]
+                + ['PREPARE {} FROM {}'.format(name, statement)])
+
+    def _start_query(self, operation, parameters):
+        """Reset the state for a new query and return the ``(url, body, headers)`` to POST"""
+        headers = self._get_headers()
 
         # Prepare statement
+        prepared = self._prepared(operation, parameters)
         if parameters is None:
             sql = operation
+        elif prepared is None:
+            sql = self._escaper.format(operation, parameters)
         else:
-            sql = operation % _escaper.escape_args(parameters)
+            name, _, keys = prepared
+            escaped = self._escaper.escape_args(parameters)
+            sql = 'EXECUTE ' + name
+            if keys:
+                sql += ' USING ' + ', '.join(str(escaped[key]) for key in keys)
 
         self._reset_state()
 
@@ -273,9 +485,31 @@ class Cursor(common.DBAPICursor):
             '{}:{}'.format(self._host, self._port), '/v1/statement', None, None, None))
         _logger.info('%s', sql)
         _logger.debug("Headers: %s", headers)
+        return url, sql.encode('utf-8'), headers
+
+    def execute(self, operation, parameters=None):
+        """Prepare and execute a database operation (query or command).
+
+        Return values are not defined.
+        """
+        key = self._cache_key(operation, parameters)
+        if key is not None and self._serve_cached(key):
+            return
+        for prepare in self._prepare_queries(operation, parameters):
+            self.execute(prepare)
+            self._fetch_while(lambda: self._state != self._STATE_FINISHED)
+        url, data, headers = self._start_query(operation, parameters)
         response = self._requests_session.post(
-            url, data=sql.encode('utf-8'), headers=headers, **self._requests_kwargs)
+            url, data=data, headers=headers, **self._requests_kwargs)
         self._process_response(response)
+        self._record(key)
+
+    def _cache_context(self):
+        return (self._protocol, self._host, self._port, self._username, self._catalog,
+                self._schema, tuple(sorted(self._session_props.items())), self._convert_types)
+
+    def _load_description(self, description):
+        self._columns = [{'name': col[0], 'type': col[1]} for col in description]
 
     def cancel(self):
         if self._state == self._STATE_NONE:
@@ -285,17 +519,25 @@ class Cursor(common.DBAPICursor):
             return
 
         response = self._requests_session.delete(self._nextUri, **self._requests_kwargs)
-        if response.status_code != requests.codes.no_content:
-            fmt = "Unexpected status code after cancel {}\n{}"
-            raise OperationalError(fmt.format(response.status_code, response.content))
+        try:
+            if response.status_code != requests.codes.no_content:
+                fmt = "Unexpected status code after cancel {}\n{}"
+                raise OperationalError(fmt.format(response.status_code, response.content))
+        finally:
+            # With stream_results, the connection only goes back to the pool once closed
+            response.close()
 
         self._state = self._STATE_FINISHED
         self._nextUri = None
+        # Don't cache what was fetched before cancelling as the result
+        self._data.recording = None
 
     def poll(self):
         """Poll for and return the raw status data provided by the Presto REST API.
 
-        :returns: dict -- JSON status information or ``None`` if the query is done
+        :returns: dict -- JSON status information or ``None`` if the query is done. While
+            :py:attr:`max_buffered_rows` rows are buffered, the previous status is returned again,
+            without ``data``, and no request is made.
         :raises: ``ProgrammingError`` when no query has been started
 
         .. note::
@@ -306,53 +548,125 @@ class Cursor(common.DBAPICursor):
         if self._nextUri is None:
             assert self._state == self._STATE_FINISHED, "Should be finished if nextUri is None"
             return None
-        response = self._requests_session.get(self._nextUri, **self._requests_kwargs)
-        self._process_response(response)
-        return response.json()
+        if self._buffer_full():
+            return self._status
+        return self._process_response(
+            self._requests_session.get(self._nextUri, **self._requests_kwargs), raw_data=True)
 
     def _fetch_more(self):
         """Fetch the next URI and update state"""
         self._process_response(self._requests_session.get(self._nextUri, **self._requests_kwargs))
 
     def _process_data(self, rows):
-        for i, col in enumerate(self.description):
-            col_type = col[1].split("(")[0].lower()
-            if col_type in TYPES_CONVERTER:
-                for row in rows:
-                    if row[i] is not None:
-                        row[i] = TYPES_CONVERTER[col_type](row[i])
-
-    def _process_response(self, response):
+        if self._converters is None:
+            self._converters = self._get_converters(self._columns)
+        for i, converter in self._converters:
+            for row in rows:
+                value = row[i]
+                if value is not None:
+                    row[i] = converter(value)
+
+    def _get_converters(self, columns):
+        """Return ``(index, converter)`` for each of the ``columns`` whose values need converting"""
+        converters = []
+        for i, col in enumerate(columns):
+            if self._convert_types:
+                converter = presto_types.converter(col['type'])
+            else:
+                converter = TYPES_CONVERTER.get(col['type'].split("(")[0].lower())
+            if converter is not None:
+                converters.append((i, converter))
+        return converters
+
+    def _append_data(self, rows):
+        assert self._columns
+        self._process_data(rows)
+        self._data += map(tuple, rows)
+
+    def _stream_response(self, response):
+        """Decode the response incrementally, adding rows of data to the buffer in batches as they
+        are decoded, and return the other members
+        """
+        # Columns come before data, but don't rely on it
+        members = {}
+        rows = []
+        try:
+            chunks = response.iter_content(self._STREAM_CHUNK_SIZE)
+            for key, value in json_stream.iter_members(chunks, streamed=('data',)):
+                if key != 'data':
+                    members[key] = value
+                    continue
+                rows.append(value)
+                if len(rows) == self._STREAM_BATCH_ROWS and 'columns' in members:
+                    self._columns = members['columns']
+                    self._append_data(rows)
+                    rows = []
+        finally:
+            response.close()
+        if rows:
+            self._columns = members.get('columns')
+            self._append_data(rows)
+        return members
+
+    def _arrow_type(self, pa, type_code):
+        col_type = type_code.split("(")[0].lower()
+        if col_type == 'decimal':
+            precision, scale = type_code[len('decimal('):-1].split(',')
+            return pa.decimal128(int(precision), int(scale))
+        name = _ARROW_TYPES.get(col_type)
+        return getattr(pa, name)() if name else None
+
+    def _process_response(self, response, raw_data=False):
         """Given the JSON response from Presto's REST API, update the internal state with the next
-        URI and any data from the response
+        URI and any data from the response, which is returned decoded. Rows are converted in place
+        unless ``raw_data`` is set, in which case the response keeps them as sent.
+
+        ``response`` only needs the ``status_code``, ``headers`` and ``content`` attributes of a
+        ``requests.Response``.
         """
         # TODO handle HTTP 503
         if response.status_code != requests.codes.ok:
             fmt = "Unexpected status code {}\n{}"
             raise OperationalError(fmt.format(response.status_code, response.content))
 
-        response_json = response.json()
+        if self._stream_results:
+            response_json = self._stream_response(response)
+        else:
+            response_json = self._json_loads(response.content)
         _logger.debug("Got response %s", response_json)
         assert self._state == self._STATE_RUNNING, "Should be running if processing response"
+        self._status = {k: v for k, v in response_json.items() if k != 'data'}
         self._nextUri = response_json.get('nextUri')
         self._columns = response_json.get('columns')
         if 'id' in response_json:
             self.last_query_id = response_json['id']
-        if 'X-Presto-Clear-Session' in response.headers:
-            propname = response.headers['X-Presto-Clear-Session']
-            self._session_props.pop(propname, None)
-        if 'X-Presto-Set-Session' in response.headers:
-            propname, propval = response.headers['X-Presto-Set-Session'].split('=', 1)
+        clear_session = response.headers.get(self._HEADER_PREFIX + 'Clear-Session')
+        if clear_session is not None:
+            self._session_props.pop(clear_session, None)
+        set_session = response.headers.get(self._HEADER_PREFIX + 'Set-Session')
+        if set_session is not None:
+            propname, propval = set_session.split('=', 1)
             self._session_props[propname] = propval
+        added_prepare = response.headers.get(self._HEADER_PREFIX + 'Added-Prepare')
+        if added_prepare is not None:
+            for prepared in added_prepare.split(','):
+                name, statement = prepared.split('=', 1)
+                self._prepared_statements[name.strip()] = unquote_plus(statement)
+        deallocated_prepare = response.headers.get(self._HEADER_PREFIX + 'Deallocated-Prepare')
+        if deallocated_prepare is not None:
+            for name in deallocated_prepare.split(','):
+                self._prepared_statements.pop(unquote_plus(name.strip()), None)
         if 'data' in response_json:
-            assert self._columns
-            new_data = response_json['data']
-            self._process_data(new_data)
-            self._data += map(tuple, new_data)
+            rows = response_json['data']
+            if raw_data:
+                response_json = dict(response_json, data=[list(row) for row in rows])
+            self._append_data(rows)
         if 'nextUri' not in response_json:
             self._state = self._STATE_FINISHED
         if 'error' in response_json:
+            self._data.recording = None
             raise DatabaseError(response_json['error'])
+        return response_json
 
 
 #
@@ -0,0 +1,282 @@
+"""Conversion of Presto and Trino values from their JSON representation to Python objects.
+
+:py:func:`converter` compiles a type signature from the ``columns`` of a query result, such as
+``array(row(x bigint, y timestamp(3) with time zone))``, into a function that converts values of
+that type. Conversions are:
+
+- ``decimal`` to ``decimal.Decimal``
+- ``real`` and ``double`` to ``float``, including ``NaN`` and infinities, which arrive as strings
+- ``varbinary`` from base64 to ``bytes``
+- ``date``, ``time`` and ``timestamp``, with or without time zone, to ``datetime`` objects. Digits
+  beyond microseconds are truncated.
+- ``interval day to second`` to ``datetime.timedelta``
+- ``json`` to the decoded value
+- ``uuid`` to ``uuid.UUID``
+- ``ipaddress`` to ``ipaddress.IPv4Address`` or ``ipaddress.IPv6Address``
+- ``array`` to ``list``, ``map`` to ``dict`` and ``row`` to ``tuple``, converting their elements
+
+Values of other types, e.g. ``varchar`` and ``bigint``, are left alone.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import base64
+import datetime
+import ipaddress
+import json
+import uuid
+from decimal import Decimal
+
+from dateutil import tz
+
+
+def converter(type_signature):
+    """Return a function converting non-null values of the given type, or ``None`` if values of
+    the type are left as they are.
+    """
+    name, params = _parse(type_signature)
+    if name == 'array':
+        return _array_converter(converter(params[0]))
+    if name == 'map':
+        return _map_converter(_key_converter(params[0]), converter(params[1]))
+    if name == 'row':
+        return _row_converter([converter(_row_field_type(param)) for param in params])
+    return _SCALAR_CONVERTERS.get(name)
+
+
+def _parse(type_signature):
+    """Split a type signature into its lower case name, e.g. ``timestamp with time zone``, and
+    its top level parameters, e.g. ``['3']``
+    """
+    type_signature = type_signature.strip()
+    start = type_signature.find('(')
+    if start == -1:
+        return type_signature.lower(), []
+    end = _closing_paren(type_signature, start)
+    name = type_signature[:start].strip() + type_signature[end + 1:].rstrip()
+    return name.lower(), _split_params(type_signature[start + 1:end])
+
+
+def _closing_paren(type_signature, start):
+    depth = 0
+    quoted = False
+    for i in range(start, len(type_signature)):
+        char = type_signature[i]
+        if char == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError("Unbalanced parentheses in type {!r}".format(type_signature))
+
+
+def _split_params(params):
+    """Split a parameter list at the commas that are not nested in parentheses or quotes"""
+    result = []
+    depth = 0
+    quoted = False
+    start = 0
+    for i, char in enumerate(params):
+        if char == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            result.append(params[start:i].strip())
+            start = i + 1
+    result.append(params[start:].strip())
+    return result
+
+
+def _row_field_type(field):
+    """Return the type of a row field, which may be preceded by a (possibly quoted) name"""
+    if field.startswith('"'):
+        return field[field.index('"', 1) + 1:]
+    name, _, rest = field.partition(' ')
+    if rest and _is_type(rest):
+        return rest
+    # An anonymous field, e.g. the ``time with time zone`` of ``row(time with time zone)``
+    return field
+
+
+def _is_type(type_signature):
+    name = _parse(type_signature)[0]
+    return name in _KNOWN_TYPES or name in _SCALAR_CONVERTERS
+
+
+def _array_converter(element):
+    if element is None:
+        return None
+
+    def convert(value):
+        return [None if item is None else element(item) for item in value]
+    return convert
+
+
+def _map_converter(key, value_converter):
+    if key is None and value_converter is None:
+        return None
+    key = key or _identity
+    value_converter = value_converter or _identity
+
+    def convert(value):
+        return {
+            key(k): None if v is None else value_converter(v)
+            for k, v in value.items()
+        }
+    return convert
+
+
+def _key_converter(type_signature):
+    """Map keys are JSON object keys, so they arrive as strings even for numbers and booleans"""
+    name = _parse(type_signature)[0]
+    if name in _INTEGER_TYPES:
+        return int
+    if name == 'boolean':
+        return _boolean_key
+    if name in ('real', 'double'):
+        return float
+    return converter(type_signature)
+
+
+def _row_converter(fields):
+    if not any(fields):
+        return tuple
+    fields = [(i, field) for i, field in enumerate(fields) if field is not None]
+
+    def convert(value):
+        value = list(value)
+        for i, field in fields:
+            item = value[i]
+            if item is not None:
+                value[i] = field(item)
+        return tuple(value)
+    return convert
+
+
+def _identity(value):
+    return value
+
+
+def _boolean_key(value):
+    return value == 'true'
+
+
+def _float(value):
+    # NaN and infinities are sent as strings
+    return float(value)
+
+
+def _date(value):
+    return datetime.date(int(value[0:4]), int(value[5:7]), int(value[8:10]))
+
+
+def _microseconds(fraction):
+    return int(fraction[:6].ljust(6, '0')) if fraction else 0
+
+
+def _timestamp(value):
+    # 2001-08-22 03:04:05.321
+    return datetime.datetime(
+        int(value[0:4]), int(value[5:7]), int(value[8:10]),
+        int(value[11:13]), int(value[14:16]), int(value[17:19]), _microseconds(value[20:]),
+    )
+
+
+def _timestamp_with_time_zone(value):
+    # 2001-08-22 03:04:05.321 America/Los_Angeles
+    value, _, zone = value.rpartition(' ')
+    return _timestamp(value).replace(tzinfo=_time_zone(zone))
+
+
+def _time(value):
+    # 01:02:03.456
+    return datetime.time(
+        int(value[0:2]), int(value[3:5]), int(value[6:8]), _microseconds(value[9:]))
+
+
+def _time_with_time_zone(value):
+    # 01:02:03.456+05:45, or 01:02:03.456 UTC
+    if ' ' in value:
+        value, _, zone = value.rpartition(' ')
+    else:
+        split = max(value.rfind('+'), value.rfind('-'))
+        value, zone = value[:split], value[split:]
+    return _time(value).replace(tzinfo=_time_zone(zone))
+
+
+_time_zones = {}
+
+
+def _time_zone(name):
+    zone = _time_zones.get(name)
+    if zone is None:
+        if name in ('UTC', 'Z'):
+            zone = tz.tzutc()
+        elif name[0] in '+-':
+            sign = -1 if name[0] == '-' else 1
+            hours, _, minutes = name[1:].partition(':')
+            zone = tz.tzoffset(None, sign * (int(hours) * 3600 + int(minutes or 0) * 60))
+        else:
+            zone = tz.gettz(name)
+            if zone is None:
+                raise ValueError("Unknown time zone {!r}".format(name))
+        _time_zones[name] = zone
+    return zone
+
+
+def _interval_day_to_second(value):
+    # -2 03:04:05.678
+    negative = value.startswith('-')
+    days, _, time = value.lstrip('-').partition(' ')
+    delta = datetime.timedelta(
+        days=int(days), hours=int(time[0:2]), minutes=int(time[3:5]), seconds=int(time[6:8]),
+        microseconds=_microseconds(time[9:]),
+    )
+    return -delta if negative else delta
+
+
+def _json(value):
+    return json.loads(value)
+
+
+def _ipaddress(value):
+    return ipaddress.ip_address(value)
+
+
+_INTEGER_TYPES = {'tinyint', 'smallint', 'integer', 'bigint'}
+
+# Types without a conversion, for telling row field names from types
+_KNOWN_TYPES = _INTEGER_TYPES | {
+    'array', 'map', 'row', 'boolean', 'varchar', 'char', 'interval year to month', 'unknown',
+    'hyperloglog', 'p4hyperloglog', 'qdigest', 'tdigest', 'setdigest', 'geometry',
+    'sphericalgeography', 'color',
+}
+
+_SCALAR_CONVERTERS = {
+    'decimal': Decimal,
+    'real': _float,
+    'double': _float,
+    'varbinary': base64.b64decode,
+    'date': _date,
+    'timestamp': _timestamp,
+    'timestamp without time zone': _timestamp,
+    'timestamp with time zone': _timestamp_with_time_zone,
+    'time': _time,
+    'time without time zone': _time,
+    'time with time zone': _time_with_time_zone,
+    'interval day to second': _interval_day_to_second,
+    'json': _json,
+    'uuid': uuid.UUID,
+    'ipaddress': _ipaddress,
+}
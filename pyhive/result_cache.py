@@ -0,0 +1,295 @@
+"""Cache of query results, shared by the cursors it is passed to as ``result_cache``.
+
+A cursor with a cache serves a ``SELECT`` or ``WITH`` query that has been run before from the
+cache, without contacting the server, until the entry expires. Results are keyed by the query with
+its whitespace normalized, the parameters, and what the cursor knows of its session, e.g. the host,
+user, catalog, schema or database and session properties. A result is cached once all of its rows
+have been fetched. ::
+
+    cache = ResultCache(max_bytes=256 * 1024 * 1024, ttl=300)
+    cursor = presto.connect('localhost', result_cache=cache).cursor()
+
+Results are held in memory, pickled, and evicted in least recently used order beyond ``max_bytes``.
+With a ``directory``, they are written there as well, so that other processes and later runs can
+read them back while they haven't expired.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+import collections
+import copy
+import hashlib
+import logging
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Statements whose results are cached, optionally parenthesized
+_CACHEABLE_PATTERN = re.compile(r'[\s(]*(SELECT|WITH)\b', re.IGNORECASE)
+# Quoted strings and identifiers, which are left alone, or runs of whitespace
+_NORMALIZE_PATTERN = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`)|\s+""")
+# Recorded rows are pickled this many at a time
+_PAGE_ROWS = 1000
+_PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+class ResultCache(object):
+    """Thread-safe cache of query results, in memory and optionally on disk.
+
+    .. note::
+        Cached results are only as fresh as ``ttl`` allows, and the session state of a key is what
+        the cursor tracks: its connection's settings, and for Hive the ``USE`` and ``SET``
+        statements run on its connection. Session state changed otherwise, e.g. by a ``USE`` or
+        ``SET`` within a larger statement, or by a server-side hook, is not part of it.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300, directory=None):
+        """
+        :param max_bytes: the budget of pickled bytes held in memory. Results larger than this are
+            not cached.
+        :param ttl: seconds after which an entry expires, or ``None`` to keep entries until they
+            are evicted
+        :param directory: if set, also write entries to files in this existing directory, and look
+            for entries missing from memory there. Only use a directory that nobody else can write
+            to, since the files are unpickled.
+        """
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive, was {}".format(max_bytes))
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._directory = directory
+        self._lock = threading.Lock()
+        # key -> _Entry, from least to most recently used
+        self._entries = collections.OrderedDict()
+        self._stats = CacheStats()
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def stats(self):
+        """A snapshot of the :py:class:`CacheStats`"""
+        with self._lock:
+            return copy.copy(self._stats)
+
+    def is_cacheable(self, operation):
+        """Return whether the results of ``operation`` are cached, i.e. it's a query"""
+        return _CACHEABLE_PATTERN.match(operation) is not None
+
+    def key(self, operation, parameters, context):
+        """Return the key of the result of ``operation`` with ``parameters``, run in a session
+        described by the ``context`` tuple
+        """
+        operation = _NORMALIZE_PATTERN.sub(
+            lambda match: match.group(1) or ' ', operation).strip().rstrip(';').rstrip()
+        if isinstance(parameters, dict):
+            parameters = sorted(parameters.items())
+        elif parameters is not None:
+            parameters = tuple(parameters)
+        return repr((operation, parameters, context))
+
+    def get(self, key):
+        """Return the cached ``(description, rows)`` under ``key``, or ``None``"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expired(now):
+                self._remove(key)
+                self._stats.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats.hits += 1
+        if entry is None and self._directory is not None:
+            entry = self._read(key, now)
+            with self._lock:
+                if entry is not None:
+                    self._add(key, entry)
+                    self._stats.hits += 1
+                    self._stats.disk_hits += 1
+        if entry is None:
+            with self._lock:
+                self._stats.misses += 1
+            return None
+        description = pickle.loads(entry.pages[0])
+        rows = []
+        for page in entry.pages[1:]:
+            rows += pickle.loads(page)
+        return description, rows
+
+    def put(self, key, description, rows):
+        """Cache ``description`` and ``rows`` under ``key``"""
+        recording = self.record(key)
+        recording.add(rows)
+        recording.finish(description)
+
+    def record(self, key):
+        """Return a :py:class:`Recording` of a result to cache under ``key``"""
+        return Recording(self, key)
+
+    def clear(self):
+        """Remove every entry, including those on disk"""
+        with self._lock:
+            self._entries.clear()
+            self._stats.entries = self._stats.bytes = 0
+        if self._directory is not None:
+            for name in os.listdir(self._directory):
+                if name.endswith('.pickle'):
+                    _remove_file(os.path.join(self._directory, name))
+
+    def _put(self, key, pages):
+        entry = _Entry(None if self._ttl is None else time.time() + self._ttl, pages)
+        if entry.size > self._max_bytes:
+            return
+        with self._lock:
+            self._add(key, entry)
+        if self._directory is not None:
+            self._write(key, entry)
+
+    def _add(self, key, entry):
+        """Add the entry, evicting the least recently used ones beyond the budget. Call with the
+        lock held.
+        """
+        self._remove(key)
+        self._entries[key] = entry
+        self._stats.entries += 1
+        self._stats.bytes += entry.size
+        while self._stats.bytes > self._max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._stats.entries -= 1
+            self._stats.bytes -= entry.size
+
+    def _path(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pickle'
+        return os.path.join(self._directory, name)
+
+    def _read(self, key, now):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                file_key, expires, pages = pickle.load(f)
+        except (IOError, OSError):
+            return None
+        except Exception:
+            _logger.warning("Ignoring unreadable result cache file %s", path, exc_info=True)
+            return None
+        entry = _Entry(expires, pages)
+        if file_key != key:
+            return None
+        if entry.expired(now):
+            _remove_file(path)
+            with self._lock:
+                self._stats.expirations += 1
+            return None
+        return entry
+
+    def _write(self, key, entry):
+        path = self._path(key)
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((key, entry.expires, entry.pages), f, _PICKLE_PROTOCOL)
+            # Readers see either the old file or the new one
+            os.replace(temp_path, path)
+        except (IOError, OSError):
+            _logger.warning("Failed to write result cache file %s", path, exc_info=True)
+            if temp_path is not None:
+                _remove_file(temp_path)
+
+
+class Recording(object):
+    """Rows of a result being recorded, which are cached with :py:meth:`finish`.
+
+    Rows are pickled as they are added, and recording stops once they outgrow the cache.
+    """
+
+    def __init__(self, cache, key):
+        self._cache = cache
+        self._key = key
+        self._rows = []
+        # Pickled pages of rows, or None when the result is too large to cache
+        self._pages = []
+        self._size = 0
+
+    def add(self, rows):
+        if self._pages is not None:
+            self._rows += rows
+            if len(self._rows) >= _PAGE_ROWS:
+                self._flush()
+
+    def finish(self, description):
+        """Cache the rows added so far, as the whole result"""
+        self._flush()
+        if self._pages is not None:
+            self._cache._put(self._key,
+                             [pickle.dumps(description, _PICKLE_PROTOCOL)] + self._pages)
+
+    def _flush(self):
+        if self._pages is not None and self._rows:
+            page = pickle.dumps(self._rows, _PICKLE_PROTOCOL)
+            self._rows = []
+            self._size += len(page)
+            if self._size > self._cache.max_bytes:
+                self._pages = None
+            else:
+                self._pages.append(page)
+
+
+class CacheStats(object):
+    """Statistics about a :py:class:`ResultCache`.
+
+    :ivar hits: number of results served from the cache
+    :ivar disk_hits: number of the ``hits`` that were read from disk
+    :ivar misses: number of results looked up but not found
+    :ivar evictions: number of entries removed from memory to stay within ``max_bytes``
+    :ivar expirations: number of entries found to have expired
+    :ivar entries: number of entries in memory
+    :ivar bytes: size of the entries in memory
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.entries = 0
+        self.bytes = 0
+
+    def __repr__(self):
+        return ('CacheStats(hits={}, disk_hits={}, misses={}, evictions={}, expirations={}, '
+                'entries={}, bytes={})'.format(
+                    self.hits, self.disk_hits, self.misses, self.evictions, self.expirations,
+                    self.entries, self.bytes))
+
+
+class _Entry(collections.namedtuple('_Entry', ['expires', 'pages'])):
+    """Pickled description followed by pickled pages of rows, and when they expire"""
+
+    @property
+    def size(self):
+        return sum(len(page) for page in self.pages)
+
+    def expired(self, now):
+        return self.expires is not None and now >= self.expires
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,213 @@
+"""Hive asyncio integration tests.
+
+These run against a small in-process TCLIService server, so they don't need HiveServer2.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import asyncio
+import struct
+import unittest
+
+from TCLIService import TCLIService
+from TCLIService import ttypes
+from pyhive.aio import hive
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import TTransport
+
+_SUCCESS = ttypes.TStatus(statusCode=ttypes.TStatusCode.SUCCESS_STATUS)
+_V6 = ttypes.TProtocolVersion.HIVE_CLI_SERVICE_PROTOCOL_V6
+
+
+def _handle(n):
+    return ttypes.THandleIdentifier(guid=struct.pack('>12xI', n), secret=b'\x00' * 16)
+
+
+def _i32_column(values):
+    return ttypes.TColumn(i32Val=ttypes.TI32Column(values=values, nulls=b''))
+
+
+class _Handler(object):
+    """TCLIService handler serving the rows 0..rows-1 of a single INT column ``a``"""
+
+    def __init__(self, rows=5, running_polls=0, final_state=ttypes.TOperationState.FINISHED_STATE):
+        self.rows = rows
+        self.running_polls = running_polls
+        self.final_state = final_state
+        self.calls = []
+        self.offset = 0
+
+    def OpenSession(self, req):
+        self.calls.append(('OpenSession', req.configuration))
+        return ttypes.TOpenSessionResp(status=_SUCCESS, serverProtocolVersion=_V6,
+                                       sessionHandle=ttypes.TSessionHandle(_handle(1)))
+
+    def CloseSession(self, req):
+        self.calls.append(('CloseSession', None))
+        return ttypes.TCloseSessionResp(status=_SUCCESS)
+
+    def ExecuteStatement(self, req):
+        self.calls.append(('ExecuteStatement', req.statement, req.runAsync))
+        self.offset = 0
+        handle = ttypes.TOperationHandle(
+            operationId=_handle(2), operationType=ttypes.TOperationType.EXECUTE_STATEMENT,
+            hasResultSet=True)
+        return ttypes.TExecuteStatementResp(status=_SUCCESS, operationHandle=handle)
+
+    def GetOperationStatus(self, req):
+        self.calls.append(('GetOperationStatus', None))
+        if self.running_polls:
+            self.running_polls -= 1
+            state = ttypes.TOperationState.RUNNING_STATE
+        else:
+            state = self.final_state
+        return ttypes.TGetOperationStatusResp(status=_SUCCESS, operationState=state)
+
+    def GetResultSetMetadata(self, req):
+        return ttypes.TGetResultSetMetadataResp(status=_SUCCESS, schema=ttypes.TTableSchema([
+            ttypes.TColumnDesc(columnName='a', position=1, typeDesc=ttypes.TTypeDesc([
+                ttypes.TTypeEntry(primitiveEntry=ttypes.TPrimitiveTypeEntry(
+                    type=ttypes.TTypeId.INT_TYPE))])),
+        ]))
+
+    def FetchResults(self, req):
+        self.calls.append(('FetchResults', req.maxRows))
+        values = list(range(self.offset, min(self.offset + req.maxRows, self.rows)))
+        self.offset += len(values)
+        return ttypes.TFetchResultsResp(status=_SUCCESS, results=ttypes.TRowSet(
+            startRowOffset=0, rows=[], columns=[_i32_column(values)]))
+
+    def CloseOperation(self, req):
+        self.calls.append(('CloseOperation', None))
+        return ttypes.TCloseOperationResp(status=_SUCCESS)
+
+
+class _Server(object):
+    """Serve a handler over SASL PLAIN, or over a framed transport when ``sasl`` is false"""
+
+    def __init__(self, handler, sasl=True, delay=0):
+        self.processor = TCLIService.Processor(handler)
+        self.sasl = sasl
+        self.delay = delay
+        self.sasl_responses = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        try:
+            if self.sasl:
+                for _ in range(2):
+                    status, length = struct.unpack('>BI', await reader.readexactly(5))
+                    self.sasl_responses.append((status, await reader.readexactly(length)))
+                writer.write(struct.pack('>BI', hive._SASL_COMPLETE, 0))
+            while True:
+                length, = struct.unpack('>I', await reader.readexactly(4))
+                iprot = TBinaryProtocol.TBinaryProtocol(
+                    TTransport.TMemoryBuffer(await reader.readexactly(length)))
+                out = TTransport.TMemoryBuffer()
+                self.processor.process(iprot, TBinaryProtocol.TBinaryProtocol(out))
+                await asyncio.sleep(self.delay)
+                writer.write(struct.pack('>I', len(out.getvalue())) + out.getvalue())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class TestAioHive(unittest.IsolatedAsyncioTestCase):
+    async def _connect(self, handler, sasl=True, delay=0, **kwargs):
+        server = _Server(handler, sasl=sasl, delay=delay)
+        port = await server.start()
+        self.addAsyncCleanup(server.stop)
+        if not sasl:
+            kwargs.update(auth='NOSASL', thrift_framed=True)
+        connection = await hive.connect('127.0.0.1', port, username='user', database='db', **kwargs)
+        return server, connection
+
+    async def test_execute(self):
+        handler = _Handler(rows=5)
+        server, connection = await self._connect(handler)
+        self.assertEqual(server.sasl_responses, [(1, b'PLAIN'), (2, b'\x00user\x00x')])
+        self.assertEqual(handler.calls[0], ('OpenSession', {'use:database': 'db'}))
+        async with connection:
+            cursor = connection.cursor(arraysize=2)
+            await cursor.execute('SELECT a FROM t WHERE b = %s', ["'"])
+            self.assertEqual(handler.calls[-1],
+                             ('ExecuteStatement', "SELECT a FROM t WHERE b = '\\''", False))
+            self.assertEqual(cursor.description, [('a', 'INT_TYPE', None, None, None, None, True)])
+            self.assertEqual(await cursor.fetchone(), (0,))
+            self.assertEqual(await cursor.fetchmany(3), [(1,), (2,), (3,)])
+            self.assertEqual(await cursor.fetchall(), [(4,)])
+            self.assertEqual(await cursor.fetchmany(), [])
+            self.assertEqual(cursor.rownumber, 5)
+            await cursor.close()
+        self.assertEqual(handler.calls[-2:], [('CloseOperation', None), ('CloseSession', None)])
+
+    async def test_async_execute(self):
+        handler = _Handler(rows=3, running_polls=2)
+        server, connection = await self._connect(handler, sasl=False)
+        cursor = connection.cursor(poll_interval=0)
+        await cursor.execute('SELECT a FROM t', async_=True)
+        self.assertIsNone(cursor.description)
+        self.assertEqual([row async for row in cursor], [(0,), (1,), (2,)])
+        self.assertEqual(cursor.description[0][:2], ('a', 'INT_TYPE'))
+        self.assertEqual(
+            [call[0] for call in handler.calls].count('GetOperationStatus'), 3)
+        await connection.close()
+
+    async def test_concurrent_cursors(self):
+        handler = _Handler(rows=0)
+        server, connection = await self._connect(handler)
+        cursors = [connection.cursor() for _ in range(20)]
+        await asyncio.gather(*[cursor.execute('SELECT 1') for cursor in cursors])
+        self.assertEqual([call[0] for call in handler.calls].count('ExecuteStatement'), 20)
+        await connection.close()
+
+    async def test_failed_operation(self):
+        handler = _Handler(final_state=ttypes.TOperationState.ERROR_STATE)
+        server, connection = await self._connect(handler)
+        cursor = connection.cursor()
+        await cursor.execute('SELECT a FROM t', async_=True)
+        with self.assertRaises(hive.OperationalError):
+            await cursor.fetchall()
+        await connection.close()
+
+    async def test_no_query(self):
+        server, connection = await self._connect(_Handler())
+        with self.assertRaises(hive.ProgrammingError):
+            await connection.cursor().fetchone()
+        with self.assertRaises(hive.ProgrammingError):
+            await connection.cursor().poll()
+        await connection.close()
+
+    async def test_use_database_statement(self):
+        handler = _Handler()
+        server, connection = await self._connect(handler, use_database_statement=True)
+        self.assertEqual(handler.calls[:2], [('OpenSession', {}),
+                                             ('ExecuteStatement', 'USE `db`', False)])
+        await connection.close()
+
+    async def test_interrupted_call(self):
+        handler = _Handler()
+        server, connection = await self._connect(handler, delay=0.05)
+        cursor = connection.cursor()
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(cursor.execute('SELECT a FROM t'), 0.01)
+        self.assertEqual(handler.calls[-1][0], 'ExecuteStatement')
+        with self.assertRaises(hive.OperationalError):
+            await connection.cursor().execute('SELECT a FROM t')
+        await connection.close()
+        self.assertNotIn('CloseSession', [call[0] for call in handler.calls])
+
+    def test_unsupported_auth(self):
+        self.assertRaises(NotImplementedError, hive.Connection, 'localhost', auth='NOSASL')
+        self.assertRaises(NotImplementedError, hive.Connection, 'localhost', auth='PAM')
+        self.assertRaises(ValueError, hive.Connection, 'localhost', thrift_framed=True)
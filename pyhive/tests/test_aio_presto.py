@@ -0,0 +1,162 @@
+"""Presto and Trino asyncio integration tests.
+
+These run against a small in-process imitation of the coordinator's REST API.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import asyncio
+import unittest
+
+try:
+    from aiohttp import web
+    from pyhive.aio import presto
+    from pyhive.aio import trino
+except ImportError:
+    web = None
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+_COLUMNS = [{'name': 'a', 'type': 'integer'}, {'name': 'b', 'type': 'varbinary'}]
+
+
+class _Coordinator(object):
+    """Serve a query with one empty page and then ``pages`` of data"""
+
+    def __init__(self, pages, prefix='X-Presto-'):
+        self.pages = pages
+        self.prefix = prefix
+        self.requests = []
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/v1/statement', self._post)
+        app.router.add_get('/v1/statement/{query}/{token}', self._get)
+        app.router.add_delete('/v1/statement/{query}/{token}', self._delete)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def _page(self, request, token):
+        payload = {'id': 'query1'}
+        if token < len(self.pages):
+            payload['nextUri'] = '{}://{}/v1/statement/query1/{}'.format(
+                request.scheme, request.host, token + 1)
+        if token > 0:
+            payload['columns'] = _COLUMNS
+            payload['data'] = self.pages[token - 1]
+        return web.json_response(payload, headers={self.prefix + 'Set-Session': 'a=1'})
+
+    async def _post(self, request):
+        self.requests.append(('POST', dict(request.headers), await request.text()))
+        return self._page(request, 0)
+
+    async def _get(self, request):
+        self.requests.append(('GET', request.match_info['token']))
+        return self._page(request, int(request.match_info['token']))
+
+    async def _delete(self, request):
+        self.requests.append(('DELETE', request.match_info['token']))
+        return web.Response(status=204)
+
+
+@unittest.skipIf(web is None, 'aiohttp is not installed')
+class TestAioPresto(unittest.IsolatedAsyncioTestCase):
+    module = 'presto'
+    prefix = 'X-Presto-'
+
+    async def _connect(self, pages, **kwargs):
+        coordinator = _Coordinator(pages, self.prefix)
+        port = await coordinator.start()
+        self.addAsyncCleanup(coordinator.stop)
+        module = presto if self.module == 'presto' else trino
+        connection = module.connect('127.0.0.1', port=port, poll_interval=0, **kwargs)
+        self.addAsyncCleanup(connection.close)
+        return coordinator, connection
+
+    async def test_execute(self):
+        coordinator, connection = await self._connect(
+            [[[1, 'AAE=']], [[2, None], [3, '']]], username='user', source='test')
+        cursor = connection.cursor()
+        await cursor.execute('SELECT %(x)s', {'x': "'"})
+        method, headers, body = coordinator.requests[0]
+        self.assertEqual(body, "SELECT ''''")
+        self.assertEqual(headers[self.prefix + 'User'], 'user')
+        self.assertEqual(headers[self.prefix + 'Source'], 'test')
+        self.assertIsNone(cursor.description)
+        self.assertEqual(await cursor.fetchone(), (1, b'\x00\x01'))
+        self.assertEqual(cursor.description, [
+            ('a', 'integer', None, None, None, None, True),
+            ('b', 'varbinary', None, None, None, None, True),
+        ])
+        self.assertEqual(await cursor.fetchall(), [(2, None), (3, b'')])
+        self.assertEqual(await cursor.fetchmany(), [])
+        self.assertEqual(cursor.last_query_id, 'query1')
+        self.assertEqual(cursor._session_props, {'a': '1'})
+
+    async def test_async_iteration(self):
+        coordinator, connection = await self._connect([[[i, None]] for i in range(5)])
+        cursor = connection.cursor()
+        await cursor.execute('SELECT 1')
+        self.assertEqual([row[0] async for row in cursor], list(range(5)))
+        self.assertEqual(cursor.rownumber, 5)
+        self.assertRaises(TypeError, next, cursor)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    async def test_fetch_arrow(self):
+        coordinator, connection = await self._connect([[[1, 'AAE=']], [], [[2, None]]])
+        cursor = connection.cursor()
+        with self.assertRaises(presto.ProgrammingError):
+            cursor.fetch_record_batches()
+        await cursor.execute('SELECT 1')
+        self.assertEqual((await cursor.fetchone())[0], 1)
+        table = await cursor.fetch_arrow()
+        self.assertEqual(table.to_pydict(), {'a': [2], 'b': [None]})
+        self.assertEqual(table.schema.field('a').type, pyarrow.int32())
+        self.assertEqual((await cursor.fetch_arrow()).num_rows, 0)
+
+        await cursor.execute('SELECT 1')
+        batches = [batch async for batch in cursor.fetch_record_batches()]
+        self.assertEqual([batch.num_rows for batch in batches], [1, 1])
+        self.assertEqual(cursor.rownumber, 2)
+
+    async def test_concurrent_queries(self):
+        coordinator, connection = await self._connect([[[1, None]], [[2, None]]])
+
+        async def query():
+            cursor = connection.cursor()
+            await cursor.execute('SELECT 1')
+            return await cursor.fetchall()
+
+        results = await asyncio.gather(*[query() for _ in range(10)])
+        self.assertEqual(results, [[(1, None), (2, None)]] * 10)
+
+    async def test_poll_and_cancel(self):
+        coordinator, connection = await self._connect([[[1, None]], [[2, None]]])
+        cursor = connection.cursor()
+        with self.assertRaises(presto.ProgrammingError):
+            await cursor.poll()
+        await cursor.execute('SELECT 1')
+        self.assertIn('nextUri', await cursor.poll())
+        await cursor.cancel()
+        self.assertEqual(coordinator.requests[-1], ('DELETE', '2'))
+        self.assertIsNone(await cursor.poll())
+
+    def test_unsupported_arguments(self):
+        module = presto if self.module == 'presto' else trino
+        self.assertRaises(module.NotSupportedError, module.Cursor, 'localhost',
+                          KerberosRemoteServiceName='presto')
+        self.assertRaises(ValueError, module.Cursor, 'localhost', aiohttp_kwargs={'headers': {}})
+
+
+class TestAioTrino(TestAioPresto):
+    module = 'trino'
+    prefix = 'X-Trino-'
@@ -1,8 +1,12 @@
 # encoding: utf-8
 from __future__ import absolute_import
 from __future__ import unicode_literals
+from itertools import islice
 from pyhive import common
+from pyhive import exc
 import datetime
+import mock
+import time
 import unittest
 
 
@@ -38,3 +42,169 @@ class TestCommon(unittest.TestCase):
                          ("'2020-04-17'",))
         self.assertEqual(escaper.escape_args((datetime.datetime(2020, 4, 17, 12, 0, 0, 123456),)),
                          ("'2020-04-17 12:00:00.123456'",))
+
+    def test_format(self):
+        escaper = common.ParamEscaper()
+        cases = [
+            ("SELECT %(a)s, '100%%', %(b)s, %(a)s", {'a': "it's", 'b': [1, None], 'c': 1.5}),
+            ('SELECT %s, %s FROM t WHERE d = %s', ('你好', True, datetime.date(2020, 4, 17))),
+            ("SELECT '%%'", {}),
+            ("SELECT '%%'", ()),
+            ("SELECT '%%'", {'a': 1}),
+            # Formatted with %
+            ('SELECT %d, %5s', (1, 2)),
+            ('SELECT %s', {'a': 1}),
+        ]
+        for operation, parameters in cases:
+            for _ in range(2):
+                self.assertEqual(escaper.format(operation, parameters),
+                                 operation % escaper.escape_args(parameters))
+        self.assertIsNotNone(common._templates[cases[0][0]])
+        self.assertIsNone(common._templates['SELECT %d, %5s'])
+
+        self.assertRaises(KeyError, escaper.format, 'SELECT %(a)s', {'b': 1})
+        self.assertRaises(TypeError, escaper.format, 'SELECT %(a)s', (1,))
+        self.assertRaises(TypeError, escaper.format, 'SELECT %(a)s, %s', {'a': 1})
+        self.assertRaises(TypeError, escaper.format, 'SELECT %s, %s', (1,))
+        self.assertRaises(TypeError, escaper.format, 'SELECT 1', (1,))
+        self.assertRaises(ValueError, escaper.format, 'SELECT %', ())
+        self.assertRaises(exc.ProgrammingError, escaper.format, 'SELECT %s', 1)
+        self.assertRaises(exc.ProgrammingError, escaper.format, 'SELECT %s', (object(),))
+
+    def test_escape_item_dispatch(self):
+        class QuotingEscaper(common.ParamEscaper):
+            def escape_string(self, item):
+                return '"{}"'.format(item)
+
+        escaper = QuotingEscaper()
+        self.assertEqual(escaper.escape_args(('a', ['b', None], False)),
+                         ('"a"', '("b",NULL)', False))
+        self.assertEqual(set(escaper._escape_functions), {str, list, type(None), bool})
+        self.assertRaises(exc.ProgrammingError, escaper.escape_item, object())
+        self.assertNotIn(object, escaper._escape_functions)
+
+    def test_poll_strategies(self):
+        self.assertEqual(list(islice(common.FixedPollStrategy().delays(1), 3)), [1, 1, 1])
+        backoff = common.ExponentialBackoffPollStrategy(initial=0.125, multiplier=2)
+        self.assertEqual(list(islice(backoff.delays(1), 6)), [0.125, 0.25, 0.5, 1, 1, 1])
+        self.assertEqual(list(islice(backoff.delays(0.3), 4)), [0.125, 0.25, 0.3, 0.3])
+        self.assertEqual(list(islice(backoff.delays(0), 2)), [0, 0])
+        self.assertRaises(ValueError, common.ExponentialBackoffPollStrategy, initial=0)
+
+    @mock.patch('time.sleep')
+    def test_fetch_while_backoff(self, sleep):
+        strategy = common.ExponentialBackoffPollStrategy(initial=0.125, multiplier=2)
+        cursor = _PagedCursor([[], [], [(1,)], [], [(2,)]], poll_strategy=strategy)
+        self.assertEqual(cursor.fetchall(), [(1,), (2,)])
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [0.125, 0.25, 0.125])
+
+    @mock.patch('time.sleep')
+    def test_fetch_while_fixed(self, sleep):
+        cursor = _PagedCursor([[], [], [(1,)]], poll_interval=2,
+                              poll_strategy=common.FixedPollStrategy())
+        self.assertEqual(cursor.fetchall(), [(1,)])
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [2, 2])
+
+    def test_executemany_statements(self):
+        cursor = _PagedCursor([])
+        cursor._escaper = common.ParamEscaper()
+        insert = "INSERT INTO t (a, b) VALUES (%s, 'x)''%%')"
+        rows = [(1,), (2,), (3,)]
+
+        def statements(operation, seq_of_parameters, max_sql_length=1000000):
+            return [tuple(statement) for statement in cursor._executemany_statements(
+                operation, seq_of_parameters, max_sql_length)]
+
+        self.assertEqual(statements(insert, rows), [(
+            0, "INSERT INTO t (a, b) VALUES (1, 'x)''%'), (2, 'x)''%'), (3, 'x)''%')", None, rows,
+        )])
+        insert = 'insert into t\nvalues (%(a)s, %(b)s);'
+        rows = [{'a': 1, 'b': "a'"}, {'a': 2, 'b': None}, {'a': 3, 'b': 'c'}]
+        self.assertEqual(statements(insert, rows, max_sql_length=50), [
+            (0, "insert into t\nvalues (1, 'a'''), (2, NULL)", None, rows[:2]),
+            (2, "insert into t\nvalues (3, 'c')", None, rows[2:]),
+        ])
+        # A row longer than the limit still gets its own statement
+        self.assertEqual([s[0] for s in statements(insert, rows, max_sql_length=1)], [0, 1, 2])
+
+        for operation in ['SELECT %s', 'INSERT INTO t VALUES (%s), (%s)',
+                          'INSERT INTO t SELECT * FROM u WHERE a IN (%s)',
+                          'INSERT INTO %s VALUES (%s)', 'INSERT INTO t VALUES (%s) -- (']:
+            self.assertEqual(statements(operation, [(1,), (2,)]),
+                             [(0, operation, (1,), None), (1, operation, (2,), None)], operation)
+        self.assertEqual(statements(insert, rows, max_sql_length=0)[0], (0, insert, rows[0], None))
+        self.assertEqual(statements(insert, rows[:1]), [(0, insert, rows[0], None)])
+        cursor._escaper = None
+        self.assertEqual(len(statements(insert, rows)), 3)
+
+    def test_row_buffer(self):
+        buffer = common._RowBuffer()
+        self.assertFalse(buffer)
+        self.assertRaises(IndexError, buffer.popleft)
+        buffer += iter([(1,), (2,), (3,)])
+        buffer += []
+        buffer += [(4,), (5,)]
+        self.assertEqual((len(buffer), list(buffer)), (5, [(1,), (2,), (3,), (4,), (5,)]))
+        self.assertEqual(buffer.popleft(), (1,))
+        self.assertEqual(list(buffer), [(2,), (3,), (4,), (5,)])
+        self.assertEqual(buffer.take(3), [(2,), (3,), (4,)])
+        self.assertEqual(len(buffer), 1)
+        self.assertEqual(buffer.take(0), [])
+        self.assertEqual(buffer.take(), [(5,)])
+        self.assertFalse(buffer)
+        buffer += [(6,)]
+        buffer.clear()
+        self.assertEqual((len(buffer), buffer.take()), (0, []))
+
+    def test_bulk_fetch(self):
+        pages = [[(i, j) for j in range(3)] for i in range(4)]
+        cursor = _PagedCursor(pages, poll_interval=0)
+        with mock.patch.object(cursor, 'fetchone') as fetchone, \
+                mock.patch.object(cursor, '_fetch_more', wraps=cursor._fetch_more) as fetch_more:
+            self.assertEqual(cursor.fetchmany(2), pages[0][:2])
+            self.assertEqual(cursor.fetchmany(5), pages[0][2:] + pages[1] + pages[2][:1])
+            self.assertEqual(cursor.fetchmany(0), [])
+            self.assertEqual(cursor.fetchall(), pages[2][1:] + pages[3])
+            self.assertEqual(cursor.fetchall(), [])
+            self.assertEqual(cursor.fetchmany(1), [])
+        fetchone.assert_not_called()
+        self.assertEqual(fetch_more.call_count, 4)
+        self.assertEqual(cursor.rownumber, 12)
+        self.assertRaises(exc.ProgrammingError, _PagedCursor([], state=0).fetchall)
+
+    def test_bulk_fetch_benchmark(self):
+        """fetchall and fetchmany drain pages much faster than calling fetchone per row"""
+        pages = [[(i,)] * 10000 for i in range(20)]
+
+        def fetch_rows(fetch):
+            cursor = _PagedCursor([list(page) for page in pages], poll_interval=0)
+            start = time.time()
+            rows = fetch(cursor)
+            return time.time() - start, len(rows)
+
+        per_row, rows = fetch_rows(lambda cursor: list(iter(cursor.fetchone, None)))
+        self.assertEqual(rows, 200000)
+        for fetch in [lambda cursor: cursor.fetchall(),
+                      lambda cursor: sum(iter(lambda: cursor.fetchmany(1000), []), [])]:
+            bulk, rows = fetch_rows(fetch)
+            self.assertEqual(rows, 200000)
+            self.assertLess(bulk * 2, per_row)
+
+
+class _PagedCursor(common.DBAPICursor):
+    """Cursor whose running query returns the given pages of rows, one per request"""
+
+    description = None
+
+    def __init__(self, pages, state=common.DBAPICursor._STATE_RUNNING, **kwargs):
+        super(_PagedCursor, self).__init__(**kwargs)
+        self._pages = list(pages)
+        self._state = state
+
+    def execute(self, operation, parameters=None):
+        raise NotImplementedError  # pragma: no cover
+
+    def _fetch_more(self):
+        self._data += self._pages.pop(0)
+        if not self._pages:
+            self._state = self._STATE_FINISHED
@@ -12,18 +12,31 @@ import datetime
 import os
 import socket
 import subprocess
+import threading
 import time
 import unittest
+import zlib
 from decimal import Decimal
 
 import mock
+import thrift.protocol.TBinaryProtocol
 import thrift.transport.TSocket
 import thrift.transport.TTransport
 import thrift_sasl
+from thrift.protocol import TCompactProtocol
 from thrift.transport.TTransport import TTransportException
 
+try:
+    import pyarrow
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+from TCLIService import TCLIService
 from TCLIService import ttypes
+from pyhive import common
 from pyhive import hive
+from pyhive import thrift_decoder
+from pyhive.result_cache import ResultCache
 from pyhive.tests.dbapi_test_case import DBAPITestCase
 from pyhive.tests.dbapi_test_case import with_cursor
 
@@ -241,3 +254,580 @@ def _restart_hs2():
     with contextlib.closing(socket.socket()) as s:
         while s.connect_ex(('localhost', 10000)) != 0:
             time.sleep(1)
+
+
+class TestUnwrapColumn(unittest.TestCase):
+    def test_nulls(self):
+        nulls = b'\x81\x00\x06'
+        col = ttypes.TColumn(i32Val=ttypes.TI32Column(values=list(range(20)), nulls=nulls))
+        expected = list(range(20))
+        for i in (0, 7, 17, 18):
+            expected[i] = None
+        self.assertEqual(hive._unwrap_column(col), expected)
+
+    def test_no_nulls(self):
+        col = ttypes.TColumn(stringVal=ttypes.TStringColumn(values=['a', 'b'], nulls=b'\x00'))
+        self.assertEqual(hive._unwrap_column(col), ['a', 'b'])
+        self.assertEqual(hive._null_positions(b''), ())
+        self.assertEqual(hive._null_positions(b'\x00' * 125), ())
+
+    def test_all_nulls(self):
+        self.assertEqual(hive._null_positions(b'\xff\xff'), list(range(16)))
+
+
+class TestFetchColumns(unittest.TestCase):
+    def test_fetch_columns(self):
+        cursor = _mock_cursor([
+            [_i32_column([1, 2]), _string_column(['a', 'b'], nulls=b'\x02')],
+            [_i32_column([3]), _string_column(['c'])],
+        ])
+        self.assertEqual(cursor.fetchone(), (1, 'a'))
+        self.assertEqual(cursor.fetch_columns(), {'a': [2], 'b': [None]})
+        self.assertEqual(list(cursor.fetch_columns().items()), [('a', [3]), ('b', ['c'])])
+        self.assertEqual(cursor.rownumber, 3)
+        self.assertIsNone(cursor.fetch_columns())
+        self.assertIsNone(cursor.fetch_columns())
+
+    def test_fetch_columns_no_query(self):
+        cursor = hive.Cursor(mock.Mock())
+        self.assertRaises(hive.ProgrammingError, cursor.fetch_columns)
+
+
+class TestPrefetch(unittest.TestCase):
+    def test_prefetch(self):
+        pages = [[_i32_column([i]), _string_column([str(i)])] for i in range(10)]
+        cursor = _mock_cursor(pages, prefetch_pages=2)
+        self.assertEqual(cursor.fetchone(), (0, '0'))
+        self.assertEqual(cursor.fetch_columns(), {'a': [1], 'b': ['1']})
+        self.assertEqual(cursor.fetchall(), [(i, str(i)) for i in range(2, 10)])
+        self.assertIsNone(cursor._prefetcher._thread.join(5))
+        self.assertEqual(cursor._connection.client.FetchResults.call_count, 11)
+
+    def test_prefetch_error(self):
+        cursor = _mock_cursor([[_i32_column([1]), _string_column(['a'])]], prefetch_pages=1)
+        cursor._connection.client.FetchResults.side_effect = [
+            ttypes.TFetchResultsResp(status=ttypes.TStatus(
+                statusCode=ttypes.TStatusCode.ERROR_STATUS)),
+        ]
+        self.assertRaises(hive.OperationalError, cursor.fetchone)
+        self.assertRaises(hive.OperationalError, cursor.fetchone)
+
+    def test_close_stops_prefetch(self):
+        pages = [[_i32_column([i]), _string_column([str(i)])] for i in range(10)]
+        cursor = _mock_cursor(pages, prefetch_pages=1)
+        self.assertEqual(cursor.fetchone(), (0, '0'))
+        prefetcher = cursor._prefetcher
+        cursor.close()
+        self.assertFalse(prefetcher._thread.is_alive())
+        self.assertLess(cursor._connection.client.FetchResults.call_count, 11)
+        cursor._connection.client.CloseOperation.assert_called_once()
+
+    def test_synchronized_client(self):
+        protocol = thrift.transport.TTransport.TMemoryBuffer()
+        client = hive._SynchronizedClient(mock.Mock(_iprot=protocol, _seqid=0))
+        self.assertIs(client._iprot, protocol)
+        self.assertEqual(client._seqid, 0)
+        client.GetInfo('req')
+        client._client.GetInfo.assert_called_once_with('req')
+        self.assertFalse(client._lock.locked())
+        client = hive._SynchronizedClient(thrift_decoder.Client(TCompactProtocol.TCompactProtocol(
+            protocol)))
+        self.assertIsInstance(client, TCLIService.Client)
+
+
+class TestAdaptiveFetchSize(unittest.TestCase):
+    def test_fetch_stats(self):
+        cursor = _mock_cursor([[_i32_column([1, 2]), _string_column(['a', 'b'])]])
+        self.assertEqual(cursor.fetchall(), [(1, 'a'), (2, 'b')])
+        stats = cursor.fetch_stats
+        self.assertEqual((stats.pages, stats.rows, stats.bytes), (2, 2, 0))
+        self.assertEqual(stats.fetch_sizes, [1000, 1000])
+
+    def test_grow_and_shrink(self):
+        narrow = [_i32_column([1] * 200), _string_column(['a'] * 200)]
+        wide = [_i32_column([1] * 400), _string_column(['a' * 1000] * 400)]
+        cursor = _mock_cursor([narrow, narrow, wide, narrow], arraysize=200,
+                              target_page_bytes=100000)
+        self.assertEqual(len(cursor.fetchall()), 1000)
+        self.assertEqual(cursor.fetch_stats.fetch_sizes, [200, 400, 800, 100, 200])
+        self.assertEqual(cursor.fetch_stats.bytes, 3 * 200 * 9 + 400 * 1008)
+
+    def test_max_buffered_rows(self):
+        narrow = [_i32_column([1] * 200), _string_column(['a'] * 200)]
+        cursor = _mock_cursor([narrow], arraysize=200, target_page_bytes=100000,
+                              max_buffered_rows=300)
+        self.assertEqual(cursor.max_buffered_rows, 300)
+        self.assertEqual(cursor.fetchone(), (1, 'a'))
+        self.assertEqual(cursor.buffered_rows, 199)
+        self.assertEqual(len(cursor.fetchall()), 199)
+        self.assertEqual(cursor.buffered_rows, 0)
+        self.assertEqual(cursor.fetch_stats.fetch_sizes, [200, 300])
+
+    def test_adapt_fetch_size(self):
+        self.assertEqual(hive._adapt_fetch_size(1000, 1000, 10 ** 6, 0.1, 10 ** 6), 1000)
+        self.assertEqual(hive._adapt_fetch_size(1000, 1000, 10 ** 5, 0.1, 10 ** 6), 2000)
+        self.assertEqual(hive._adapt_fetch_size(1000, 1000, 10 ** 5, 60, 10 ** 6), 1000)
+        self.assertEqual(hive._adapt_fetch_size(1000, 1000, 10 ** 7, 0.1, 10 ** 6), 100)
+        self.assertEqual(hive._adapt_fetch_size(1000, 1000, 4 * 10 ** 6, 0.1, 10 ** 6), 250)
+
+
+class TestExecuteMany(unittest.TestCase):
+    def test_executemany_concurrently(self):
+        statements = []
+        polls = {}
+        open_operations = [0, 0]  # current, max
+
+        def execute_statement(req):
+            statements.append((req.statement, req.runAsync))
+            open_operations[0] += 1
+            open_operations[1] = max(open_operations)
+            handle = ttypes.TOperationHandle(
+                operationId=ttypes.THandleIdentifier(guid=req.statement.encode(), secret=b''),
+                operationType=ttypes.TOperationType.EXECUTE_STATEMENT, hasResultSet=False)
+            return ttypes.TExecuteStatementResp(status=_SUCCESS, operationHandle=handle)
+
+        def get_operation_status(req):
+            statement = req.operationHandle.operationId.guid.decode()
+            polls[statement] = polls.get(statement, 0) + 1
+            if polls[statement] < 3:
+                state = ttypes.TOperationState.RUNNING_STATE
+            elif 'bad' in statement:
+                state = ttypes.TOperationState.ERROR_STATE
+            else:
+                state = ttypes.TOperationState.FINISHED_STATE
+            return ttypes.TGetOperationStatusResp(status=_SUCCESS, operationState=state)
+
+        def close_operation(req):
+            open_operations[0] -= 1
+            return ttypes.TCloseOperationResp(status=_SUCCESS)
+
+        client = mock.Mock()
+        client.ExecuteStatement.side_effect = execute_statement
+        client.GetOperationStatus.side_effect = get_operation_status
+        client.CloseOperation.side_effect = close_operation
+        cursor = hive.Cursor(mock.Mock(client=client), poll_interval=2,
+                             poll_strategy=common.FixedPollStrategy())
+        parameters = [('a',), ('bad',), ('c',), ('bad',), ('e',)]
+        with mock.patch('time.sleep') as sleep, \
+                self.assertRaises(hive.ExecuteManyError) as cm:
+            cursor.executemany('SELECT %s', parameters, max_workers=2)
+        self.assertEqual([error[:2] for error in cm.exception.errors],
+                         [(1, ('bad',)), (3, ('bad',))])
+        self.assertIsInstance(cm.exception.errors[0][2], hive.OperationalError)
+        self.assertEqual(sorted(statements[:4]), [("SELECT 'a'", True), ("SELECT 'bad'", True),
+                                                  ("SELECT 'bad'", True), ("SELECT 'c'", True)])
+        self.assertEqual(statements[4], ("SELECT 'e'", False))
+        # The last statement is still open on the cursor
+        self.assertEqual(open_operations, [1, 2])
+        self.assertTrue(sleep.called)
+        self.assertEqual({call[0][0] for call in sleep.call_args_list}, {2})
+
+    def test_executemany_insert(self):
+        cursor = _mock_cursor([])
+        client = cursor._connection.client
+        client.ExecuteStatement.return_value = ttypes.TExecuteStatementResp(
+            status=_SUCCESS, operationHandle=ttypes.TOperationHandle(
+                operationId=ttypes.THandleIdentifier(guid=b'', secret=b''),
+                operationType=ttypes.TOperationType.EXECUTE_STATEMENT, hasResultSet=False))
+        cursor.executemany('INSERT INTO TABLE t VALUES (%s, %s)',
+                           [(1, "a'"), (2, datetime.date(2020, 1, 2)), (3, None)])
+        self.assertEqual(
+            [call[0][0].statement for call in client.ExecuteStatement.call_args_list],
+            ["INSERT INTO TABLE t VALUES (1, 'a\\''), (2, '2020-01-02'), (3, NULL)"])
+
+    def test_executemany_sequentially(self):
+        cursor = _mock_cursor([])
+        cursor._connection.client.ExecuteStatement.side_effect = hive.OperationalError('bad')
+        self.assertRaises(hive.OperationalError, cursor.executemany, 'SELECT %s',
+                          [('a',), ('b',)], max_workers=1)
+        cursor._connection.client.ExecuteStatement.assert_called_once()
+
+
+class TestResultCache(unittest.TestCase):
+    def _mock_cursor(self, cache, pages):
+        cursor = _mock_cursor(pages, result_cache=cache)
+        cursor._connection._session_context = (('binary', 'localhost', 10000), 'user', 'default',
+                                               ())
+        cursor._connection.client.ExecuteStatement.return_value = ttypes.TExecuteStatementResp(
+            status=_SUCCESS, operationHandle=ttypes.TOperationHandle(
+                operationId=ttypes.THandleIdentifier(guid=b'', secret=b''),
+                operationType=ttypes.TOperationType.EXECUTE_STATEMENT, hasResultSet=True))
+        return cursor
+
+    def test_result_cache(self):
+        cache = ResultCache()
+        page = [_i32_column([1, 2]), _string_column(['a', 'b'])]
+        cursor = self._mock_cursor(cache, [page])
+        cursor.execute('SELECT a, b FROM t WHERE a > %s', (0,))
+        description = cursor.description
+        self.assertEqual(cursor.fetchall(), [(1, 'a'), (2, 'b')])
+
+        cursor = self._mock_cursor(cache, [])
+        cursor.execute('SELECT a, b\nFROM t WHERE a > %s', (0,))
+        self.assertEqual(cursor.description, description)
+        self.assertEqual(cursor.fetchone(), (1, 'a'))
+        self.assertEqual(cursor.fetchall(), [(2, 'b')])
+        cursor._connection.client.ExecuteStatement.assert_not_called()
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 1))
+
+        # Other parameters and databases miss
+        cursor = self._mock_cursor(cache, [page])
+        cursor.execute('SELECT a, b FROM t WHERE a > %s', (1,))
+        cursor._connection._session_context = (('binary', 'localhost', 10000), 'user', 'other',
+                                               ())
+        cursor.execute('SELECT a, b FROM t WHERE a > %s', (0,))
+        self.assertEqual(cursor._connection.client.ExecuteStatement.call_count, 2)
+
+    def test_result_cache_use_and_set(self):
+        cache = ResultCache()
+        page = [_i32_column([1, 2]), _string_column(['a', 'b'])]
+        cursor = self._mock_cursor(cache, [page])
+        connection = cursor._connection
+        connection._session_context = (('binary', 'localhost', 10000), 'user', 'default', ())
+        connection._track_session = lambda sql: hive.Connection._track_session(connection, sql)
+        cursor.execute('SELECT a, b FROM t')
+        self.assertEqual(cursor.fetchall(), [(1, 'a'), (2, 'b')])
+        cursor.execute('use `Other`;')
+        cursor.execute('SELECT a, b FROM t')
+        cursor.execute('SET hive.exec.reducers.max = 2;')
+        cursor.execute('set a=b=c')
+        cursor.execute('SELECT 1 FROM t WHERE a = 1')
+        self.assertEqual(connection._session_context, (
+            ('binary', 'localhost', 10000), 'user', 'Other',
+            (('a', 'b=c'), ('hive.exec.reducers.max', '2'))))
+        self.assertEqual(connection.client.ExecuteStatement.call_count, 6)
+        self.assertEqual(cache.stats.hits, 0)
+
+    def test_result_cache_partial(self):
+        cache = ResultCache()
+        page = [_i32_column([1, 2]), _string_column(['a', 'b'])]
+        cursor = self._mock_cursor(cache, [page])
+        cursor.execute('SELECT a, b FROM t')
+        self.assertEqual(cursor.fetchone(), (1, 'a'))
+        cursor = self._mock_cursor(cache, [page])
+        cursor.execute('SELECT a, b FROM t')
+        self.assertEqual(cursor.fetch_columns(), {'a': [1, 2], 'b': ['a', 'b']})
+        self.assertIsNone(cursor.fetch_columns())
+        self.assertEqual(cache.stats.entries, 0)
+
+
+class TestBinaryColumns(unittest.TestCase):
+    def _serialize(self, columns, compress=False):
+        transport = thrift.transport.TTransport.TMemoryBuffer()
+        protocol = TCompactProtocol.TCompactProtocol(transport)
+        for col in columns:
+            col.write(protocol)
+        data = transport.getvalue()
+        return zlib.compress(data) if compress else data
+
+    def _mock_cursor(self, compress=False):
+        cursor = _mock_cursor([])
+        columns = [_i32_column([1, 2], nulls=b'\x02'), _string_column(['a', 'b'])]
+        cursor._connection.client.FetchResults.side_effect = [
+            ttypes.TFetchResultsResp(status=_SUCCESS, results=ttypes.TRowSet(
+                startRowOffset=0, rows=[], columns=[], columnCount=len(columns),
+                binaryColumns=self._serialize(columns, compress)))
+            for columns in [columns, []]
+        ]
+        return cursor
+
+    def test_binary_columns(self):
+        self.assertEqual(self._mock_cursor().fetchall(), [(1, 'a'), (None, 'b')])
+
+    def test_compressed_binary_columns(self):
+        cursor = self._mock_cursor(compress=True)
+        cursor._connection.result_decompressor = zlib.decompress
+        self.assertEqual(cursor.fetchall(), [(1, 'a'), (None, 'b')])
+
+
+class TestThriftProtocol(unittest.TestCase):
+    def test_invalid_protocol(self):
+        self.assertRaisesRegexp(ValueError, 'thrift_protocol must be one of binary, compact',
+                                lambda: hive.connect(_HOST, thrift_protocol='json'))
+
+    def test_framed_requires_nosasl(self):
+        self.assertRaisesRegexp(ValueError, 'NOSASL',
+                                lambda: hive.connect(_HOST, thrift_framed=True))
+        self.assertRaisesRegexp(ValueError, 'NOSASL',
+                                lambda: hive.connect(_HOST, thrift_buffer_size=1 << 20))
+
+    def test_make_protocol(self):
+        buffered = thrift.transport.TTransport.TMemoryBuffer()
+        for name in ('binary', 'compact'):
+            protocol_class, accelerated_class = hive._THRIFT_PROTOCOLS[name]
+            protocol = hive._make_protocol(name, buffered)
+            if hive._check_accelerated(accelerated_class):
+                self.assertIsInstance(protocol, accelerated_class)
+                self.assertIsNotNone(protocol._fast_decode)
+            else:
+                self.assertIsNone(protocol._fast_decode)
+            self.assertIsInstance(protocol, protocol_class)
+
+    @mock.patch.dict(hive._accelerated_protocol_works, {
+        thrift.protocol.TBinaryProtocol.TBinaryProtocolAccelerated: False})
+    def test_require_fastbinary(self):
+        self.assertRaises(hive.NotSupportedError, lambda: hive.connect(
+            _HOST, auth='NOSASL', thrift_framed=True, require_fastbinary=True))
+
+
+class TestOpenSession(unittest.TestCase):
+    def _connect(self, **kwargs):
+        return self._open(**kwargs)[1]
+
+    def _open(self, **kwargs):
+        """Return a connection opened with a mock client, and the client"""
+        client = mock.Mock()
+        client.OpenSession.return_value = ttypes.TOpenSessionResp(
+            status=_SUCCESS,
+            serverProtocolVersion=ttypes.TProtocolVersion.HIVE_CLI_SERVICE_PROTOCOL_V6,
+            sessionHandle=mock.Mock(),
+        )
+        client.ExecuteStatement.return_value = ttypes.TExecuteStatementResp(
+            status=_SUCCESS, operationHandle=mock.Mock())
+        client.CloseOperation.return_value = ttypes.TCloseOperationResp(status=_SUCCESS)
+        kwargs.setdefault('thrift_transport', mock.Mock())
+        with mock.patch('pyhive.thrift_decoder.Client', return_value=client):
+            connection = hive.connect(username='user', **kwargs)
+        return connection, client
+
+    def test_session_context(self):
+        a = self._open(host='hs2-a.example.com', scheme='https', thrift_transport=None)[0]
+        b = self._open(host='hs2-b.example.com', scheme='https', thrift_transport=None)[0]
+        self.assertEqual(a._session_context, (
+            ('https', 'hs2-a.example.com', 1000, '/cliservice/'), 'user', 'default', ()))
+        cache = ResultCache()
+        key = a.cursor(result_cache=cache)._cache_key('SELECT 1', None)
+        cache.put(key, [('_c0', 'INT_TYPE', None, None, None, None, True)], [(1,)])
+        self.assertIsNotNone(cache.get(key))
+        self.assertIsNone(cache.get(b.cursor(result_cache=cache)._cache_key('SELECT 1', None)))
+
+        # A custom transport other than THttpClient can't be identified, so isn't cached
+        custom = self._open()[0]
+        self.assertIsNone(custom._session_context)
+        self.assertIsNone(custom.cursor(result_cache=cache)._cache_key('SELECT 1', None))
+        custom._track_session('USE other')
+
+    @mock.patch.dict(hive._ignores_use_database, clear=True)
+    @mock.patch.object(hive.Connection, '_current_database', return_value='db')
+    def test_use_database_configuration(self, current_database):
+        configuration = {'hive.exec.reducers.max': '1'}
+        client = self._connect(database='DB', configuration=configuration, scheme='http',
+                               host='server', thrift_transport=None)
+        req = client.OpenSession.call_args[0][0]
+        self.assertEqual(req.configuration, {'hive.exec.reducers.max': '1', 'use:database': 'DB'})
+        self.assertEqual(configuration, {'hive.exec.reducers.max': '1'})
+        client.ExecuteStatement.assert_not_called()
+        current_database.assert_called_once_with()
+        self.assertEqual(hive._ignores_use_database,
+                         {('http', 'server', 1000, '/cliservice/'): False})
+
+        # A second connection to the server doesn't check again
+        client = self._connect(database='db', scheme='http', host='server',
+                               thrift_transport=None)
+        self.assertEqual(client.OpenSession.call_args[0][0].configuration,
+                         {'use:database': 'db'})
+        client.ExecuteStatement.assert_not_called()
+        current_database.assert_called_once_with()
+
+        client = self._connect()
+        self.assertEqual(client.OpenSession.call_args[0][0].configuration,
+                         {'use:database': 'default'})
+        client = self._connect(database='db', use_database_statement=False)
+        client.ExecuteStatement.assert_not_called()
+        # Custom transports can't be told apart, so they get USE without checking
+        client = self._connect(database='db')
+        self.assertEqual(client.OpenSession.call_args[0][0].configuration, {})
+        self.assertEqual(client.ExecuteStatement.call_args[0][0].statement, 'USE `db`')
+        current_database.assert_called_once_with()
+
+    @mock.patch.dict(hive._ignores_use_database, clear=True)
+    @mock.patch('thrift.transport.TSocket.TSocket')
+    def test_use_database_ignored(self, socket):
+        with mock.patch.object(hive.Connection, '_current_database',
+                               return_value='default') as current_database:
+            client = self._connect(database='db', host='server', thrift_transport=None,
+                                   auth='NOSASL', thrift_framed=True)
+            self.assertEqual(client.OpenSession.call_args[0][0].configuration,
+                             {'use:database': 'db'})
+            self.assertEqual(client.ExecuteStatement.call_args[0][0].statement, 'USE `db`')
+            self.assertEqual(hive._ignores_use_database, {(None, 'server', 10000): True})
+
+            # Later connections to the server switch with USE right away
+            client = self._connect(database='db', host='server', thrift_transport=None,
+                                   auth='NOSASL', thrift_framed=True)
+            self.assertEqual(client.OpenSession.call_args[0][0].configuration, {})
+            self.assertEqual(client.ExecuteStatement.call_args[0][0].statement, 'USE `db`')
+            current_database.assert_called_once_with()
+
+    def test_current_database(self):
+        client = self._connect(database='db', use_database_statement=False)
+        connection = hive.Connection.__new__(hive.Connection)
+        connection._client = client
+        connection._sessionHandle = mock.Mock()
+        connection._session_context = ((None, 'localhost', None), 'user', 'db', ())
+        with mock.patch.object(hive.Cursor, 'fetchone', return_value=('DB',)):
+            self.assertEqual(connection._current_database(), 'db')
+        client.ExecuteStatement.side_effect = hive.OperationalError('no such function')
+        self.assertIsNone(connection._current_database())
+
+    def test_use_database_statement(self):
+        client = self._connect(database='db', use_database_statement=True)
+        self.assertEqual(client.OpenSession.call_args[0][0].configuration, {})
+        self.assertEqual(client.ExecuteStatement.call_args[0][0].statement, 'USE `db`')
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch('pyhive.hive.Connection', side_effect=self._connect)
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _connect(self, **kwargs):
+        connection = mock.Mock()
+        connection.client.GetInfo.return_value = ttypes.TGetInfoResp(status=_SUCCESS)
+        return connection
+
+    def test_reuse(self):
+        pool = hive.ConnectionPool(host=_HOST, database='db', max_size=2)
+        with pool.connection() as connection:
+            self.connect.assert_called_once_with(host=_HOST, database='db')
+        connection.cursor.return_value.execute.assert_called_once_with('USE `db`')
+        connection.cursor.return_value.close.assert_called_once_with()
+        with pool.connection() as reused:
+            self.assertIs(reused, connection)
+        stats = pool.stats
+        self.assertEqual((stats.size, stats.idle, stats.checked_out), (1, 1, 0))
+        self.assertEqual((stats.created, stats.checkouts), (1, 2))
+        pool.close()
+        connection.close.assert_called_once_with()
+        self.assertRaises(hive.InterfaceError, pool.checkout)
+
+    def test_min_size_and_idle_timeout(self):
+        pool = hive.ConnectionPool(host=_HOST, min_size=1, idle_timeout=0)
+        self.assertEqual(pool.stats.idle, 1)
+        connections = [pool.checkout(), pool.checkout()]
+        for connection in connections:
+            pool.checkin(connection)
+        stats = pool.stats
+        self.assertEqual((stats.size, stats.created, stats.closed), (1, 2, 1))
+        connections[0].close.assert_called_once_with()
+
+    def test_health_check(self):
+        pool = hive.ConnectionPool(host=_HOST, health_check_interval=0)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        connection.client.GetInfo.side_effect = TTransportException()
+        replacement = pool.checkout()
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(connection.client.GetInfo.call_args[0][0].infoType,
+                         ttypes.TGetInfoType.CLI_SERVER_NAME)
+        self.assertEqual(pool.stats.health_check_failures, 1)
+        self.assertEqual(pool.stats.size, 1)
+
+    def test_failed_reset(self):
+        pool = hive.ConnectionPool(host=_HOST, reset_statements=['SET a=1'])
+        connection = pool.checkout()
+        connection.cursor.return_value.execute.side_effect = hive.OperationalError()
+        pool.checkin(connection)
+        connection.cursor.return_value.execute.assert_called_once_with('SET a=1')
+        connection.close.assert_called_once_with()
+        self.assertEqual((pool.stats.size, pool.stats.idle), (0, 0))
+
+    def test_timeout(self):
+        pool = hive.ConnectionPool(host=_HOST, max_size=1, timeout=0.01)
+        connection = pool.checkout()
+        self.assertRaises(hive.OperationalError, pool.checkout)
+        self.assertEqual(pool.stats.timeouts, 1)
+        self.assertRaises(hive.ProgrammingError, pool.checkin, mock.Mock())
+        pool.checkin(connection)
+        self.assertIs(pool.checkout(), connection)
+
+    def test_wait_for_checkin(self):
+        pool = hive.ConnectionPool(host=_HOST, max_size=1)
+        connection = pool.checkout()
+        timer = threading.Timer(0.05, pool.checkin, [connection])
+        timer.start()
+        self.assertIs(pool.checkout(timeout=5), connection)
+        timer.join()
+        self.assertEqual(pool.stats.waits, 1)
+        self.assertGreater(pool.stats.max_checkout_seconds, 0)
+
+    def test_open_failure_releases_room(self):
+        pool = hive.ConnectionPool(host=_HOST, max_size=1)
+        self.connect.side_effect = TTransportException()
+        self.assertRaises(TTransportException, pool.checkout)
+        self.connect.side_effect = self._connect
+        pool.checkout(timeout=0)
+        self.assertEqual(pool.stats.size, 1)
+
+
+_SUCCESS = ttypes.TStatus(statusCode=ttypes.TStatusCode.SUCCESS_STATUS)
+
+
+def _i32_column(values, nulls=b''):
+    return ttypes.TColumn(i32Val=ttypes.TI32Column(values=values, nulls=nulls))
+
+
+def _string_column(values, nulls=b''):
+    return ttypes.TColumn(stringVal=ttypes.TStringColumn(values=values, nulls=nulls))
+
+
+def _mock_cursor(pages, schema=(('a', ttypes.TTypeId.INT_TYPE), ('b', ttypes.TTypeId.STRING_TYPE)),
+                 **kwargs):
+    """Return a cursor running a query whose results are the given pages of TColumns"""
+    client = mock.Mock()
+    client.GetResultSetMetadata.return_value = ttypes.TGetResultSetMetadataResp(
+        status=_SUCCESS,
+        schema=ttypes.TTableSchema(columns=[
+            ttypes.TColumnDesc(
+                columnName=name,
+                typeDesc=ttypes.TTypeDesc(types=[ttypes.TTypeEntry(
+                    primitiveEntry=ttypes.TPrimitiveTypeEntry(type=type_id))]),
+                position=i,
+            )
+            for i, (name, type_id) in enumerate(schema)
+        ]),
+    )
+    empty_page = [ttypes.TColumn(i32Val=ttypes.TI32Column(values=[], nulls=b''))] * len(schema)
+    client.FetchResults.side_effect = [
+        ttypes.TFetchResultsResp(status=_SUCCESS, results=ttypes.TRowSet(
+            startRowOffset=0, rows=[], columns=columns))
+        for columns in list(pages) + [empty_page]
+    ]
+    client.CloseOperation.return_value = ttypes.TCloseOperationResp(status=_SUCCESS)
+    cursor = hive.Cursor(mock.Mock(client=client, result_decompressor=None), **kwargs)
+    cursor._operationHandle = mock.Mock(hasResultSet=True)
+    cursor._state = cursor._STATE_RUNNING
+    return cursor
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class TestFetchArrow(unittest.TestCase):
+    def test_fetch_arrow(self):
+        cursor = _mock_cursor([
+            [_i32_column([1, 2], nulls=b'\x01'), _string_column(['a', 'b'])],
+            [_i32_column([3]), _string_column(['c'], nulls=b'\x01')],
+        ])
+        self.assertEqual(cursor.fetchone(), (None, 'a'))
+        table = cursor.fetch_arrow()
+        self.assertEqual(table.schema, pyarrow.schema([('a', pyarrow.int32()),
+                                                       ('b', pyarrow.string())]))
+        self.assertEqual(table.to_pydict(), {'a': [2, 3], 'b': ['b', None]})
+        self.assertEqual(cursor.rownumber, 3)
+
+    def test_fetch_record_batches(self):
+        cursor = _mock_cursor([[
+            ttypes.TColumn(doubleVal=ttypes.TDoubleColumn(values=[0.5] * 10, nulls=b'\x00\x02')),
+            ttypes.TColumn(i64Val=ttypes.TI64Column(values=list(range(10)), nulls=b'')),
+        ]], schema=(('f', ttypes.TTypeId.FLOAT_TYPE), ('i', ttypes.TTypeId.BIGINT_TYPE)))
+        batches = list(cursor.fetch_record_batches())
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0].schema, pyarrow.schema([('f', pyarrow.float32()),
+                                                            ('i', pyarrow.int64())]))
+        self.assertEqual(batches[0].column(0).to_pylist(), [0.5] * 9 + [None])
+        self.assertEqual(batches[0].column(1).to_pylist(), list(range(10)))
+
+    def test_empty(self):
+        table = _mock_cursor([]).fetch_arrow()
+        self.assertEqual(table.num_rows, 0)
+        self.assertEqual(table.column_names, ['a', 'b'])
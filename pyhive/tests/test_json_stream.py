@@ -0,0 +1,68 @@
+# encoding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from pyhive import json_stream
+import json
+import mock
+import unittest
+
+_PAGE = {
+    'id': 'q',
+    'nextUri': 'http://localhost:8080/v1/statement/q/1',
+    'columns': [{'name': 'a', 'type': 'bigint'}, {'name': 'b', 'type': 'varchar'}],
+    'data': [[-12345, '王兢 "quoted"'], [1.5e-10, None], [True, '\\'], [[1, {'x': []}], '']],
+    'stats': {'state': 'RUNNING', 'nodes': 1},
+    'empty': [],
+}
+
+
+def _chunks(content, size):
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+def _members(content, size, streamed=('data',)):
+    return list(json_stream.iter_members(_chunks(content, size), streamed))
+
+
+class TestJSONStream(unittest.TestCase):
+    def test_chunk_sizes(self):
+        for indent in (None, 2):
+            content = json.dumps(_PAGE, indent=indent, ensure_ascii=False).encode('utf-8')
+            expected = [(key, _PAGE[key]) for key in ('id', 'nextUri', 'columns')]
+            expected += [('data', row) for row in _PAGE['data']]
+            expected += [('stats', _PAGE['stats']), ('empty', [])]
+            self.assertEqual(_members(content, len(content)), expected)
+            # Split values, multi-byte characters and escapes at every possible point
+            for size in range(1, 20):
+                self.assertEqual(_members(content, size), expected, size)
+
+    def test_decodes_values_once(self):
+        content = json.dumps(_PAGE).encode('utf-8')
+        calls = []
+        for size in (len(content), 1):
+            with mock.patch.object(json_stream._decoder, 'raw_decode',
+                                   wraps=json_stream._decoder.raw_decode) as raw_decode:
+                _members(content, size)
+            calls.append(raw_decode.call_count)
+        self.assertEqual(calls[0], calls[1])
+        # A long string split into many chunks
+        content = json.dumps({'a': 'x' * 10000, 'b': [1, 22] * 1000}).encode('utf-8')
+        with mock.patch.object(json_stream._decoder, 'raw_decode',
+                               wraps=json_stream._decoder.raw_decode) as raw_decode:
+            self.assertEqual(_members(content, 7),
+                             [('a', 'x' * 10000), ('b', [1, 22] * 1000)])
+        self.assertEqual(raw_decode.call_count, 4)
+
+    def test_not_streamed(self):
+        content = json.dumps(_PAGE).encode('utf-8')
+        self.assertEqual(dict(_members(content, 7, streamed=())), _PAGE)
+        self.assertEqual(_members(b'{"data": null}', 3), [('data', None)])
+        self.assertEqual(_members(b' { } ', 1), [])
+        self.assertEqual(_members(b'{"data": []}', 1), [])
+
+    def test_malformed(self):
+        for content in [b'', b'[]', b'{"a": 1', b'{"a": 1,}', b'{"a" 1}', b'{"data": [1 2]}',
+                        b'{"a": 1.}', b'{"a": tru}']:
+            with self.assertRaises(ValueError, msg=content):
+                _members(content, 2)
@@ -15,11 +15,27 @@ import requests
 
 from pyhive import exc
 from pyhive import presto
+from pyhive.result_cache import ResultCache
 from pyhive.tests.dbapi_test_case import DBAPITestCase
 from pyhive.tests.dbapi_test_case import with_cursor
 import mock
 import unittest
 import datetime
+import json
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import quote_plus
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from urllib import quote_plus
+
+try:
+    import pyarrow
+except ImportError:  # pragma: no cover
+    pyarrow = None
 
 _HOST = 'localhost'
 _PORT = '8080'
@@ -126,7 +142,7 @@ class TestPresto(unittest.TestCase, DBAPITestCase):
         self.assertIsNone(cursor.last_query_id)
         connection.commit()
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_non_200(self, post):
         cursor = self.connect().cursor()
         post.return_value.status_code = 404
@@ -146,7 +162,7 @@ class TestPresto(unittest.TestCase, DBAPITestCase):
         def fail(*args, **kwargs):
             self.fail("Should not need requests.get after done polling")  # pragma: no cover
 
-        with mock.patch('requests.get', fail):
+        with mock.patch('requests.Session.get', fail):
             self.assertEqual(cursor.fetchall(), [(1,)])
 
     @with_cursor
@@ -248,3 +264,388 @@ class TestPresto(unittest.TestCase, DBAPITestCase):
             cursor = connection.cursor()
             cursor.execute('SELECT * FROM one_row')
             self.assertEqual(cursor.fetchall(), [(1,)])
+
+
+class TestPrestoMocked(unittest.TestCase):
+    """Tests that run against canned Presto REST API responses"""
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_fetch_arrow(self):
+        cursor = _mock_cursor([
+            {'data': [[1, 'a', '0.5'], [None, 'b', None]]},
+            {'data': [[3, None, '1.5']]},
+        ])
+        cursor.execute('SELECT * FROM t')
+        table = cursor.fetch_arrow()
+        self.assertEqual(table.schema, pyarrow.schema([
+            ('i', pyarrow.int32()), ('s', pyarrow.string()), ('d', pyarrow.decimal128(10, 1))]))
+        self.assertEqual(table.to_pydict(), {
+            'i': [1, None, 3],
+            's': ['a', 'b', None],
+            'd': [Decimal('0.5'), None, Decimal('1.5')],
+        })
+
+    def test_process_data(self):
+        columns = _COLUMNS + [{'name': 'b', 'type': 'varbinary'}]
+        cursor = _mock_cursor([
+            {'data': [[1, 'a', '0.5', 'AAE='], [None, None, None, None]]},
+            {'data': [[3, 'c', '1.5', '']]},
+        ], columns=columns)
+        with mock.patch.object(cursor, '_get_converters',
+                               wraps=cursor._get_converters) as get_converters:
+            cursor.execute('SELECT * FROM t')
+            self.assertEqual(cursor.fetchall(), [
+                (1, 'a', Decimal('0.5'), b'\x00\x01'),
+                (None, None, None, None),
+                (3, 'c', Decimal('1.5'), b''),
+            ])
+        get_converters.assert_called_once_with(columns)
+        self.assertEqual([i for i, _ in cursor._converters], [2, 3])
+        cursor._reset_state()
+        self.assertIsNone(cursor._converters)
+
+    def test_convert_types(self):
+        columns = _COLUMNS + [
+            {'name': 't', 'type': 'timestamp(3)'},
+            {'name': 'a', 'type': 'array(date)'},
+        ]
+        pages = [{'data': [[1, 'a', '0.5', '2001-02-03 04:05:06.789', ['2001-02-03', None]]]}]
+        cursor = _mock_cursor(pages, columns=columns)
+        cursor.execute('SELECT * FROM t')
+        self.assertEqual(cursor.fetchall(), [
+            (1, 'a', Decimal('0.5'), '2001-02-03 04:05:06.789', ['2001-02-03', None]),
+        ])
+
+        cursor = _mock_cursor(pages, columns=columns, convert_types=True)
+        cursor.execute('SELECT * FROM t')
+        self.assertEqual(cursor.fetchall(), [(
+            1, 'a', Decimal('0.5'), datetime.datetime(2001, 2, 3, 4, 5, 6, 789000),
+            [datetime.date(2001, 2, 3), None],
+        )])
+        self.assertEqual([i for i, _ in cursor._converters], [2, 3, 4])
+
+    def test_json_loads(self):
+        json_loads = mock.Mock(side_effect=json.loads)
+        cursor = _mock_cursor([{'data': [[1, 'a', '0.5']]}], json_loads=json_loads)
+        cursor.execute('SELECT * FROM t')
+        status = cursor.poll()
+        # As sent by the server
+        self.assertEqual(status['data'], [[1, 'a', '0.5']])
+        self.assertEqual(json_loads.call_count, 2)
+        self.assertIsInstance(json_loads.call_args[0][0], bytes)
+        self.assertEqual(cursor.fetchall(), [(1, 'a', Decimal('0.5'))])
+        self.assertIsNone(cursor.poll())
+        self.assertEqual(json_loads.call_count, 2)
+
+        # Rows that poll doesn't return are converted without a copy
+        responses = []
+
+        def recording_loads(content):
+            responses.append(json.loads(content))
+            return responses[-1]
+
+        cursor = _mock_cursor([{'data': [[1, 'a', '0.5']]}], json_loads=recording_loads)
+        cursor.execute('SELECT * FROM t')
+        self.assertEqual(cursor.fetchall(), [(1, 'a', Decimal('0.5'))])
+        self.assertEqual(responses[-1]['data'], [[1, 'a', Decimal('0.5')]])
+
+        self.assertIs(_mock_cursor([])._json_loads, presto.JSON_LOADS)
+        with mock.patch('importlib.import_module', side_effect=ImportError):
+            self.assertIs(presto._fast_json_loads(), json.loads)
+
+    def test_stream_results(self):
+        rows = [[i, str(i), '{}.5'.format(i)] for i in range(8)]
+        # Presto sends the columns before the data, but the second page doesn't
+        pages = [{'columns': _COLUMNS, 'data': rows[:5]}, {'data': rows[5:]}]
+        cursor = _mock_cursor(pages, stream_results=True)
+        cursor._STREAM_CHUNK_SIZE = 16
+        cursor._STREAM_BATCH_ROWS = 2
+        self.assertEqual(cursor._requests_kwargs, {'stream': True})
+        cursor.execute('SELECT * FROM t')
+        with mock.patch.object(cursor, '_append_data', wraps=cursor._append_data) as append:
+            status = cursor.poll()
+            self.assertEqual([len(call[0][0]) for call in append.call_args_list], [2, 2, 1])
+            self.assertNotIn('data', status)
+            self.assertEqual(status['columns'], _COLUMNS)
+            self.assertEqual(cursor.fetchall(), [(i, str(i), Decimal('{}.5'.format(i)))
+                                                 for i in range(8)])
+            self.assertEqual(len(append.call_args_list), 4)
+        for call in cursor._requests_session.get.call_args_list:
+            self.assertEqual(call[1], {'stream': True})
+
+    def test_max_buffered_rows(self):
+        pages = [{'data': [[i, None, None]] * 2} for i in range(3)]
+        cursor = _mock_cursor(pages, max_buffered_rows=3)
+        self.assertEqual(cursor.max_buffered_rows, 3)
+        cursor.execute('SELECT * FROM t')
+        self.assertEqual(cursor.poll()['data'], [[0, None, None]] * 2)
+        self.assertEqual(cursor.poll()['data'], [[1, None, None]] * 2)
+        self.assertEqual(cursor.buffered_rows, 4)
+        # Full, so nothing is requested until rows are consumed
+        status = cursor.poll()
+        self.assertEqual(status['nextUri'], 'http://localhost:8080/v1/statement/q/2')
+        self.assertNotIn('data', status)
+        self.assertEqual(cursor._requests_session.get.call_count, 2)
+        self.assertEqual(cursor.fetchmany(2), [(0, None, None)] * 2)
+        self.assertEqual(cursor.buffered_rows, 2)
+        self.assertEqual(cursor.poll()['data'], [[2, None, None]] * 2)
+        self.assertEqual(cursor.fetchall(), [(1, None, None)] * 2 + [(2, None, None)] * 2)
+        self.assertIsNone(cursor.poll())
+
+    def test_executemany_concurrently(self):
+        statements = []
+        active = [0, 0]  # current, max
+        lock = threading.Lock()
+
+        def post(url, data, headers, **kwargs):
+            statements.append(data)
+            if b'bad' in data:
+                return _mock_response({'id': 'q', 'error': {'message': 'bad'}})
+            return _mock_response({'id': 'q', 'nextUri': 'http://localhost:8080/v1/statement/q/0'})
+
+        def get(url, **kwargs):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return _mock_response({'id': 'q', 'columns': _COLUMNS[:1], 'data': [[1]]})
+
+        session = mock.Mock()
+        session.post.side_effect = post
+        session.get.side_effect = get
+        cursor = presto.Cursor('localhost', poll_interval=0, requests_session=session,
+                               session_props={'a': '1'})
+        parameters = [('a',), ('bad',), ('c',), ('d',), ('bad',), ('f',), ('g',)]
+        with self.assertRaises(presto.ExecuteManyError) as cm:
+            cursor.executemany('SELECT %s', parameters, max_workers=3)
+        self.assertEqual([error[:2] for error in cm.exception.errors],
+                         [(1, ('bad',)), (4, ('bad',))])
+        self.assertIsInstance(cm.exception.errors[0][2], presto.DatabaseError)
+        self.assertEqual(len(statements), 7)
+        self.assertEqual(statements[-1], b"SELECT 'g'")
+        self.assertEqual(cursor.fetchall(), [(1,)])
+        self.assertEqual(cursor._session_props, {'a': '1'})
+        self.assertGreater(active[1], 1)
+        self.assertLessEqual(active[1], 3)
+
+    def test_executemany_insert(self):
+        cursor = _mock_cursor([{'data': [[1]]}, {'data': [[1]]}], columns=_COLUMNS[:1])
+        rows = [(1, datetime.date(2020, 1, 2)), (2, "b'"), (3, None)]
+        cursor.executemany('INSERT INTO t VALUES (%s, %s)', rows, max_sql_length=60)
+        posts = cursor._requests_session.post.call_args_list
+        self.assertEqual([call[1]['data'] for call in posts], [
+            b"INSERT INTO t VALUES (1, date '2020-01-02'), (2, 'b''')",
+            b"INSERT INTO t VALUES (3, NULL)",
+        ])
+
+    def test_prepared_statements(self):
+        statement = "SELECT a FROM t WHERE a = ? AND b = '%' AND c = ?"
+        cursor = presto.Cursor('localhost', requests_session=mock.Mock(),
+                               prepared_statements=True)
+        name = cursor._prepared(
+            "SELECT a FROM t WHERE a = %(a)s AND b = '%%' AND c = %(c)s", {'a': 1, 'c': 2})[0]
+        added = '{}={}'.format(name, quote_plus(statement))
+        cursor._requests_session.post.side_effect = [
+            _mock_response({'id': 'p'}, {'X-Presto-Added-Prepare': added}),
+            _mock_response({'id': 'q', 'columns': _COLUMNS[:1], 'data': [[1]]}),
+            _mock_response({'id': 'q', 'columns': _COLUMNS[:1], 'data': [[2]]}),
+            _mock_response({'id': 'q', 'columns': _COLUMNS[:1], 'data': [[3]]}),
+            _mock_response({'id': 'd'}, {'X-Presto-Deallocated-Prepare': name}),
+        ]
+        operation = "SELECT a FROM t WHERE a = %(a)s AND b = '%%' AND c = %(c)s"
+        cursor.execute(operation, {'a': 1, 'c': 'x'})
+        self.assertEqual(cursor.fetchall(), [(1,)])
+        cursor.execute(operation, {'a': datetime.date(2020, 1, 2), 'c': None})
+        self.assertEqual(cursor.fetchall(), [(2,)])
+        cursor.execute('SELECT %d', (3,))
+        self.assertEqual(cursor._prepared_statements, {name: statement})
+        cursor.execute('DEALLOCATE PREPARE ' + name)
+        self.assertEqual(cursor._prepared_statements, {})
+
+        posts = cursor._requests_session.post.call_args_list
+        self.assertEqual([call[1]['data'].decode('utf-8') for call in posts], [
+            'PREPARE {} FROM {}'.format(name, statement),
+            "EXECUTE {} USING 1, 'x'".format(name),
+            "EXECUTE {} USING date '2020-01-02', NULL".format(name),
+            'SELECT 3',
+            'DEALLOCATE PREPARE ' + name,
+        ])
+        headers = [call[1]['headers'].get('X-Presto-Prepared-Statement') for call in posts]
+        self.assertEqual(headers, [None, added, added, added, added])
+
+        cursor = presto.Cursor('localhost', requests_session=mock.Mock())
+        self.assertIsNone(cursor._prepared('SELECT %s', (1,)))
+
+    def test_prepared_statements_evicted(self):
+        cursor = presto.Cursor('localhost', requests_session=mock.Mock(),
+                               prepared_statements=True)
+        cursor._MAX_PREPARED_STATEMENTS = 2
+        operations = ['SELECT %s', 'SELECT %s, 1', 'SELECT %s, 2']
+        names = [cursor._prepared(operation, (0,))[0] for operation in operations]
+
+        def added(i):
+            statement = operations[i].replace('%s', '?')
+            return {'X-Presto-Added-Prepare': '{}={}'.format(names[i], quote_plus(statement))}
+
+        cursor._requests_session.post.side_effect = [
+            _mock_response({'id': 'p'}, {'X-Presto-Added-Prepare': 'mine=SELECT+1'}),
+            _mock_response({'id': 'p'}, added(0)),
+            _mock_response({'id': 'q'}),
+            _mock_response({'id': 'p'}, added(1)),
+            _mock_response({'id': 'q'}),
+            _mock_response({'id': 'q'}),
+            _mock_response({'id': 'd'}, {'X-Presto-Deallocated-Prepare': names[1]}),
+            _mock_response({'id': 'p'}, added(2)),
+            _mock_response({'id': 'q'}),
+        ]
+        cursor.execute('PREPARE mine FROM SELECT 1')
+        for i in [0, 1, 0, 2]:
+            cursor.execute(operations[i], (i,))
+        self.assertEqual(list(cursor._prepared_statements), ['mine', names[0], names[2]])
+        posts = cursor._requests_session.post.call_args_list
+        self.assertEqual([call[1]['data'].decode('utf-8') for call in posts[5:]], [
+            'EXECUTE {} USING 0'.format(names[0]),
+            'DEALLOCATE PREPARE ' + names[1],
+            'PREPARE {} FROM SELECT ?, 2'.format(names[2]),
+            'EXECUTE {} USING 2'.format(names[2]),
+        ])
+
+    def test_prepared_statements_sequence(self):
+        cursor = _mock_cursor([{'data': [[1]]}], columns=_COLUMNS[:1], prepared_statements=True)
+        cursor.execute('SELECT a FROM t WHERE a IN %s AND b = %s', ([1, 2], b'x'))
+        self.assertEqual(cursor.fetchall(), [(1,)])
+        post, = cursor._requests_session.post.call_args_list
+        self.assertEqual(post[1]['data'].decode('utf-8'),
+                         "SELECT a FROM t WHERE a IN (1,2) AND b = 'x'")
+        self.assertEqual(cursor._prepared('SELECT %(a)s', {'a': 'xy', 'b': [1]})[1], 'SELECT ?')
+
+    def test_result_cache(self):
+        cache = ResultCache()
+        cursor = _mock_cursor([{'data': [[1]]}, {'data': [[2]]}], columns=_COLUMNS[:1],
+                              result_cache=cache)
+        cursor.execute('SELECT a FROM t')
+        self.assertEqual(cursor.fetchall(), [(1,), (2,)])
+
+        cursor = _mock_cursor([], result_cache=cache)
+        cursor.execute('SELECT a\n  FROM t;')
+        self.assertEqual(cursor.description,
+                         [(_COLUMNS[0]['name'], _COLUMNS[0]['type'], None, None, None, None, True)])
+        self.assertEqual(cursor.fetchmany(5), [(1,), (2,)])
+        self.assertIsNone(cursor.poll())
+        cursor._requests_session.post.assert_not_called()
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 1))
+
+        # Other session properties miss, as do statements that aren't queries
+        cursor = _mock_cursor([{'data': [[3]]}], columns=_COLUMNS[:1], result_cache=cache,
+                              session_props={'query_max_run_time': '1m'})
+        cursor.execute('SELECT a FROM t')
+        self.assertEqual(cursor.fetchall(), [(3,)])
+        cursor = _mock_cursor([{'data': [[1]]}], columns=_COLUMNS[:1], result_cache=cache)
+        cursor.execute('SHOW TABLES')
+        cursor.fetchall()
+        self.assertEqual(cache.stats.entries, 2)
+
+    def test_result_cache_incomplete(self):
+        cache = ResultCache()
+        cursor = _mock_cursor([{'data': [[1]]}, {'data': [[2]]}], columns=_COLUMNS[:1],
+                              result_cache=cache)
+        cursor.execute('SELECT a FROM t')
+        self.assertEqual(cursor.fetchone(), (1,))
+        cursor._requests_session.delete.return_value.status_code = requests.codes.no_content
+        cursor.cancel()
+        cursor._requests_session.delete.return_value.close.assert_called_once_with()
+        self.assertEqual(cursor.fetchall(), [])
+
+        cursor = _mock_cursor([{'data': [[1]]}, {'error': 'failed'}], columns=_COLUMNS[:1],
+                              result_cache=cache)
+        cursor.execute('SELECT a FROM t')
+        self.assertRaises(presto.DatabaseError, cursor.fetchall)
+        self.assertEqual(cursor.fetchall(), [])
+        self.assertEqual(cache.stats.entries, 0)
+
+    def test_shared_session(self):
+        connection = presto.connect('localhost', pool_maxsize=4, keep_alive=False)
+        session = connection._session
+        self.assertIs(connection.cursor()._requests_session, session)
+        self.assertEqual(session.get_adapter('https://localhost')._pool_maxsize, 4)
+        self.assertEqual(session.headers['Connection'], 'close')
+        with mock.patch.object(session, 'close') as close:
+            connection.close()
+        close.assert_called_once_with()
+
+        other_session = mock.Mock()
+        connection = presto.connect('localhost', requests_session=other_session)
+        self.assertIs(connection.cursor()._requests_session, other_session)
+        connection.close()
+        other_session.close.assert_not_called()
+
+    def test_http_pool_stats(self):
+        server = _coordinator()
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+
+        connection = presto.connect('127.0.0.1', port=server.server_address[1])
+        with contextlib.closing(connection):
+            for _ in range(3):
+                cursor = connection.cursor()
+                cursor.execute('SELECT 1')
+                self.assertEqual(cursor.fetchall(), [(1,)])
+            self.assertEqual(connection.http_pool_stats,
+                             {'requests': 3, 'connections': 1, 'reused': 2})
+
+
+def _coordinator():
+    """Return an HTTP server answering every query with a single row"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            body = json.dumps({'id': 'q', 'columns': [{'name': 'i', 'type': 'integer'}],
+                               'data': [[1]]}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return HTTPServer(('127.0.0.1', 0), Handler)
+
+
+_COLUMNS = [
+    {'name': 'i', 'type': 'integer'},
+    {'name': 's', 'type': 'varchar'},
+    {'name': 'd', 'type': 'decimal(10,1)'},
+]
+
+
+def _mock_response(payload, headers=None):
+    content = json.dumps(payload).encode('utf-8')
+    return mock.Mock(status_code=requests.codes.ok, headers=headers or {}, content=content,
+                     iter_content=lambda size: iter(
+                         [content[i:i + size] for i in range(0, len(content), size)]))
+
+
+def _mock_cursor(pages, columns=_COLUMNS, **kwargs):
+    """Return a cursor whose queries return the given pages, which are missing ``columns`` and
+    ``nextUri``
+    """
+    responses = [_mock_response({'id': 'q', 'nextUri': 'http://localhost:8080/v1/statement/q/0'})]
+    for i, page in enumerate(pages):
+        page = dict(page, id='q', columns=columns)
+        if i < len(pages) - 1:
+            page['nextUri'] = 'http://localhost:8080/v1/statement/q/{}'.format(i + 1)
+        responses.append(_mock_response(page))
+    session = mock.Mock()
+    session.post.return_value = responses[0]
+    session.get.side_effect = responses[1:]
+    return presto.Cursor('localhost', poll_interval=0, requests_session=session, **kwargs)
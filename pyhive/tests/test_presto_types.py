@@ -0,0 +1,92 @@
+# encoding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from decimal import Decimal
+from dateutil import tz
+from pyhive import presto_types
+import datetime
+import ipaddress
+import math
+import unittest
+import uuid
+
+
+def _convert(type_signature, value):
+    converter = presto_types.converter(type_signature)
+    return value if converter is None else converter(value)
+
+
+class TestPrestoTypes(unittest.TestCase):
+    def test_unconverted(self):
+        for type_signature in ['integer', 'bigint', 'varchar', 'varchar(10)', 'char(3)',
+                               'boolean', 'interval year to month', 'array(varchar)',
+                               'map(varchar, bigint)']:
+            self.assertIsNone(presto_types.converter(type_signature), type_signature)
+
+    def test_numbers(self):
+        self.assertEqual(_convert('decimal(10,2)', '-1.50'), Decimal('-1.50'))
+        self.assertEqual(_convert('double', 1.5), 1.5)
+        self.assertEqual(_convert('real', 'Infinity'), float('inf'))
+        self.assertEqual(_convert('double', '-Infinity'), float('-inf'))
+        self.assertTrue(math.isnan(_convert('double', 'NaN')))
+
+    def test_scalars(self):
+        self.assertEqual(_convert('varbinary', 'AAE='), b'\x00\x01')
+        self.assertEqual(_convert('json', '{"a": [1, null]}'), {'a': [1, None]})
+        self.assertEqual(_convert('uuid', '12151fd2-7586-11e9-8f9e-2a86e4085a59'),
+                         uuid.UUID('12151fd2-7586-11e9-8f9e-2a86e4085a59'))
+        self.assertEqual(_convert('ipaddress', '10.0.0.1'), ipaddress.ip_address('10.0.0.1'))
+        self.assertEqual(_convert('ipaddress', '2001:db8::1'), ipaddress.ip_address('2001:db8::1'))
+
+    def test_dates_and_times(self):
+        self.assertEqual(_convert('date', '2001-08-22'), datetime.date(2001, 8, 22))
+        self.assertEqual(_convert('timestamp', '2001-08-22 03:04:05.321'),
+                         datetime.datetime(2001, 8, 22, 3, 4, 5, 321000))
+        self.assertEqual(_convert('timestamp(0)', '2001-08-22 03:04:05'),
+                         datetime.datetime(2001, 8, 22, 3, 4, 5))
+        self.assertEqual(_convert('timestamp(9)', '2001-08-22 03:04:05.123456789'),
+                         datetime.datetime(2001, 8, 22, 3, 4, 5, 123456))
+        self.assertEqual(_convert('time(3)', '01:02:03.456'), datetime.time(1, 2, 3, 456000))
+        self.assertEqual(_convert('interval day to second', '2 03:04:05.678'),
+                         datetime.timedelta(days=2, hours=3, minutes=4, seconds=5.678))
+        self.assertEqual(_convert('interval day to second', '-0 00:00:01.000'),
+                         datetime.timedelta(seconds=-1))
+
+    def test_time_zones(self):
+        value = _convert('timestamp(3) with time zone', '2001-08-22 03:04:05.321 America/New_York')
+        self.assertEqual(value, datetime.datetime(2001, 8, 22, 3, 4, 5, 321000,
+                                                  tz.gettz('America/New_York')))
+        self.assertEqual(value.utcoffset(), datetime.timedelta(hours=-4))
+        value = _convert('timestamp with time zone', '2001-08-22 03:04:05.321 +05:45')
+        self.assertEqual(value.utcoffset(), datetime.timedelta(hours=5, minutes=45))
+        value = _convert('timestamp with time zone', '2001-08-22 03:04:05.321 UTC')
+        self.assertEqual(value.utcoffset(), datetime.timedelta(0))
+        value = _convert('time(3) with time zone', '01:02:03.456-08:00')
+        self.assertEqual(value.replace(tzinfo=None), datetime.time(1, 2, 3, 456000))
+        self.assertEqual(value.utcoffset(), datetime.timedelta(hours=-8))
+        self.assertRaises(ValueError, _convert, 'timestamp with time zone',
+                          '2001-08-22 03:04:05.321 Nowhere/Atlantis')
+
+    def test_nested(self):
+        self.assertEqual(_convert('array(decimal(3,1))', ['1.5', None]), [Decimal('1.5'), None])
+        self.assertEqual(_convert('map(bigint, array(date))', {'1': ['2001-08-22'], '2': None}),
+                         {1: [datetime.date(2001, 8, 22)], 2: None})
+        self.assertEqual(_convert('map(boolean, varchar)', {'true': 'a', 'false': None}),
+                         {True: 'a', False: None})
+        self.assertEqual(_convert('map(date, varchar)', {'2001-08-22': 'a'}),
+                         {datetime.date(2001, 8, 22): 'a'})
+        self.assertEqual(_convert('row(x bigint, y varchar)', [1, 'a']), (1, 'a'))
+        self.assertEqual(
+            _convert('array(row(x bigint, "time" timestamp(3) with time zone, d decimal(3,1)))',
+                     [[1, '2001-08-22 03:04:05.321 UTC', None]]),
+            [(1, datetime.datetime(2001, 8, 22, 3, 4, 5, 321000, tz.tzutc()), None)])
+        # Anonymous fields
+        self.assertEqual(_convert('row(date, time with time zone)', ['2001-08-22', None]),
+                         (datetime.date(2001, 8, 22), None))
+
+    def test_parse(self):
+        self.assertEqual(presto_types._parse('Timestamp(3) With Time Zone'),
+                         ('timestamp with time zone', ['3']))
+        self.assertEqual(presto_types._parse('map(varchar(3), row("a,b" integer, c double))'),
+                         ('map', ['varchar(3)', 'row("a,b" integer, c double)']))
+        self.assertRaises(ValueError, presto_types.converter, 'array(date')
@@ -0,0 +1,137 @@
+# encoding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from pyhive import result_cache
+from pyhive.result_cache import ResultCache
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+_DESCRIPTION = [('a', 'bigint', None, None, None, None, True)]
+
+
+class TestResultCache(unittest.TestCase):
+    def test_key(self):
+        cache = ResultCache()
+        key = cache.key('SELECT  a\n FROM t ;', None, ('host',))
+        self.assertEqual(key, cache.key('SELECT a FROM t', None, ('host',)))
+        self.assertNotEqual(key, cache.key('SELECT a FROM t', None, ('other host',)))
+        self.assertNotEqual(key, cache.key('SELECT a FROM t', (), ('host',)))
+        # Whitespace in quotes matters
+        self.assertNotEqual(cache.key("SELECT 'a  b'", None, ()),
+                            cache.key("SELECT 'a b'", None, ()))
+        self.assertEqual(cache.key("SELECT 'it''s  ', \"x  y\"  FROM t", None, ()),
+                         repr(("SELECT 'it''s  ', \"x  y\" FROM t", None, ())))
+        self.assertEqual(cache.key('SELECT %(a)s, %(b)s', {'b': 2, 'a': 1}, ()),
+                         cache.key('SELECT %(a)s, %(b)s', {'a': 1, 'b': 2}, ()))
+        self.assertEqual(cache.key('SELECT %s', [1], ()), cache.key('SELECT %s', (1,), ()))
+
+    def test_is_cacheable(self):
+        cache = ResultCache()
+        for operation in ['SELECT 1', ' select 1', '(SELECT 1) UNION (SELECT 2)',
+                          'WITH t AS (SELECT 1) SELECT * FROM t']:
+            self.assertTrue(cache.is_cacheable(operation), operation)
+        for operation in ['INSERT INTO t SELECT 1', 'SHOW TABLES', 'SELECTED', 'SET a = 1']:
+            self.assertFalse(cache.is_cacheable(operation), operation)
+
+    def test_get_and_put(self):
+        cache = ResultCache()
+        self.assertIsNone(cache.get('k'))
+        rows = [(i, 'x') for i in range(2500)]
+        cache.put('k', _DESCRIPTION, rows)
+        self.assertEqual(cache.get('k'), (_DESCRIPTION, rows))
+        self.assertEqual(cache.get('k'), (_DESCRIPTION, rows))
+        stats = cache.stats
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (2, 1, 1))
+        self.assertGreater(stats.bytes, 0)
+        self.assertIn('hits=2', repr(stats))
+
+        cache.clear()
+        self.assertIsNone(cache.get('k'))
+        self.assertEqual((cache.stats.entries, cache.stats.bytes), (0, 0))
+
+    def test_eviction(self):
+        cache = ResultCache()
+        cache.put('k', _DESCRIPTION, [(1,)])
+        size = cache.stats.bytes
+        cache = ResultCache(max_bytes=size * 2)
+        cache.put('a', _DESCRIPTION, [(1,)])
+        cache.put('b', _DESCRIPTION, [(2,)])
+        self.assertIsNotNone(cache.get('a'))
+        # b is the least recently used
+        cache.put('c', _DESCRIPTION, [(3,)])
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), (_DESCRIPTION, [(1,)]))
+        self.assertEqual(cache.get('c'), (_DESCRIPTION, [(3,)]))
+        stats = cache.stats
+        self.assertEqual((stats.evictions, stats.entries, stats.bytes), (1, 2, size * 2))
+
+        # Too large to cache, without evicting anything
+        cache.put('d', _DESCRIPTION, [(i,) for i in range(5000)])
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.stats.entries, 2)
+        self.assertRaises(ValueError, ResultCache, max_bytes=0)
+
+    @mock.patch('time.time')
+    def test_ttl(self, time):
+        time.return_value = 1000
+        cache = ResultCache(ttl=10)
+        cache.put('k', _DESCRIPTION, [(1,)])
+        time.return_value = 1009
+        self.assertIsNotNone(cache.get('k'))
+        time.return_value = 1010
+        self.assertIsNone(cache.get('k'))
+        self.assertEqual((cache.stats.expirations, cache.stats.entries), (1, 0))
+
+        cache = ResultCache(ttl=None)
+        cache.put('k', _DESCRIPTION, [(1,)])
+        time.return_value = 1e12
+        self.assertIsNotNone(cache.get('k'))
+
+    @mock.patch('time.time')
+    def test_directory(self, time):
+        time.return_value = 1000
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = ResultCache(ttl=10, directory=directory)
+        cache.put('k', _DESCRIPTION, [(1, '王兢')])
+        cache.put('expired', _DESCRIPTION, [(2,)])
+        self.assertEqual(len(os.listdir(directory)), 2)
+
+        # Another process
+        cache = ResultCache(ttl=10, directory=directory)
+        self.assertEqual(cache.get('k'), (_DESCRIPTION, [(1, '王兢')]))
+        self.assertEqual(cache.get('k'), (_DESCRIPTION, [(1, '王兢')]))
+        stats = cache.stats
+        self.assertEqual((stats.hits, stats.disk_hits, stats.misses), (2, 1, 0))
+        time.return_value = 1010
+        self.assertIsNone(cache.get('expired'))
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+        with open(os.path.join(directory, 'garbage.pickle'), 'wb') as f:
+            f.write(b'garbage')
+        cache._path = lambda key: os.path.join(directory, 'garbage.pickle')
+        self.assertIsNone(cache.get('other'))
+        cache.clear()
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_recording(self):
+        cache = ResultCache()
+        recording = cache.record('k')
+        for i in range(result_cache._PAGE_ROWS + 1):
+            recording.add([(i,)])
+        self.assertIsNone(cache.get('k'))
+        recording.finish(_DESCRIPTION)
+        description, rows = cache.get('k')
+        self.assertEqual(rows, [(i,) for i in range(result_cache._PAGE_ROWS + 1)])
+
+        cache = ResultCache(max_bytes=1000)
+        recording = cache.record('k')
+        recording.add([(i,) for i in range(result_cache._PAGE_ROWS)])
+        # Stopped recording
+        self.assertIsNone(recording._pages)
+        recording.finish(_DESCRIPTION)
+        self.assertIsNone(cache.get('k'))
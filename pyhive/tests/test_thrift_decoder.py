@@ -0,0 +1,80 @@
+# encoding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from TCLIService import TCLIService
+from TCLIService import ttypes
+from pyhive import thrift_decoder
+from thrift.Thrift import TApplicationException
+from thrift.Thrift import TMessageType
+from thrift.protocol import TBinaryProtocol
+from thrift.protocol import TCompactProtocol
+from thrift.transport import TTransport
+import unittest
+
+
+def _column(**kwargs):
+    return ttypes.TColumn(**kwargs)
+
+
+_RESPONSE = ttypes.TFetchResultsResp(
+    status=ttypes.TStatus(statusCode=ttypes.TStatusCode.SUCCESS_STATUS),
+    hasMoreRows=False,
+    results=ttypes.TRowSet(startRowOffset=0, rows=[], columns=[
+        _column(boolVal=ttypes.TBoolColumn(values=[True, False, True], nulls=b'\x04')),
+        _column(byteVal=ttypes.TByteColumn(values=[-128, 0, 127], nulls=b'')),
+        _column(i16Val=ttypes.TI16Column(values=[-32768, 0, 32767], nulls=b'')),
+        _column(i32Val=ttypes.TI32Column(values=[-2 ** 31, 0, 2 ** 31 - 1], nulls=b'')),
+        _column(i64Val=ttypes.TI64Column(values=[-2 ** 63, 0, 2 ** 63 - 1], nulls=b'\x01')),
+        _column(doubleVal=ttypes.TDoubleColumn(values=[-0.5, 0.0, 1e300], nulls=b'')),
+        _column(stringVal=ttypes.TStringColumn(values=['', 'a', '王兢'], nulls=b'')),
+        _column(binaryVal=ttypes.TBinaryColumn(values=[b'', b'\x00', b'\xff' * 300],
+                                               nulls=b'')),
+    ]),
+)
+
+
+def _reply(protocol_class, message_type=TMessageType.REPLY, result=None, buffer_size=None):
+    transport = TTransport.TMemoryBuffer()
+    protocol = protocol_class(transport)
+    protocol.writeMessageBegin('FetchResults', message_type, 0)
+    if result is None:
+        result = TCLIService.FetchResults_result(success=_RESPONSE)
+    result.write(protocol)
+    protocol.writeMessageEnd()
+    reply = TTransport.TMemoryBuffer(transport.getvalue())
+    if buffer_size is not None:
+        reply = TTransport.TBufferedTransport(reply, buffer_size)
+    return protocol_class(reply)
+
+
+class TestThriftDecoder(unittest.TestCase):
+    def test_fetch_results(self):
+        iprot = _reply(TBinaryProtocol.TBinaryProtocol)
+        self.assertTrue(thrift_decoder.can_decode(iprot))
+        self.assertEqual(thrift_decoder.Client(iprot).recv_FetchResults(), _RESPONSE)
+
+    def test_short_reads(self):
+        iprot = _reply(TBinaryProtocol.TBinaryProtocol, buffer_size=5)
+        self.assertEqual(thrift_decoder.Client(iprot).recv_FetchResults(), _RESPONSE)
+
+    def test_unknown_fields(self):
+        response = ttypes.TFetchResultsResp(
+            status=_RESPONSE.status,
+            results=ttypes.TRowSet(startRowOffset=0, rows=[], columns=[], binaryColumns=b'abc',
+                                   columnCount=0),
+        )
+        iprot = _reply(TBinaryProtocol.TBinaryProtocol,
+                       result=TCLIService.FetchResults_result(success=response))
+        self.assertEqual(thrift_decoder.Client(iprot).recv_FetchResults(), response)
+
+    def test_exception(self):
+        iprot = _reply(TBinaryProtocol.TBinaryProtocol, TMessageType.EXCEPTION,
+                       TApplicationException(TApplicationException.INTERNAL_ERROR, 'oops'))
+        self.assertRaisesRegexp(TApplicationException, 'oops',
+                                thrift_decoder.Client(iprot).recv_FetchResults)
+
+    def test_other_protocols(self):
+        iprot = _reply(TCompactProtocol.TCompactProtocol)
+        self.assertFalse(thrift_decoder.can_decode(iprot))
+        self.assertEqual(thrift_decoder.Client(iprot).recv_FetchResults(), _RESPONSE)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""Benchmark decoding Presto statement responses with the JSON libraries that are installed.
+
+The pages imitate what a coordinator sends for a query over a wide table: the query status and
+statistics, the columns with their type signatures, and 1000 rows of data.
+
+Usage: python scripts/benchmark_json_decoding.py
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import importlib
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyhive import presto  # noqa: E402
+
+ROWS = 1000
+NUMBER = 20
+
+# name, type, sample value
+COLUMNS = [
+    ('id', 'bigint', 1234567890123),
+    ('name', 'varchar', 'some fairly ordinary text'),
+    ('price', 'decimal(12,2)', '1234.56'),
+    ('ratio', 'double', 0.123456789),
+    ('active', 'boolean', True),
+    ('created', 'timestamp(3)', '2001-08-22 03:04:05.321'),
+    ('day', 'date', '2001-08-22'),
+    ('tags', 'array(varchar)', ['a', 'bb', 'ccc']),
+    ('attributes', 'map(varchar, integer)', {'x': 1, 'y': 2}),
+    ('missing', 'varchar', None),
+]
+
+
+def make_page():
+    columns = [
+        {'name': name, 'type': type_, 'typeSignature': {'rawType': type_.split('(')[0],
+                                                        'arguments': []}}
+        for name, type_, _ in COLUMNS
+    ]
+    row = [value for _, _, value in COLUMNS]
+    page = {
+        'id': '20210822_030405_00001_abcde',
+        'infoUri': 'http://localhost:8080/ui/query.html?20210822_030405_00001_abcde',
+        'nextUri': 'http://localhost:8080/v1/statement/executing/20210822_030405_00001_abcde/y/2',
+        'columns': columns,
+        'data': [list(row) for _ in range(ROWS)],
+        'stats': {
+            'state': 'RUNNING', 'queued': False, 'scheduled': True, 'nodes': 3,
+            'totalSplits': 120, 'queuedSplits': 10, 'runningSplits': 20, 'completedSplits': 90,
+            'cpuTimeMillis': 12345, 'wallTimeMillis': 23456, 'queuedTimeMillis': 12,
+            'elapsedTimeMillis': 3456, 'processedRows': 1000000, 'processedBytes': 123456789,
+            'peakMemoryBytes': 12345678, 'spilledBytes': 0,
+        },
+        'warnings': [],
+    }
+    return json.dumps(page).encode('utf-8')
+
+
+def main():
+    content = make_page()
+    # Baseline of decoding the text, like requests.Response.json()
+    decoders = [('json (text)', lambda content: json.loads(content.decode('utf-8'))),
+                ('json (bytes)', json.loads)]
+    for name in ('orjson', 'simdjson', 'ujson'):
+        try:
+            decoders.append((name, importlib.import_module(name).loads))
+        except ImportError:
+            print('{} is not installed'.format(name))
+    expected = json.loads(content.decode('utf-8'))
+    print('{} rows x {} columns, {} KB per page, JSON_LOADS is {}.{}'.format(
+        ROWS, len(COLUMNS), len(content) // 1024,
+        presto.JSON_LOADS.__module__, presto.JSON_LOADS.__name__))
+    baseline = None
+    for name, loads in decoders:
+        assert loads(content) == expected, name
+        elapsed = timeit.timeit(lambda: loads(content), number=NUMBER)
+        baseline = baseline or elapsed
+        print('{:<14} {:.2f} ms/page   {:.1f}x'.format(
+            name, elapsed / NUMBER * 1e3, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""Benchmark the conversions of pyhive.presto_types.
+
+Converts a column of 10000 values of each type, and where there is an obvious way to parse the
+values in user code, compares against it.
+
+Usage: python scripts/benchmark_presto_types.py
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dateutil import parser  # noqa: E402
+from pyhive import presto_types  # noqa: E402
+
+ROWS = 10000
+NUMBER = 5
+
+
+def _strptime(fmt):
+    return lambda value: datetime.datetime.strptime(value, fmt)
+
+
+# type signature, sample value, user code equivalent or None
+CASES = [
+    ('decimal(10,2)', '12345.67', None),
+    ('double', 'NaN', None),
+    ('varbinary', 'AAECAwQFBgcICQ==', None),
+    ('date', '2001-08-22', lambda value: _strptime('%Y-%m-%d')(value).date()),
+    ('timestamp(3)', '2001-08-22 03:04:05.321', _strptime('%Y-%m-%d %H:%M:%S.%f')),
+    ('timestamp(3) with time zone', '2001-08-22 03:04:05.321 America/New_York', None),
+    ('timestamp(3) with time zone', '2001-08-22 03:04:05.321 +05:45', parser.parse),
+    ('time(3)', '03:04:05.321', lambda value: _strptime('%H:%M:%S.%f')(value).time()),
+    ('time(3) with time zone', '03:04:05.321+05:45', None),
+    ('interval day to second', '2 03:04:05.678', None),
+    ('json', '{"a": [1, 2, 3], "b": null}', None),
+    ('uuid', '12151fd2-7586-11e9-8f9e-2a86e4085a59', None),
+    ('ipaddress', '2001:db8::1', None),
+    ('array(date)', ['2001-08-22', '2001-08-23', None], None),
+    ('map(bigint, decimal(3,1))', {'1': '1.5', '2': None}, None),
+    ('row(x bigint, y timestamp(3))', [1, '2001-08-22 03:04:05.321'], None),
+]
+
+
+def main():
+    for type_signature, value, reference in CASES:
+        converter = presto_types.converter(type_signature)
+        column = [value] * ROWS
+        elapsed = timeit.timeit(lambda: [converter(v) for v in column], number=NUMBER)
+        line = '{:<32} {:6.3f} us/value'.format(type_signature, elapsed / NUMBER / ROWS * 1e6)
+        if reference is not None:
+            baseline = timeit.timeit(lambda: [reference(v) for v in column], number=NUMBER)
+            line += '   user code {:6.3f} us/value   {:.1f}x'.format(
+                baseline / NUMBER / ROWS * 1e6, baseline / elapsed)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Microbenchmark for decoding TColumn null bit sets in pyhive.hive._unwrap_column.
+
+Compares the current decoder against the original bit-by-bit loop on a 1000 row page.
+
+Usage: python scripts/benchmark_unwrap_column.py
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyhive import hive  # noqa: E402
+
+ROWS = 1000
+NUMBER = 2000
+
+
+def legacy_null_positions(nulls):
+    positions = []
+    for i, char in enumerate(nulls):
+        byte = ord(char) if sys.version_info[0] == 2 else char
+        for b in range(8):
+            if byte & (1 << b):
+                positions.append(i * 8 + b)
+    return positions
+
+
+def main():
+    size = (ROWS + 7) // 8
+    cases = [
+        ('no nulls', b'\x00' * size),
+        ('sparse nulls', bytes(bytearray(1 if i % 16 == 0 else 0 for i in range(size)))),
+        ('all nulls', b'\xff' * size),
+    ]
+    for name, nulls in cases:
+        assert list(hive._null_positions(nulls)) == legacy_null_positions(nulls)
+        legacy = timeit.timeit(lambda: legacy_null_positions(nulls), number=NUMBER)
+        current = timeit.timeit(lambda: hive._null_positions(nulls), number=NUMBER)
+        print('{:<14} legacy {:8.2f} us/page   current {:8.2f} us/page   {:6.1f}x'.format(
+            name, legacy / NUMBER * 1e6, current / NUMBER * 1e6, legacy / current))
+
+
+if __name__ == '__main__':
+    main()
@@ -31,7 +31,7 @@ setup(
     author="Jing Wang",
     author_email="jing@dropbox.com",
     license="Apache License, Version 2.0",
-    packages=['pyhive', 'TCLIService'],
+    packages=['pyhive', 'pyhive.aio', 'TCLIService'],
     classifiers=[
         "Intended Audience :: Developers",
         "License :: OSI Approved :: Apache Software License",
@@ -49,8 +49,11 @@ setup(
         'hive_pure_sasl': ['pure-sasl>=0.6.2', 'thrift>=0.10.0', 'thrift_sasl>=0.1.0'],
         'sqlalchemy': ['sqlalchemy>=1.3.0'],
         'kerberos': ['requests_kerberos>=0.12.0'],
+        'arrow': ['pyarrow>=1.0.0'],
+        'aio': ['aiohttp>=3.0.0', 'requests>=1.0.0'],
     },
     tests_require=[
+        'aiohttp>=3.0.0',
         'mock>=1.0.0',
         'pytest',
         'pytest-cov',